@@ -0,0 +1,143 @@
+"""
+Validation de l'étape `_extract_colour_statistics` (calcHist + histogrammes cumulés).
+
+  1. exactitude : sur chaque image, écart maximal avec la référence NumPy
+     (mean / var / np.percentile / comptage) calculée sur la même image réduite
+  2. cohérence avec Data/csv/df_features_img.csv : invariants des colonnes
+     (iqr = 75p - 25p, std² = var, histogrammes à 100 %) et position des
+     valeurs calculées sur Data/test dans la distribution du CSV
+  3. temps : calcHist vs référence NumPy, image réduite vs pleine résolution
+
+Usage (depuis la racine du projet) :
+    python -m benchmarks.colour_statistics [--limit 50]
+
+Code de sortie 1 si l'écart à la référence dépasse la tolérance.
+"""
+import argparse
+import csv
+import glob
+import os
+import statistics
+import sys
+import time
+
+# Lancement direct (python benchmarks/colour_statistics.py) : la racine du projet doit être importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from detection.ai.feature_extractor import COLOUR_STATISTICS, colour_statistics, load_analysis_image
+
+CSV_PATH = "Data/csv/df_features_img.csv"
+IMAGE_DIR = "Data/test"
+# Les histogrammes 4 classes sont arrondis à 2 décimales, comme dans le CSV
+TOLERANCE = {"hist": 0.005 + 1e-9, "default": 1e-6}
+
+
+def reference_statistics(image):
+    """Calcul direct (tri implicite de np.percentile), pour comparaison."""
+    features = {}
+    for name, channel in (("r", 2), ("g", 1), ("b", 0)):
+        values = image[..., channel]
+        var = float(values.var(dtype=np.float64))
+        p25, p50, p75 = np.percentile(values, (25, 50, 75))
+        features.update({
+            f"{name}_channel_mean": float(values.mean(dtype=np.float64)),
+            f"{name}_channel_var": var,
+            f"{name}_channel_std": var ** 0.5,
+            f"{name}_channel_25p": p25,
+            f"{name}_channel_50p": p50,
+            f"{name}_channel_75p": p75,
+            f"{name}_channel_iqr": p75 - p25,
+        })
+        counts = np.bincount(values.ravel() >> 6, minlength=4)
+        for i, count in enumerate(counts):
+            features[f"{name}_hist_{i}"] = count * 100 / values.size
+    return features
+
+
+def check_exactness(paths):
+    worst = {key: 0.0 for key in COLOUR_STATISTICS}
+    timings = {"calcHist": [], "numpy": [], "full_resolution_decode": [], "reduced_decode": []}
+    for path in paths:
+        start = time.perf_counter()
+        full = cv2.imread(path)
+        timings["full_resolution_decode"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        image = load_analysis_image(path)
+        timings["reduced_decode"].append(time.perf_counter() - start)
+        if full is None or image is None:
+            continue
+
+        start = time.perf_counter()
+        ours = colour_statistics(image)
+        timings["calcHist"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        reference = reference_statistics(image)
+        timings["numpy"].append(time.perf_counter() - start)
+
+        for key in COLOUR_STATISTICS:
+            worst[key] = max(worst[key], abs(ours[key] - reference[key]))
+    return worst, timings
+
+
+def check_csv(path, live_rows):
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = [{k: float(row[k]) for k in COLOUR_STATISTICS} for row in csv.DictReader(f)]
+
+    violations = 0
+    for row in rows:
+        for c in "rgb":
+            ok = (abs(row[f"{c}_channel_iqr"] - (row[f"{c}_channel_75p"] - row[f"{c}_channel_25p"])) < 1e-6
+                  and abs(row[f"{c}_channel_std"] ** 2 - row[f"{c}_channel_var"]) < 1e-3 * row[f"{c}_channel_var"] + 1e-6
+                  and abs(sum(row[f"{c}_hist_{i}"] for i in range(4)) - 100) < 0.05)
+            violations += not ok
+
+    # Position (z-score) de la médiane des images réelles dans la distribution du CSV
+    drift = {}
+    for key in COLOUR_STATISTICS:
+        values = [row[key] for row in rows]
+        mean, std = statistics.mean(values), statistics.pstdev(values) or 1
+        if live_rows:
+            drift[key] = (statistics.median(r[key] for r in live_rows) - mean) / std
+    return len(rows), violations, drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default=IMAGE_DIR)
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--limit', type=int, default=None)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.images, '*.jp*g')))[:args.limit]
+    worst, timings = check_exactness(paths)
+    failures = [
+        key for key, error in worst.items()
+        if error > TOLERANCE["hist" if "_hist_" in key else "default"]
+    ]
+    print(f"== Exactitude ({len(paths)} images) : écart max {max(worst.values()):.2e}"
+          f" -> {'OK' if not failures else 'ÉCHEC : ' + ', '.join(failures)}")
+
+    print("\n== Temps médians")
+    for name, values in timings.items():
+        if values:
+            print(f"   {name:24s} {statistics.median(values) * 1000:8.2f} ms")
+
+    live_rows = []
+    for path in paths:
+        image = load_analysis_image(path)
+        if image is not None:
+            live_rows.append(colour_statistics(image))
+    count, violations, drift = check_csv(args.csv, live_rows)
+    print(f"\n== {args.csv} : {count} lignes, {violations} invariants non respectés (par canal)")
+    if drift:
+        print("   Médiane Data/test dans la distribution du CSV (z-score) :")
+        for key, z in sorted(drift.items(), key=lambda item: -abs(item[1]))[:8]:
+            print(f"   {key:20s} {z:+6.2f}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Benchmark de l'extraction GPS EXIF : lecteur d'en-tête APP1 vs chemin PIL.
+
+Usage (depuis la racine du projet) :
+    python -m benchmarks.exif_gps [--repeat 200]
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import tempfile
+import time
+
+# Lancement direct (python benchmarks/exif_gps.py) : la racine du projet doit être importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from detection.gps_utils import extract_gps_from_bytes, extract_gps_from_image, extract_gps_with_pil, HEADER_READ_SIZE
+
+CORPUS_DIR = "Data/test"
+
+
+def make_geotagged_jpeg(path, size=(4000, 3000)):
+    """Crée un JPEG avec un bloc GPS (48°51'29.6\"N, 2°21'7.9\"E) pour le benchmark."""
+    img = Image.new('RGB', size, (90, 120, 60))
+    exif = Image.Exif()
+    gps = exif.get_ifd(0x8825)
+    gps[1] = 'N'
+    gps[2] = (48.0, 51.0, 29.6)
+    gps[3] = 'E'
+    gps[4] = (2.0, 21.0, 7.9)
+    img.save(path, 'JPEG', exif=exif, quality=90)
+
+
+def time_per_image(func, paths, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            func(path)
+    return (time.perf_counter() - start) / (repeat * len(paths))
+
+
+def fast_from_path(path):
+    with open(path, 'rb') as f:
+        return extract_gps_from_bytes(f.read(HEADER_READ_SIZE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        geotagged = os.path.join(tmp, 'geotagged.jpg')
+        make_geotagged_jpeg(geotagged)
+
+        fast, pil = extract_gps_from_image(geotagged), extract_gps_with_pil(geotagged)
+        print(f"Coordonnées : rapide={fast} PIL={pil}")
+        assert fast and pil and abs(fast[0] - pil[0]) < 1e-9 and abs(fast[1] - pil[1]) < 1e-9
+
+        corpora = {
+            "synthétique 12 MP (GPS)": [geotagged],
+            f"{CORPUS_DIR} (sans GPS)": sorted(glob.glob(os.path.join(CORPUS_DIR, '*.jp*g'))),
+        }
+        for name, paths in corpora.items():
+            if not paths:
+                continue
+            t_fast = time_per_image(fast_from_path, paths, args.repeat)
+            t_pil = time_per_image(extract_gps_with_pil, paths, max(1, args.repeat // 10))
+            print(f"{name:28s} {len(paths):4d} images | en-tête APP1 : {t_fast * 1e6:8.1f} µs/image"
+                  f" | PIL : {t_pil * 1e6:8.1f} µs/image | x{t_pil / t_fast:.1f}")
+
+        # Le chemin upload lit depuis le buffer en mémoire
+        with open(geotagged, 'rb') as f:
+            buffer = io.BytesIO(f.read())
+        start = time.perf_counter()
+        for _ in range(args.repeat * 10):
+            buffer.seek(0)
+            extract_gps_from_bytes(buffer.read(HEADER_READ_SIZE))
+        print(f"Buffer d'upload en mémoire : {(time.perf_counter() - start) / (args.repeat * 10) * 1e6:.1f} µs/image")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Benchmark de l'extraction de caractéristiques (ImageFeatureExtractor + demo_extraction).
+
+Mesure, pour chaque méthode `_extract_*`, pour `extract_features` et pour
+`classify_image` : le temps mural, le pic de RSS et le pic d'allocations
+(tracemalloc, qui suit aussi les tableaux NumPy). Deux corpus :
+  - real      : les images de Data/test
+  - synthetic : images générées de façon reproductible à 0.3, 2, 12 et 48 MP
+
+Usage (depuis la racine du projet) :
+    python -m benchmarks.extractor --corpus synthetic --sizes 0.3,2
+    python -m benchmarks.extractor --save-baseline
+    python -m benchmarks.extractor --baseline benchmarks/results/baseline.json --threshold 0.15
+
+Code de sortie 1 si une étape régresse au-delà du seuil par rapport à la baseline.
+"""
+import argparse
+import glob
+import inspect
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+# Lancement direct (python benchmarks/extractor.py) : la racine du projet doit être importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from detection.ai.feature_extractor import ImageFeatureExtractor
+from detection.ai.demo_extraction import extract_features, classify_image, load_rules
+
+REAL_CORPUS_DIR = "Data/test"
+SYNTHETIC_DIR = "benchmarks/.corpus"
+RESULTS_DIR = "benchmarks/results"
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, "baseline.json")
+DEFAULT_SIZES = [0.3, 2, 12, 48]
+SEED = 2025
+
+
+class RssSampler:
+    """Échantillonne la RSS du processus (Linux : /proc/self/statm) pour obtenir un pic par étape."""
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self.available = os.path.exists('/proc/self/statm')
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def current(self):
+        if self.available:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * self.page_size
+        # ru_maxrss : Ko sous Linux, octets sous macOS (pic du processus, pas de l'étape)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def synthetic_image(megapixels, seed=SEED):
+    """Image reproductible 4:3 : dégradé, formes pleines et bruit (compression JPEG réaliste)."""
+    rng = np.random.default_rng(seed + int(megapixels * 10))
+    width = int(round((megapixels * 1_000_000 * 4 / 3) ** 0.5))
+    height = int(round(width * 3 / 4))
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[..., 0] = (60 + 120 * y + 40 * x).astype(np.uint8)
+    img[..., 1] = (80 + 90 * x).astype(np.uint8)
+    img[..., 2] = (100 + 60 * (1 - y)).astype(np.uint8)
+    scale = width / 1000
+    for _ in range(200):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.circle(img, center, int(rng.integers(5, 60) * scale), color, -1)
+    noise = rng.integers(-12, 13, size=(height, width, 1), dtype=np.int16)
+    return np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_corpus(sizes):
+    os.makedirs(SYNTHETIC_DIR, exist_ok=True)
+    paths = []
+    for mp in sizes:
+        path = os.path.join(SYNTHETIC_DIR, f"synthetic_{mp}mp.jpg")
+        if not os.path.exists(path):
+            print(f"Génération de {path}...")
+            cv2.imwrite(path, synthetic_image(mp), [cv2.IMWRITE_JPEG_QUALITY, 90])
+        paths.append(path)
+    return paths
+
+
+def real_corpus():
+    extractor = ImageFeatureExtractor()
+    return sorted(
+        p for p in glob.glob(os.path.join(REAL_CORPUS_DIR, '*'))
+        if os.path.splitext(p)[1].lower() in extractor.supported_formats
+    )
+
+
+def stage_functions(rules):
+    """Étapes mesurées : chaque `_extract_*` de l'extracteur, puis le pipeline de demo_extraction."""
+    extractor = ImageFeatureExtractor()
+    stages = {}
+    for name, method in inspect.getmembers(extractor, inspect.ismethod):
+        if name.startswith('_extract_'):
+            stages[name] = method
+
+    cache = {}
+
+    def demo_extract(path):
+        cache[path] = extract_features(path)
+        return cache[path]
+
+    def demo_classify(path):
+        return classify_image(cache.get(path) or extract_features(path), rules)
+
+    stages['extract_features'] = demo_extract
+    stages['classify_image'] = demo_classify
+    return stages
+
+
+def measure(func, path, repeat):
+    """Temps mural médian (sans tracemalloc), puis pic RSS et pic d'allocations sur un passage instrumenté."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(path)
+        timings.append(time.perf_counter() - start)
+
+    sampler = RssSampler()
+    tracemalloc.start()
+    try:
+        with sampler:
+            rss_before = sampler.peak
+            func(path)
+        _, alloc_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_ms": round(statistics.median(timings) * 1000, 3),
+        "peak_rss_mb": round(sampler.peak / 1e6, 2),
+        "rss_growth_mb": round((sampler.peak - rss_before) / 1e6, 2),
+        "alloc_peak_mb": round(alloc_peak / 1e6, 2),
+    }
+
+
+def run(corpora, repeat):
+    rules = load_rules()
+    stages = stage_functions(rules)
+    results = {}
+    summary = {}
+    for corpus_name, paths in corpora.items():
+        results[corpus_name] = {}
+        per_stage = {stage: [] for stage in stages}
+        for path in paths:
+            image_result = {}
+            for stage, func in stages.items():
+                try:
+                    image_result[stage] = measure(func, path, repeat)
+                except Exception as e:
+                    image_result[stage] = {"error": str(e)}
+                    continue
+                per_stage[stage].append(image_result[stage])
+            results[corpus_name][os.path.basename(path)] = image_result
+            print(f"[{corpus_name}] {os.path.basename(path)} : "
+                  f"{sum(r.get('wall_ms', 0) for r in image_result.values() if isinstance(r, dict)):.1f} ms")
+
+        summary[corpus_name] = {
+            stage: {
+                "wall_ms": round(statistics.median(r["wall_ms"] for r in rows), 3),
+                "peak_rss_mb": max(r["peak_rss_mb"] for r in rows),
+                "alloc_peak_mb": max(r["alloc_peak_mb"] for r in rows),
+            }
+            for stage, rows in per_stage.items() if rows
+        }
+    return results, summary
+
+
+def compare(summary, baseline, threshold):
+    """Liste des régressions (temps ou pic d'allocations) au-delà de `threshold` (0.15 = +15 %)."""
+    regressions = []
+    for corpus, stages in summary.items():
+        for stage, current in stages.items():
+            reference = baseline.get("summary", {}).get(corpus, {}).get(stage)
+            if not reference:
+                continue
+            for metric in ("wall_ms", "alloc_peak_mb"):
+                before, after = reference.get(metric), current.get(metric)
+                if before and after > before * (1 + threshold):
+                    regressions.append(
+                        f"{corpus}/{stage} {metric}: {before} -> {after} (+{(after / before - 1) * 100:.0f} %)"
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default='real,synthetic', help="real, synthetic ou les deux")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES), help="tailles synthétiques en MP")
+    parser.add_argument('--repeat', type=int, default=3, help="répétitions chronométrées par image et par étape")
+    parser.add_argument('--limit', type=int, default=None, help="nombre max d'images réelles")
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, "latest.json"))
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.15)
+    parser.add_argument('--save-baseline', action='store_true', help="enregistre ce run comme baseline")
+    args = parser.parse_args()
+
+    corpora = {}
+    selected = {c.strip() for c in args.corpus.split(',')}
+    if 'real' in selected:
+        corpora['real'] = real_corpus()[:args.limit]
+    if 'synthetic' in selected:
+        corpora['synthetic'] = synthetic_corpus([float(s) for s in args.sizes.split(',')])
+
+    results, summary = run(corpora, args.repeat)
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+        },
+        "summary": summary,
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Résultats écrits dans {args.output}")
+
+    for corpus, stages in summary.items():
+        print(f"\n== {corpus} (médianes) ==")
+        for stage, values in stages.items():
+            print(f"   {stage:32s} {values['wall_ms']:10.2f} ms  RSS {values['peak_rss_mb']:8.1f} Mo"
+                  f"  alloc {values['alloc_peak_mb']:8.1f} Mo")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Baseline enregistrée : {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(summary, json.load(f), args.threshold)
+        if regressions:
+            print("\nRégressions détectées :")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print(f"\nAucune régression au-delà de {args.threshold * 100:.0f} % par rapport à {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
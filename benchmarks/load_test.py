@@ -0,0 +1,363 @@
+"""
+Générateur de charge HTTP pour l'API (runserver ou gunicorn local, base SQLite).
+
+Étapes :
+  1. --seed-users / --seed-uploads : crée les comptes de test et N milliers de lignes ImageUpload
+  2. --spawn gunicorn|runserver    : démarre (optionnel) un serveur local
+  3. lance `--concurrency` clients qui rejouent le mélange `--mix` pendant `--duration` secondes
+
+Usage (depuis la racine du projet) :
+    python -m benchmarks.load_test --seed-users 20 --seed-uploads 5 --spawn gunicorn --workers 4 \\
+        --concurrency 16 --duration 30 --mix bins=6,token=1,analyze=2,upload=1
+
+Rapporte le débit et les latences p50/p95/p99 par endpoint (JSON avec --output),
+ainsi que le coût d'ouverture des connexions base de données relevé sur /metrics.
+Pour comparer les modes de connexion, lancer le même scénario avec DB_POOL=1,
+DB_PGBOUNCER=1 ou DB_CONN_MAX_AGE=0 dans l'environnement (--spawn le transmet).
+"""
+import argparse
+import glob
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+# Lancement direct (python benchmarks/load_test.py) : la racine du projet doit être importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USER_PREFIX = "loadtest-"
+USER_DOMAIN = "@urbin.local"
+PASSWORD = "loadtest-password"
+IMAGE_DIR = "Data/test"
+
+ENDPOINTS = {
+    "bins": ("GET", "/api/bins/"),
+    "token": ("POST", "/api/token/"),
+    "analyze": ("POST", "/api/analyze-image/"),
+    "upload": ("POST", "/api/upload-image/"),
+}
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "urbin.settings")
+    import django
+    django.setup()
+
+
+def seed(users, uploads_thousands, batch_size=1000):
+    """Crée les utilisateurs de test et `uploads_thousands` milliers de lignes ImageUpload (bulk_create)."""
+    setup_django()
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from detection.bins import bump_data_version
+    from detection.models import ImageUpload, UserProfile
+
+    usernames = [f"{USER_PREFIX}{i}{USER_DOMAIN}" for i in range(users)]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    password = make_password(PASSWORD)  # hachage calculé une seule fois
+    User.objects.bulk_create([
+        User(username=name, email=name, password=password)
+        for name in usernames if name not in existing
+    ])
+    accounts = list(User.objects.filter(username__in=usernames))
+    # bulk_create ne déclenche pas post_save : profils créés explicitement
+    UserProfile.objects.bulk_create([UserProfile(user=u) for u in accounts], ignore_conflicts=True)
+    print(f"{len(accounts)} utilisateurs de test prêts")
+
+    rng = random.Random(42)
+    total = int(uploads_thousands * 1000)
+    annotations = ["pleine", "vide", "auto", "non"]
+    for start in range(0, total, batch_size):
+        ImageUpload.objects.bulk_create([
+            ImageUpload(
+                uploader=rng.choice(accounts),
+                image="uploads/fake.jpg",
+                latitude=48.8 + rng.uniform(-0.2, 0.2),
+                longitude=2.35 + rng.uniform(-0.3, 0.3),
+                annotation=rng.choice(annotations),
+                chemin=f"loadtest/{start + i}.jpg",
+                type="JPEG",
+                taille=str(round(rng.uniform(50, 3000), 2)),
+                hauteur=str(rng.choice([600, 1200, 3000])),
+                largeur=str(rng.choice([800, 1600, 4000])),
+                pixels=str(rng.randint(480000, 12000000)),
+            )
+            for i in range(min(batch_size, total - start))
+        ])
+    if total:
+        bump_data_version()  # bulk_create ne déclenche pas les signaux
+        print(f"{total} lignes ImageUpload ajoutées")
+
+
+def spawn_server(kind, port, workers, sample_rate):
+    if kind == "gunicorn":
+        cmd = ["gunicorn", "urbin.wsgi:application", "--bind", f"127.0.0.1:{port}", "--workers", str(workers)]
+    else:
+        cmd = [sys.executable, "manage.py", "runserver", f"127.0.0.1:{port}", "--noreload"]
+    env = {
+        **os.environ,
+        "REQUEST_TIMING_SAMPLE_RATE": str(sample_rate),
+        # Métriques agrégées entre workers, repartant de zéro à chaque run
+        "METRICS_MULTIPROC_DIR": tempfile.mkdtemp(prefix="urbin-loadtest-metrics-"),
+    }
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Le serveur {kind} n'a pas démarré sur le port {port}")
+
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Client:
+    """Connexion HTTP persistante (keep-alive) d'un client virtuel."""
+
+    def __init__(self, base_url, username, images):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.username = username
+        self.images = images
+        self.token = None
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                response = self.conn.getresponse()
+                payload = response.read()
+                return response.status, payload
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+    def obtain_token(self):
+        body = json.dumps({"username": self.username, "password": PASSWORD})
+        status, payload = self.request("POST", "/api/token/", body, {"Content-Type": "application/json"})
+        if status == 200:
+            self.token = json.loads(payload)["access"]
+        return status, payload
+
+    def call(self, endpoint):
+        method, path = ENDPOINTS[endpoint]
+        if endpoint == "token":
+            return self.obtain_token()
+        if self.token is None:
+            self.obtain_token()
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if endpoint == "bins":
+            return self.request(method, path, headers=headers)
+        filename, content = random.choice(self.images)
+        fields = {"annotation": random.choice(["pleine", "vide"])} if endpoint == "upload" else {}
+        body, content_type = multipart(fields, {"image": (filename, content)})
+        headers["Content-Type"] = content_type
+        return self.request(method, path, body, headers)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(base_url, concurrency, duration, mix, users, images):
+    endpoints, weights = zip(*mix.items())
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(index):
+        client = Client(base_url, users[index % len(users)], images)
+        rng = random.Random(index)
+        while time.perf_counter() < stop_at:
+            endpoint = rng.choices(endpoints, weights)[0]
+            start = time.perf_counter()
+            try:
+                status, _ = client.call(endpoint)
+                ok = status < 400
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies[endpoint].append(elapsed)
+                if not ok:
+                    errors[endpoint] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    report = {"duration_s": round(wall, 2), "concurrency": concurrency, "endpoints": {}}
+    for endpoint, values in sorted(latencies.items()):
+        values.sort()
+        report["endpoints"][endpoint] = {
+            "requests": len(values),
+            "errors": errors[endpoint],
+            "throughput_rps": round(len(values) / wall, 2),
+            "mean_ms": round(statistics.mean(values) * 1000, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+    total = sum(len(v) for v in latencies.values())
+    report["total"] = {
+        "requests": total,
+        "errors": sum(errors.values()),
+        "throughput_rps": round(total / wall, 2),
+    }
+    return report
+
+
+METRIC_LINE = re.compile(r'^(urbin_db_connect_seconds|urbin_db_seconds)_(sum|count)(?:\{[^}]*\})? (\S+)$')
+
+
+def connection_stats(base_url, token=None):
+    """Coût d'ouverture des connexions et temps SQL, lus sur /metrics (requêtes échantillonnées)."""
+    url = urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+    try:
+        conn.request("GET", "/metrics", headers={"Authorization": f"Bearer {token}"} if token else {})
+        response = conn.getresponse()
+        text = response.read().decode()
+        if response.status != 200:
+            return None
+    except OSError:
+        return None
+    finally:
+        conn.close()
+
+    totals = defaultdict(float)
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            name, field, value = match.groups()
+            totals[name, field] += float(value)
+    sampled = totals['urbin_db_seconds', 'count']
+    connects = totals['urbin_db_connect_seconds', 'count']
+    connect_time = totals['urbin_db_connect_seconds', 'sum']
+    return {
+        "sampled_requests": int(sampled),
+        "connections_opened": int(connects),
+        "connections_per_request": round(connects / sampled, 3) if sampled else None,
+        "connect_mean_ms": round(connect_time / connects * 1000, 3) if connects else None,
+        "connect_ms_per_request": round(connect_time / sampled * 1000, 3) if sampled else None,
+        "sql_ms_per_request": round(totals['urbin_db_seconds', 'sum'] / sampled * 1000, 3) if sampled else None,
+    }
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Endpoint inconnu : {name} (choix : {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=None, help="serveur déjà lancé (ex. http://127.0.0.1:8000)")
+    parser.add_argument('--spawn', choices=['gunicorn', 'runserver'], default=None)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help="workers gunicorn (--spawn gunicorn)")
+    parser.add_argument('--seed-users', type=int, default=0)
+    parser.add_argument('--seed-uploads', type=float, default=0, help="milliers de lignes ImageUpload à créer")
+    parser.add_argument('--users', type=int, default=10, help="comptes de test utilisés par les clients")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix("bins=6,token=1,analyze=2,upload=1"))
+    parser.add_argument('--sample-rate', type=float, default=1.0,
+                        help="REQUEST_TIMING_SAMPLE_RATE du serveur lancé (--spawn)")
+    parser.add_argument('--metrics-token', default=os.environ.get("METRICS_TOKEN"))
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if args.seed_users or args.seed_uploads:
+        seed(max(args.seed_users, 1), args.seed_uploads)
+
+    images = [
+        (os.path.basename(p), open(p, 'rb').read())
+        for p in sorted(glob.glob(os.path.join(IMAGE_DIR, '*.jp*g')))[:20]
+    ]
+    users = [f"{USER_PREFIX}{i}{USER_DOMAIN}" for i in range(args.users)]
+
+    server = None
+    base_url = args.url
+    if args.spawn:
+        server = spawn_server(args.spawn, args.port, args.workers, args.sample_rate)
+        base_url = f"http://127.0.0.1:{args.port}"
+    if not base_url:
+        parser.error("--url ou --spawn est requis")
+
+    try:
+        report = run_load(base_url, args.concurrency, args.duration, args.mix, users, images)
+        time.sleep(1.5)  # laisse les workers recopier leurs métriques (METRICS_MULTIPROC_DIR)
+        report["database"] = connection_stats(base_url, args.metrics_token)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    report["server"] = args.spawn or base_url
+    report["workers"] = args.workers if args.spawn == "gunicorn" else None
+    print(f"\n{'endpoint':10s} {'req':>7s} {'err':>5s} {'req/s':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s}  (ms)")
+    for endpoint, r in report["endpoints"].items():
+        print(f"{endpoint:10s} {r['requests']:7d} {r['errors']:5d} {r['throughput_rps']:8.1f}"
+              f" {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f}")
+    t = report["total"]
+    print(f"{'total':10s} {t['requests']:7d} {t['errors']:5d} {t['throughput_rps']:8.1f}")
+    db = report["database"]
+    if db and db["sampled_requests"]:
+        print(f"\nBase : {db['connections_opened']} connexions ouvertes pour {db['sampled_requests']} requêtes"
+              f" échantillonnées ({db['connections_per_request']} / requête),"
+              f" {db['connect_mean_ms']} ms par ouverture, {db['sql_ms_per_request']} ms de SQL / requête")
+    elif db is None:
+        print("\nBase : /metrics indisponible (METRICS_TOKEN ?)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Rapport écrit dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark du temps de démarrage (python -X importtime).
+
+Mesure, dans des processus neufs, le temps mural et le temps d'import de :
+  - urlconf : django.setup() + chargement de ROOT_URLCONF (démarrage d'un worker)
+  - check   : python manage.py check (coût de toute commande de gestion, ex. migrate)
+
+Chaque run est ajouté à benchmarks/results/startup_history.jsonl pour suivre l'évolution.
+
+Usage (depuis la racine du projet) :
+    python -m benchmarks.startup [--repeat 5] [--top 15]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+HISTORY_PATH = "benchmarks/results/startup_history.jsonl"
+HEAVY_MODULES = ("cv2", "numpy", "PIL.Image")
+
+SCENARIOS = {
+    "urlconf": [
+        "-c",
+        "import os, django; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'urbin.settings'); "
+        "django.setup(); from django.conf import settings; __import__(settings.ROOT_URLCONF)",
+    ],
+    "check": ["manage.py", "check"],
+}
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def run_once(args):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+
+    imports = {}
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            _, cumulative, indent, name = match.groups()
+            # Seuls les imports de premier niveau s'additionnent sans double comptage
+            imports[name] = (int(cumulative), len(indent) == 1)
+    total_import = sum(us for us, top_level in imports.values() if top_level)
+    return wall, total_import, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="imports les plus coûteux à afficher")
+    parser.add_argument('--history', default=HISTORY_PATH)
+    args = parser.parse_args()
+
+    record = {"date": datetime.now().isoformat(), "python": sys.version.split()[0], "scenarios": {}}
+    for name, scenario in SCENARIOS.items():
+        walls, import_totals, imports = [], [], {}
+        for _ in range(args.repeat):
+            wall, total_import, imports = run_once(scenario)
+            walls.append(wall)
+            import_totals.append(total_import)
+
+        loaded_heavy = [m for m in HEAVY_MODULES if m in imports]
+        record["scenarios"][name] = {
+            "wall_ms": round(statistics.median(walls) * 1000, 1),
+            "import_ms": round(statistics.median(import_totals) / 1000, 1),
+            "heavy_modules_loaded": loaded_heavy,
+        }
+        print(f"\n== {name} : {record['scenarios'][name]['wall_ms']} ms mur,"
+              f" {record['scenarios'][name]['import_ms']} ms d'imports"
+              f" | cv2/numpy/PIL chargés : {', '.join(loaded_heavy) or 'aucun'}")
+        top = sorted(imports.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+        for module, (cumulative, _) in top:
+            print(f"   {cumulative / 1000:9.1f} ms  {module}")
+
+    os.makedirs(os.path.dirname(args.history), exist_ok=True)
+    with open(args.history, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"\nRun ajouté à {args.history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,36 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+from django.utils import timezone
 
-# Register your models here.
+from .bins import bump_data_version
+from .classifier import feature_snapshot
+from .models import ImageUpload
+
+
+@admin.register(ImageUpload)
+class ImageUploadAdmin(admin.ModelAdmin):
+    list_display = ('id', 'uploader', 'upload_date', 'annotation', 'features_source', 'annotation_verified_at')
+    list_filter = ('annotation', 'features_source', ('annotation_verified_at', admin.EmptyFieldListFilter))
+    readonly_fields = ('phash', 'duplicate_of', 'features', 'features_source', 'annotation_verified_at')
+    actions = ('verify_annotation',)
+
+    @admin.action(description="Confirmer l'annotation (exemple pour le classifieur k-NN)")
+    def verify_annotation(self, request, queryset):
+        """Seuls les uploads confirmés ici entrent dans la base k-NN (detection/classifier.py)."""
+        now = timezone.now()
+        verified = 0
+        for upload in queryset.filter(annotation__in=('pleine', 'vide')).exclude(image=''):
+            if upload.features is None:
+                # Upload antérieur au stockage des caractéristiques : recalculées sur le fichier
+                try:
+                    with upload.image.open('rb') as image_file:
+                        upload.features, upload.features_source = feature_snapshot(image_file), 'server'
+                except OSError:
+                    continue
+                if upload.features is None:
+                    continue
+            upload.annotation_verified_at = now
+            upload.save(update_fields=['features', 'features_source', 'annotation_verified_at'])
+            verified += 1
+        transaction.on_commit(bump_data_version)
+        self.message_user(request, f"{verified} annotation(s) confirmée(s)", messages.SUCCESS)
@@ -2,6 +2,10 @@ import cv2
 import numpy as np
 import os
 import json
+try:
+    from detection.tracing import trace_stage
+except ImportError:  # exécution directe du script, hors du projet Django
+    from contextlib import nullcontext as trace_stage
 
 def load_rules(json_path="rules.json"):
     try:
@@ -23,25 +27,30 @@ def load_rules(json_path="rules.json"):
     return rules
 
 def extract_features(image_path):
-    original_img = cv2.imread(image_path)
+    with trace_stage("decode"):
+        original_img = cv2.imread(image_path)
     if original_img is None:
         raise ValueError(f"Image invalide ou format non supporté: {image_path}")
-    img = extract_ground_patch(original_img)
+    with trace_stage("crop"):
+        img = extract_ground_patch(original_img)
     # Conversion en différents espaces colorimétriques
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    with trace_stage("colour"):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
     
-    # Caractéristiques de base
-    mean_color = np.mean(img)
+        # Caractéristiques de base
+        mean_color = np.mean(img)
     
     # 1. Analyse des contours et de la densité des bords
-    edges = cv2.Canny(gray, 50, 150)
-    edge_density = np.sum(edges > 0) / (edges.shape[0] * edges.shape[1])
+    with trace_stage("canny"):
+        edges = cv2.Canny(gray, 50, 150)
+        edge_density = np.sum(edges > 0) / (edges.shape[0] * edges.shape[1])
     
     # 2. Analyse de la texture (variance locale)
-    kernel = np.ones((5,5), np.float32) / 25
-    texture_filtered = cv2.filter2D(gray, -1, kernel)
-    texture_variance = np.var(texture_filtered)
+    with trace_stage("texture"):
+        kernel = np.ones((5,5), np.float32) / 25
+        texture_filtered = cv2.filter2D(gray, -1, kernel)
+        texture_variance = np.var(texture_filtered)
     
     # 3. Analyse des pixels sombres (déchets souvent plus sombres)
     dark_threshold = 80
@@ -53,14 +62,15 @@ def extract_features(image_path):
     mean_saturation = np.mean(saturation)
     
     # 5. Détection de contours multiples (débris/objets)
-    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    with trace_stage("contours"):
+        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
-    # Filtrer les petits contours (bruit)
-    significant_contours = [c for c in contours if cv2.contourArea(c) > 100]
-    debris_contour_count = len(significant_contours)
+        # Filtrer les petits contours (bruit)
+        significant_contours = [c for c in contours if cv2.contourArea(c) > 100]
+        debris_contour_count = len(significant_contours)
     
-    total_area = sum(cv2.contourArea(c) for c in significant_contours)
+        total_area = sum(cv2.contourArea(c) for c in significant_contours)
     
     # 6. Analyse de l'uniformité (poubelle vide = plus uniforme)
     histogram = cv2.calcHist([gray], [0], None, [256], [0, 256])
@@ -150,6 +160,10 @@ def calculate_fullness_score(features, rules):
     return normalized_score
 
 def classify_image(features, rules):
+    with trace_stage("classify"):
+        return _classify_image(features, rules)
+
+def _classify_image(features, rules):
     # Nouvelle méthode stricte basée sur le score pondéré
     fullness_score = calculate_fullness_score(features, rules)
     
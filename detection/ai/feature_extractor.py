@@ -1,3 +1,4 @@
+import io
 import os
 import cv2
 import numpy as np
@@ -5,6 +6,95 @@ from PIL import Image, ImageStat
 import json
 from datetime import datetime
 from typing import Dict, Any, List, Tuple
+try:
+    from detection.tracing import trace_stage
+except ImportError:  # exécution directe du script, hors du projet Django
+    from contextlib import nullcontext as trace_stage
+
+# Image d'analyse : côté le plus long ramené à ANALYSIS_MAX_SIDE pixels (ordre de grandeur
+# des images de Data/csv/df_features_img.csv), décodage JPEG réduit quand c'est possible
+ANALYSIS_MAX_SIDE = 800
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+# Caractéristiques couleur de df_features_img.csv, dans l'ordre des colonnes
+CHANNEL_STATS = ("mean", "var", "std", "25p", "50p", "75p", "iqr")
+COLOUR_STATISTICS = [f"{c}_channel_{stat}" for c in "rgb" for stat in CHANNEL_STATS] + \
+                    [f"{c}_hist_{i}" for c in "rgb" for i in range(4)]
+
+
+def _decode_flag(source, max_side: int) -> int:
+    """Décodage JPEG réduit (1/2, 1/4, 1/8) le plus fort qui garde au moins `max_side` pixels."""
+    try:
+        with Image.open(source) as img:
+            longest = max(img.size)
+    except Exception:
+        return cv2.IMREAD_COLOR
+    return next((flag for factor, flag in _REDUCED_FLAGS if longest // factor >= max_side), cv2.IMREAD_COLOR)
+
+
+def load_analysis_image(image_path: str, max_side: int = ANALYSIS_MAX_SIDE):
+    """Image BGR dont le plus grand côté vaut au plus `max_side` (None si illisible)."""
+    image = cv2.imread(image_path, _decode_flag(image_path, max_side))
+    return None if image is None else downscale(image, max_side)
+
+
+def decode_analysis_image(data: bytes, max_side: int = ANALYSIS_MAX_SIDE):
+    """Comme load_analysis_image, depuis le contenu d'un fichier."""
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), _decode_flag(io.BytesIO(data), max_side))
+    return None if image is None else downscale(image, max_side)
+
+
+def downscale(image, max_side: int = ANALYSIS_MAX_SIDE):
+    height, width = image.shape[:2]
+    if max(height, width) <= max_side:
+        return image
+    ratio = max_side / max(height, width)
+    return cv2.resize(image, (max(1, round(width * ratio)), max(1, round(height * ratio))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def _percentile_from_cumsum(cumsum: np.ndarray, q: float) -> float:
+    """
+    Percentile q des valeurs triées implicites d'un histogramme cumulé, avec
+    l'interpolation linéaire de np.percentile : v[i] est la plus petite valeur
+    dont le cumul dépasse i.
+    """
+    total = int(cumsum[-1])
+    position = q / 100 * (total - 1)
+    lower = int(position)
+    low = int(np.searchsorted(cumsum, lower, side='right'))
+    high = int(np.searchsorted(cumsum, min(lower + 1, total - 1), side='right'))
+    return low + (position - lower) * (high - low)
+
+
+def colour_statistics(image) -> Dict[str, float]:
+    """
+    Les 33 caractéristiques de df_features_img.csv pour une image BGR :
+    un calcHist 256 classes par canal, tout le reste (moyenne, variance,
+    percentiles, histogramme 4 classes en %) est dérivé de l'histogramme.
+    """
+    features = {}
+    levels = np.arange(256, dtype=np.float64)
+    for name, channel in (("r", 2), ("g", 1), ("b", 0)):
+        hist = cv2.calcHist([image], [channel], None, [256], [0, 256]).ravel().astype(np.int64)
+        total = int(hist.sum())
+        mean = float(levels @ hist) / total
+        var = float(((levels - mean) ** 2) @ hist) / total
+        cumsum = np.cumsum(hist)
+        p25, p50, p75 = (_percentile_from_cumsum(cumsum, q) for q in (25, 50, 75))
+        features.update({
+            f"{name}_channel_mean": mean,
+            f"{name}_channel_var": var,
+            f"{name}_channel_std": var ** 0.5,
+            f"{name}_channel_25p": p25,
+            f"{name}_channel_50p": p50,
+            f"{name}_channel_75p": p75,
+            f"{name}_channel_iqr": p75 - p25,
+        })
+        for i, count in enumerate(hist.reshape(4, 64).sum(axis=1)):
+            features[f"{name}_hist_{i}"] = round(count * 100 / total, 2)
+    return {key: features[key] for key in COLOUR_STATISTICS}
+
 
 class ImageFeatureExtractor:
     """
@@ -14,6 +104,7 @@ class ImageFeatureExtractor:
     
     def __init__(self):
         self.supported_formats = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
+        self._scratch = None
     
     def extract_all_features(self, image_path: str, include_advanced: bool = True) -> Dict[str, Any]:
         """
@@ -32,17 +123,25 @@ class ImageFeatureExtractor:
         features = {}
         
         # Informations de base
-        features.update(self._extract_basic_info(image_path))
+        with trace_stage("basic_info"):
+            features.update(self._extract_basic_info(image_path))
         
         # Caractéristiques visuelles de base
-        features.update(self._extract_color_features(image_path))
-        features.update(self._extract_brightness_contrast(image_path))
+        with trace_stage("colour"):
+            features.update(self._extract_color_features(image_path))
+        with trace_stage("brightness"):
+            features.update(self._extract_brightness_contrast(image_path))
+        with trace_stage("colour_statistics"):
+            features.update(self._extract_colour_statistics(image_path))
         
         # Caractéristiques avancées (optionnelles pour performance)
         if include_advanced:
-            features.update(self._extract_texture_features(image_path))
-            features.update(self._extract_shape_features(image_path))
-            features.update(self._extract_histogram_features(image_path))
+            with trace_stage("texture"):
+                features.update(self._extract_texture_features(image_path))
+            with trace_stage("contours"):
+                features.update(self._extract_shape_features(image_path))
+            with trace_stage("histogram"):
+                features.update(self._extract_histogram_features(image_path))
         
         # Métadonnées temporelles
         features['extraction_timestamp'] = datetime.now().isoformat()
@@ -122,6 +221,13 @@ class ImageFeatureExtractor:
             
         return features
     
+    def _extract_colour_statistics(self, image_path: str) -> Dict[str, Any]:
+        """Caractéristiques couleur du jeu annoté (df_features_img.csv), sur l'image d'analyse réduite."""
+        img = load_analysis_image(image_path)
+        if img is None:
+            return {}
+        return colour_statistics(img)
+    
     def _extract_brightness_contrast(self, image_path: str) -> Dict[str, Any]:
         """Extrait les caractéristiques de luminance et contraste."""
         features = {}
@@ -187,8 +293,20 @@ class ImageFeatureExtractor:
         
         return features
     
+    def _scratch_buffers(self, shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Deux tampons float32 de la taille de l'image, réutilisés d'une image à l'autre (batch_extract)."""
+        if self._scratch is None or self._scratch[0].shape != shape:
+            self._scratch = (np.empty(shape, np.float32), np.empty(shape, np.float32))
+        return self._scratch
+
     def _extract_texture_features(self, image_path: str) -> Dict[str, Any]:
-        """Extrait les caractéristiques de texture et contours."""
+        """
+        Extrait les caractéristiques de texture et contours.
+
+        Gradients et variance locale calculés en float32 dans deux tampons
+        réutilisés (opérations OpenCV en place, sans temporaires NumPy) :
+        environ 10 octets par pixel au lieu d'une quarantaine en float64.
+        """
         features = {}
         
         img = cv2.imread(image_path)
@@ -196,25 +314,33 @@ class ImageFeatureExtractor:
             return features
         
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        del img
         
         # Détection de contours avec Canny
         edges = cv2.Canny(gray, 50, 150)
-        features['edge_density'] = round(np.sum(edges > 0) / edges.size, 4)
-        features['total_edges'] = int(np.sum(edges > 0))
+        total_edges = cv2.countNonZero(edges)
+        features['edge_density'] = round(total_edges / edges.size, 4)
+        features['total_edges'] = total_edges
+        del edges
+        
+        a, b = self._scratch_buffers(gray.shape)
         
         # Gradient (variation locale)
-        grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_magnitude = np.sqrt(grad_x**2 + grad_y**2)
-        
-        features['gradient_mean'] = round(np.mean(gradient_magnitude), 2)
-        features['gradient_std'] = round(np.std(gradient_magnitude), 2)
-        
-        # Texture (variance locale)
-        kernel = np.ones((5,5), np.float32) / 25
-        mean_local = cv2.filter2D(gray.astype(np.float32), -1, kernel)
-        variance_local = cv2.filter2D((gray.astype(np.float32) - mean_local)**2, -1, kernel)
-        features['texture_mean'] = round(np.mean(variance_local), 2)
+        cv2.Sobel(gray, cv2.CV_32F, 1, 0, dst=a, ksize=3)
+        cv2.Sobel(gray, cv2.CV_32F, 0, 1, dst=b, ksize=3)
+        cv2.magnitude(a, b, a)
+        mean, std = cv2.meanStdDev(a)
+        
+        features['gradient_mean'] = round(float(mean[0, 0]), 2)
+        features['gradient_std'] = round(float(std[0, 0]), 2)
+        
+        # Texture (variance locale) : moyenne 5x5 des écarts au carré à la moyenne locale 5x5
+        np.copyto(a, gray)
+        cv2.boxFilter(a, -1, (5, 5), dst=b)
+        cv2.subtract(a, b, dst=a)
+        cv2.multiply(a, a, dst=a)
+        cv2.boxFilter(a, -1, (5, 5), dst=b)
+        features['texture_mean'] = round(cv2.mean(b)[0], 2)
         
         return features
     
@@ -0,0 +1,193 @@
+"""
+Stockage binaire du jeu annoté (Data/csv/df_features_img.csv + df_fichiers_img.csv).
+
+Un répertoire (Data/store par défaut) contient :
+
+  features.npy  float32 (n, 33)  caractéristiques couleur, ordre de COLOUR_STATISTICS
+  ids.npy       int64 (n,)       colonne id des CSV
+  labels.npy    uint8 (n,)       indice dans meta.json["labels"]
+  files.npy     tableau structuré (n,) : métadonnées numériques de df_fichiers_img.csv
+  chemins.txt   un chemin par ligne
+  meta.json     noms des colonnes, des classes et source
+
+Les .npy sont ouverts en mémoire mappée (np.load(mmap_mode="r")) : aucun
+parsing, aucune copie, pages partagées entre les processus d'une même machine.
+append() ajoute des lignes en fin de fichier puis réécrit l'en-tête .npy en
+place (NumPy réserve la place pour que la forme puisse grandir) ; un seul
+écrivain à la fois.
+
+Conversion depuis les CSV :
+    python -m detection.ai.feature_store [--output Data/store]
+"""
+import argparse
+import csv
+import json
+import os
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from detection.ai.feature_extractor import COLOUR_STATISTICS
+
+DEFAULT_STORE_PATH = "Data/store"
+DEFAULT_FEATURES_CSV = "Data/csv/df_features_img.csv"
+DEFAULT_FILES_CSV = "Data/csv/df_fichiers_img.csv"
+
+LABELS = ("vide", "pleine")
+CSV_LABELS = {"clean": "vide", "dirty": "pleine"}
+
+FILE_FIELDS = np.dtype([
+    ("taille", "<f4"), ("hauteur", "<i4"), ("largeur", "<i4"), ("pixels", "<i8"),
+    ("latitude", "<f8"), ("longitude", "<f8"),
+])
+
+_ARRAYS = {
+    "features": lambda width: np.dtype(("<f4", (width,))),
+    "ids": lambda width: np.dtype("<i8"),
+    "labels": lambda width: np.dtype("u1"),
+    "files": lambda width: FILE_FIELDS,
+}
+
+
+def _array_path(path: str, name: str) -> str:
+    return os.path.join(path, f"{name}.npy")
+
+
+def _append_rows(filename: str, rows: np.ndarray) -> None:
+    """Ajoute des lignes à un .npy existant et met à jour la forme dans l'en-tête."""
+    with open(filename, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        header_size = f.tell()
+        rows = np.ascontiguousarray(rows, dtype=dtype)
+        if rows.shape[1:] != shape[1:]:
+            raise ValueError(f"{filename}: lignes de forme {rows.shape[1:]}, attendu {shape[1:]}")
+        f.seek(0, os.SEEK_END)
+        f.write(rows.tobytes())
+        f.seek(0)
+        header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": fortran_order,
+                  "shape": (shape[0] + len(rows),) + shape[1:]}
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(f, header)
+        else:
+            np.lib.format.write_array_header_2_0(f, header)
+        if f.tell() != header_size:
+            raise ValueError(f"{filename}: en-tête trop petit pour la nouvelle forme")
+
+
+class FeatureStore:
+    """Jeu annoté ouvert en lecture seule (tableaux mappés en mémoire)."""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.feature_names = self.meta["features"]
+        self.classes = tuple(self.meta["labels"])
+        arrays = {name: np.load(_array_path(path, name), mmap_mode="r") for name in _ARRAYS}
+        # Un écrivain concurrent a pu compléter un fichier et pas encore les autres
+        self.size = min(len(a) for a in arrays.values())
+        self.features = arrays["features"][:self.size]
+        self.ids = arrays["ids"][:self.size]
+        self.labels = arrays["labels"][:self.size]
+        self.files = arrays["files"][:self.size]
+        self._chemins = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def chemins(self):
+        """Chemins des images (lus à la première demande)."""
+        if self._chemins is None:
+            with open(os.path.join(self.path, "chemins.txt"), encoding="utf-8") as f:
+                self._chemins = f.read().splitlines()[:self.size]
+        return self._chemins
+
+    def label_names(self, indices: Optional[Sequence[int]] = None):
+        codes = self.labels if indices is None else self.labels[np.asarray(indices)]
+        return [self.classes[code] for code in codes]
+
+    @staticmethod
+    def create(path: str, feature_names: Sequence[str] = COLOUR_STATISTICS, source: Optional[Dict] = None) -> None:
+        """Crée un stockage vide (écrase l'existant)."""
+        os.makedirs(path, exist_ok=True)
+        for name, dtype in _ARRAYS.items():
+            np.save(_array_path(path, name), np.empty(0, dtype=dtype(len(feature_names))))
+        open(os.path.join(path, "chemins.txt"), "w", encoding="utf-8").close()
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"features": list(feature_names), "labels": list(LABELS), "source": source or {}}, f, indent=2)
+
+    @staticmethod
+    def append(path: str, features: np.ndarray, ids: Sequence[int], labels: Sequence[str],
+               chemins: Sequence[str], files: Optional[np.ndarray] = None) -> None:
+        """Ajoute n lignes ; `files` (FILE_FIELDS) vaut NaN / 0 si absent."""
+        features = np.asarray(features, dtype=np.float32).reshape(len(ids), -1)
+        if files is None:
+            files = np.zeros(len(ids), dtype=FILE_FIELDS)
+            files["taille"] = files["latitude"] = files["longitude"] = np.nan
+        if any("\n" in chemin for chemin in chemins):
+            raise ValueError("Chemin contenant un retour à la ligne")
+        _append_rows(_array_path(path, "features"), features)
+        _append_rows(_array_path(path, "ids"), np.asarray(ids, dtype=np.int64))
+        _append_rows(_array_path(path, "labels"), np.asarray([LABELS.index(label) for label in labels], dtype=np.uint8))
+        _append_rows(_array_path(path, "files"), files)
+        with open(os.path.join(path, "chemins.txt"), "a", encoding="utf-8") as f:
+            f.writelines(f"{chemin}\n" for chemin in chemins)
+
+
+def _float(value, default=np.nan):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def read_files_csv(path: str = DEFAULT_FILES_CSV) -> Dict[int, tuple]:
+    """id -> ligne FILE_FIELDS de df_fichiers_img.csv."""
+    rows = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            rows[int(row["id"])] = (
+                _float(row["taille"]), int(_float(row["hauteur"], 0)), int(_float(row["largeur"], 0)),
+                int(_float(row["pixels"], 0)), _float(row["latitude"]), _float(row["longitude"]),
+            )
+    return rows
+
+
+def convert_csv(output: str = DEFAULT_STORE_PATH, features_csv: str = DEFAULT_FEATURES_CSV,
+                files_csv: Optional[str] = DEFAULT_FILES_CSV) -> int:
+    """(Re)construit le stockage depuis les CSV ; retourne le nombre de lignes."""
+    files = read_files_csv(files_csv) if files_csv and os.path.exists(files_csv) else {}
+    missing = (np.nan, 0, 0, 0, np.nan, np.nan)
+    features, ids, labels, chemins = [], [], [], []
+    with open(features_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            label = CSV_LABELS.get(row["classe"].strip().lower())
+            if label is None:
+                continue
+            try:
+                features.append([float(row[name]) for name in COLOUR_STATISTICS])
+            except (KeyError, ValueError):
+                continue
+            ids.append(int(row["id"]))
+            labels.append(label)
+            chemins.append(row["chemin"])
+
+    FeatureStore.create(output, source={"features": features_csv, "files": files_csv})
+    FeatureStore.append(
+        output, np.asarray(features, dtype=np.float32).reshape(-1, len(COLOUR_STATISTICS)), ids, labels, chemins,
+        np.array([files.get(i, missing) for i in ids], dtype=FILE_FIELDS),
+    )
+    return len(ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convertit les CSV du jeu annoté en stockage binaire.")
+    parser.add_argument("--features", default=DEFAULT_FEATURES_CSV)
+    parser.add_argument("--files", default=DEFAULT_FILES_CSV)
+    parser.add_argument("--output", default=DEFAULT_STORE_PATH)
+    args = parser.parse_args()
+    count = convert_csv(args.output, args.features, args.files)
+    print(f"{count} lignes -> {args.output}")
@@ -5,6 +5,5 @@ class DetectionConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "detection"
 
-
-def ready(self):
-    import detection.signals
+    def ready(self):
+        import detection.signals
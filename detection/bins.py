@@ -0,0 +1,141 @@
+"""
+Données de la carte (/api/bins/) : version des données et réponses mises en cache.
+
+La version est un compteur stocké dans le cache, incrémenté par les signaux
+post_save / post_delete d'ImageUpload. Sa valeur est un horodatage en
+microsecondes (strictement croissant), ce qui donne à la fois l'ETag et le
+Last-Modified. Les réponses sérialisées sont mises en cache par version et par
+forme de requête : une nouvelle version rend les anciennes entrées inutilisées,
+qui expirent d'elles-mêmes.
+
+bulk_create / update() / delete() sur un queryset ne déclenchent pas les
+signaux : appeler bump_data_version() après ce type d'écriture.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from . import metrics
+from .models import ImageUpload
+
+DATA_VERSION_KEY = "bins:version"
+PAYLOAD_CACHE_TIMEOUT = 24 * 3600
+
+# Valeurs de ?classe= acceptées (annotation)
+CLASSES = tuple(value for value, _ in ImageUpload._meta.get_field('annotation').choices)
+
+
+def _now_version():
+    return time.time_ns() // 1000
+
+
+def get_data_version():
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        # Cache vidé ou premier appel : nouvelle version, les ETag déjà distribués deviennent invalides
+        cache.add(DATA_VERSION_KEY, _now_version(), None)
+        version = cache.get(DATA_VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """Nouvelle version, toujours supérieure à la précédente même si l'horloge recule."""
+    version = max(_now_version(), (cache.get(DATA_VERSION_KEY) or 0) + 1)
+    cache.set(DATA_VERSION_KEY, version, None)
+    return version
+
+
+def last_modified(version):
+    """Horodatage (secondes) de la version, pour Last-Modified / If-Modified-Since."""
+    return version // 1_000_000
+
+
+def query_shape(request):
+    """Paramètres qui changent le contenu de la réponse (clé de cache et ETag) : format négocié et filtre."""
+    renderer = getattr(request, 'accepted_renderer', None)
+    classe = request.GET.get('classe')
+    return f"{renderer.format if renderer else 'json'}:classe={classe if classe in CLASSES else 'all'}"
+
+
+def bins_etag(request, version):
+    return f"{version}-{query_shape(request)}"
+
+
+def bins_queryset(request):
+    bins = ImageUpload.objects.all()
+    classe = request.GET.get('classe')
+    if classe in CLASSES:
+        bins = bins.filter(annotation=classe)
+    return bins
+
+
+def bins_stats():
+    """Comptages de la carte en une seule requête d'agrégation."""
+    return ImageUpload.objects.aggregate(
+        total=Count('id'),
+        pleine=Count('id', filter=Q(annotation="pleine")),
+        vide=Count('id', filter=Q(annotation="vide")),
+        inconnu=Count('id', filter=Q(annotation="auto")),
+    )
+
+
+# Champ exposé -> champ du modèle
+ROW_FIELDS = {
+    "id": "id",
+    "chemin": "chemin",
+    "type": "type",
+    "date": "date_csv",
+    "taille": "taille",
+    "hauteur": "hauteur",
+    "largeur": "largeur",
+    "pixels": "pixels",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "classe": "annotation",
+}
+
+# Champs stockés en texte, convertis en nombres dans le format colonnes
+NUMERIC_FIELDS = {"taille": float, "hauteur": int, "largeur": int, "pixels": int}
+
+# Seuls champs du format binaire (couche carte)
+PACKED_FIELDS = ("id", "latitude", "longitude", "classe")
+
+
+def _to_number(value, cast):
+    try:
+        return cast(float(value)) if cast is int else cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def bins_rows(queryset):
+    """Format historique : un objet par poubelle."""
+    names = list(ROW_FIELDS)
+    return [dict(zip(names, row)) for row in queryset.values_list(*ROW_FIELDS.values())]
+
+
+def bins_columns(queryset, fields=tuple(ROW_FIELDS)):
+    """Un tableau par champ ; `classe` devient l'indice de l'annotation dans CLASSES."""
+    rows = list(queryset.values_list(*(ROW_FIELDS[f] for f in fields)))
+    columns = dict(zip(fields, (list(col) for col in zip(*rows)))) if rows else {f: [] for f in fields}
+    for field, cast in NUMERIC_FIELDS.items():
+        if field in columns:
+            columns[field] = [_to_number(v, cast) for v in columns[field]]
+    codes = {value: code for code, value in enumerate(CLASSES)}
+    columns["classe"] = [codes.get(v, codes["non"]) for v in columns["classe"]]
+    return {"count": len(rows), "classes": list(CLASSES), "columns": columns}
+
+
+def cached_payload(request, version, build):
+    """
+    Corps de réponse déjà sérialisé pour (version, forme de requête), ou
+    `build()` (octets) mis en cache en cas d'absence.
+    """
+    key = f"bins:payload:{version}:{query_shape(request)}"
+    body = cache.get(key)
+    metrics.inc('urbin_cache_requests_total', cache='bins', result='miss' if body is None else 'hit')
+    if body is None:
+        body = build()
+        cache.set(key, body, PAYLOAD_CACHE_TIMEOUT)
+    return body
@@ -0,0 +1,161 @@
+"""
+Upload reprenable en morceaux, pour les réseaux mobiles instables :
+
+  1. POST /api/uploads/                   taille, nom, usage (upload | analyze), champs du formulaire
+  2. PUT  /api/uploads/<id>/              corps brut, en-tête "Content-Range: bytes début-fin/total"
+     GET  /api/uploads/<id>/              octets déjà reçus (reprise après coupure)
+  3. POST /api/uploads/<id>/finalize/     enregistrement (ou analyse) de l'image complète
+
+Chaque morceau est ajouté au fichier temporaire MEDIA_ROOT/temp/chunks/<id>.part
+à l'offset attendu ; ce qui est arrivé avant une coupure est conservé. Le SHA-256
+est mis à jour au fil des morceaux (état gardé par processus, recalculé depuis
+le fichier si le morceau précédent a été reçu par un autre worker) et l'en-tête
+EXIF est lu dès que ses HEADER_READ_SIZE premiers octets sont là.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows (développement) : pas de verrou entre workers
+    fcntl = None
+
+from django.conf import settings
+
+from .gps_utils import HEADER_READ_SIZE, extract_gps_from_bytes
+
+SPOOL_DIR = os.path.join('temp', 'chunks')
+READ_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+# États SHA-256 gardés en mémoire (sessions actives du processus)
+HASHER_CACHE_SIZE = 256
+
+
+class UploadBusy(Exception):
+    """Un autre morceau (ou la finalisation) de la même session est en cours de traitement."""
+
+
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+_lock = threading.Lock()
+_hashers = OrderedDict()  # id de session -> (offset, hasher)
+
+
+def spool_path(session):
+    return os.path.join(settings.MEDIA_ROOT, SPOOL_DIR, f"{session.id}.part")
+
+
+def parse_content_range(header):
+    """"bytes 0-1048575/10485760" -> (0, 1048575, 10485760), None si invalide."""
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        return None
+    start, end, total = (int(g) for g in match.groups())
+    return (start, end, total) if start <= end < total else None
+
+
+def _hasher(session):
+    """SHA-256 des `session.received` premiers octets : état en mémoire, sinon relu depuis le fichier."""
+    key = str(session.id)
+    with _lock:
+        cached = _hashers.pop(key, None)
+    if cached is not None and cached[0] == session.received:
+        return cached[1]
+    hasher = hashlib.sha256()
+    remaining = session.received
+    if remaining:
+        with open(spool_path(session), 'rb') as f:
+            while remaining:
+                block = f.read(min(READ_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+    return hasher
+
+
+def _remember(session, hasher):
+    with _lock:
+        _hashers[str(session.id)] = (session.received, hasher)
+        while len(_hashers) > HASHER_CACHE_SIZE:
+            _hashers.popitem(last=False)
+
+
+def forget(session):
+    with _lock:
+        _hashers.pop(str(session.id), None)
+
+
+@contextmanager
+def spool_file(session, create=True):
+    """
+    Fichier temporaire de la session, ouvert en lecture/écriture sous verrou
+    exclusif non bloquant (flock) : UploadBusy si un autre worker le tient,
+    FileNotFoundError s'il n'existe pas et que `create` est faux.
+    La session est relue en base une fois le verrou pris.
+    """
+    path = spool_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    flags = os.O_RDWR | (os.O_CREAT if create else 0)
+    with os.fdopen(os.open(path, flags, 0o600), 'r+b') as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadBusy()
+        session.refresh_from_db()
+        yield f
+
+
+def append_chunk(session, f, stream, length):
+    """
+    Écrit `length` octets lus dans `stream` à l'offset `session.received` du
+    fichier `f` (ouvert par spool_file). Met à jour received et la position
+    EXIF, et retourne le nombre d'octets écrits (moins que `length` si la
+    connexion a été coupée).
+    """
+    hasher = _hasher(session)
+    written = 0
+    f.seek(session.received)
+    try:
+        while written < length:
+            block = stream.read(min(READ_SIZE, length - written))
+            if not block:
+                break
+            f.write(block)
+            hasher.update(block)
+            written += len(block)
+    except OSError:
+        # Coupure pendant la lecture du corps : ce qui est arrivé est gardé
+        pass
+    # Restes d'une tentative précédente interrompue au-delà de l'offset validé
+    f.truncate()
+    f.flush()
+    session.received += written
+    _remember(session, hasher)
+
+    if not session.exif_checked and (session.received >= HEADER_READ_SIZE or session.received == session.size):
+        f.seek(0)
+        gps = extract_gps_from_bytes(f.read(HEADER_READ_SIZE))
+        if gps:
+            session.latitude, session.longitude = gps
+        session.exif_checked = True
+    return written
+
+
+def digest(session):
+    """SHA-256 hexadécimal du fichier complet."""
+    return _hasher(session).hexdigest()
+
+
+def discard(session):
+    forget(session)
+    try:
+        os.remove(spool_path(session))
+    except FileNotFoundError:
+        pass
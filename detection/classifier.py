@@ -0,0 +1,111 @@
+"""
+Moteur de classification des images, choisi par settings.CLASSIFIER_ENGINE :
+
+  - "rules" : seuils fixes (demo_extraction.classify_image), comportement historique
+  - "knn"   : k plus proches voisins (detection/ai/knn_classifier.py) sur les
+              exemples de Data/csv/df_features_img.csv et les uploads dont
+              l'annotation a été confirmée par un modérateur (ImageUpload.features,
+              annotation_verified_at) ; Data/store (stockage
+              binaire, detection/ai/feature_store.py) remplace le CSV s'il existe.
+              Expérimental : 0,63 d'exactitude en validation croisée sur le CSV,
+              à peine mieux que la classe majoritaire (0,55) ; pas un remplaçant
+              de "rules"
+
+La base k-NN est chargée une fois par processus puis complétée au fil de
+l'eau : quand la version des données change (detection.bins), seuls les
+uploads confirmés après le dernier chargé (annotation_verified_at, puis id)
+sont ajoutés. Les annotations non confirmées ne sont jamais apprises :
+n'importe quel utilisateur pourrait sinon fausser la base.
+"""
+import threading
+
+from django.conf import settings
+from django.db.models import Q
+
+from .bins import get_data_version
+from .models import ImageUpload
+from .tracing import trace_stage
+
+_lock = threading.Lock()
+_state = {'classifier': None, 'last_verified': None, 'version': None}
+
+
+def engine_name():
+    return getattr(settings, 'CLASSIFIER_ENGINE', 'rules')
+
+
+def _verified_uploads(after):
+    """Uploads confirmés par un modérateur après `after` ((annotation_verified_at, id) ou None)."""
+    from .ai.knn_classifier import LABELS
+    uploads = ImageUpload.objects.filter(
+        annotation_verified_at__isnull=False, features__isnull=False, annotation__in=LABELS,
+    )
+    if after is not None:
+        verified_at, upload_id = after
+        uploads = uploads.filter(
+            Q(annotation_verified_at__gt=verified_at) | Q(annotation_verified_at=verified_at, id__gt=upload_id)
+        )
+    return (uploads.order_by('annotation_verified_at', 'id')
+            .values_list('annotation_verified_at', 'id', 'features', 'annotation'))
+
+
+def knn_classifier():
+    """Classifieur k-NN du processus, synchronisé avec les uploads confirmés récents."""
+    from .ai.knn_classifier import KNNClassifier, vector_from_features
+
+    version = get_data_version()
+    with _lock:
+        classifier = _state['classifier']
+        if classifier is None:
+            classifier = KNNClassifier.load(str(settings.BASE_DIR), k=getattr(settings, 'KNN_NEIGHBOURS', 7))
+            _state['classifier'] = classifier
+        elif _state['version'] == version:
+            return classifier
+        for verified_at, upload_id, features, annotation in _verified_uploads(_state['last_verified']):
+            try:
+                classifier.add_sample(vector_from_features(features), annotation)
+            except (KeyError, TypeError, ValueError):
+                pass
+            _state['last_verified'] = (verified_at, upload_id)
+        _state['version'] = version
+        return classifier
+
+
+def classify_path(image_path):
+    """
+    Classe une image avec le moteur configuré.
+    Retourne {"status": "pleine"|"vide", "score", "details", "engine"}.
+    """
+    engine = engine_name()
+    if engine == 'knn':
+        from .ai.knn_classifier import image_feature_vector
+        vector = image_feature_vector(image_path)
+        with trace_stage('knn'):
+            prediction = knn_classifier().predict(vector)
+        return {
+            "status": prediction['label'],
+            "score": prediction['score'],
+            "details": {"neighbour_distances": prediction['neighbour_distances']},
+            "engine": engine,
+        }
+
+    from .ai.demo_extraction import extract_features, classify_image, load_rules
+    result = classify_image(extract_features(image_path), load_rules())
+    return {
+        "status": "pleine" if result['classification'] == "Poubelle pleine" else "vide",
+        "score": result['fullness_score'],
+        "details": result['validation_details'],
+        "engine": "rules",
+    }
+
+
+def feature_snapshot(image_file):
+    """Caractéristiques couleur d'un fichier uploadé (exemple pour la base k-NN), curseur remis au début."""
+    from .ai.feature_extractor import colour_statistics, decode_analysis_image
+
+    image_file.seek(0)
+    image = decode_analysis_image(image_file.read())
+    image_file.seek(0)
+    if image is None:
+        return None
+    return {name: round(float(v), 4) for name, v in colour_statistics(image).items()}
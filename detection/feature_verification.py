@@ -0,0 +1,136 @@
+"""
+Caractéristiques couleur calculées par le client ("trust but verify").
+
+Le client envoie, avec l'image, les 33 caractéristiques de
+df_features_img.csv (champ `features`, objet JSON ou liste dans l'ordre de
+COLOUR_STATISTICS) calculées sur une miniature (THUMBNAIL_MAX_SIDE pixels au
+plus) qu'il joint (champ `thumbnail`). Le serveur :
+
+  1. recalcule les caractéristiques sur la miniature (quelques centaines de
+     microsecondes) et les compare à celles du client, aux écarts de
+     compression JPEG près (TOLERANCES) ;
+  2. vérifie que la miniature est bien celle de l'image : même proportions
+     que l'image redressée selon son orientation EXIF, dHash proche de
+     celui de l'image ;
+  3. pour une fraction FEATURE_SPOT_CHECK_RATE des uploads, décode l'image
+     en pleine résolution, la réduit à la taille de la miniature et compare
+     à nouveau (tolérance doublée : rééchantillonnage différent du client).
+
+Ce sont les valeurs recalculées sur la miniature qui sont gardées. Un envoi
+rejeté est marqué (ImageUpload.features_source = "rejected") : les abus
+restent visibles par utilisateur.
+"""
+import io
+import json
+import random
+
+import cv2
+import numpy as np
+
+from .ai.feature_extractor import COLOUR_STATISTICS, colour_statistics, decode_analysis_image
+from .image_hash import MAX_DISTANCE, compute_dhash, hamming_distance
+
+THUMBNAIL_MAX_SIDE = 320
+THUMBNAIL_MAX_BYTES = 256 * 1024
+# Écart absolu toléré par type de caractéristique (niveaux de gris, % pour les histogrammes) ;
+# la variance est comparée en relatif
+TOLERANCES = {"mean": 3, "std": 3, "25p": 6, "50p": 6, "75p": 6, "iqr": 8, "hist": 3}
+VAR_RELATIVE_TOLERANCE = 0.15
+SPOT_CHECK_FACTOR = 2
+ASPECT_TOLERANCE = 0.03
+
+
+class FeaturesRejected(Exception):
+    """Caractéristiques du client incohérentes avec l'image ; `reason` indique la vérification en échec."""
+
+    def __init__(self, reason, details=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.details = details or []
+
+
+def parse_features(raw):
+    """Objet JSON {nom: valeur} ou liste de 33 valeurs -> dict ; ValueError si invalide."""
+    value = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+    if isinstance(value, list):
+        if len(value) != len(COLOUR_STATISTICS):
+            raise ValueError(f"features doit contenir {len(COLOUR_STATISTICS)} valeurs")
+        value = dict(zip(COLOUR_STATISTICS, value))
+    if not isinstance(value, dict):
+        raise ValueError("features doit être un objet ou une liste")
+    features = {name: float(value[name]) for name in COLOUR_STATISTICS}
+    if not all(np.isfinite(v) for v in features.values()):
+        raise ValueError("features contient des valeurs non finies")
+    return features
+
+
+def deviations(claimed, actual, factor=1):
+    """Noms des caractéristiques dont l'écart dépasse la tolérance (multipliée par `factor`)."""
+    out = []
+    for name in COLOUR_STATISTICS:
+        kind = name.rsplit('_', 1)[1]
+        if kind == "var":
+            limit = VAR_RELATIVE_TOLERANCE * factor * max(actual[name], 1.0)
+        else:
+            limit = TOLERANCES["hist" if "_hist_" in name else kind] * factor
+        if abs(claimed[name] - actual[name]) > limit:
+            out.append(name)
+    return out
+
+
+def _image_size(image_file):
+    """Taille (largeur, hauteur) de l'image redressée selon son orientation EXIF."""
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(image_file) as img:
+            width, height = img.size
+            # exif_transpose sur l'image réduite par draft() : pas de décodage pleine résolution
+            img.draft('L', (width // 8, height // 8))
+            rotated = ImageOps.exif_transpose(img).size != img.size
+            return (height, width) if rotated else (width, height)
+    except Exception:
+        return None
+    finally:
+        image_file.seek(0)
+
+
+def verify(claimed, thumbnail_file, image_file, phash, spot_check_rate=0.0):
+    """
+    Retourne (caractéristiques recalculées sur la miniature, "client" | "client_checked"),
+    ou lève FeaturesRejected.
+    """
+    if thumbnail_file.size > THUMBNAIL_MAX_BYTES:
+        raise FeaturesRejected("thumbnail_size")
+    data = thumbnail_file.read()
+    thumbnail = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if thumbnail is None or max(thumbnail.shape[:2]) > THUMBNAIL_MAX_SIDE:
+        raise FeaturesRejected("thumbnail_size")
+
+    actual = colour_statistics(thumbnail)
+    mismatched = deviations(claimed, actual)
+    if mismatched:
+        raise FeaturesRejected("features", mismatched)
+
+    # La miniature doit être celle de l'image envoyée : proportions et dHash
+    size = _image_size(image_file)
+    height, width = thumbnail.shape[:2]
+    if size is None or abs(width / height - size[0] / size[1]) > ASPECT_TOLERANCE * size[0] / size[1]:
+        raise FeaturesRejected("thumbnail_aspect")
+    thumbnail_hash = compute_dhash(io.BytesIO(data))
+    if phash is None or thumbnail_hash is None or hamming_distance(phash, thumbnail_hash) > MAX_DISTANCE:
+        raise FeaturesRejected("thumbnail_hash")
+
+    if random.random() >= spot_check_rate:
+        return actual, "client"
+
+    image_file.seek(0)
+    full = decode_analysis_image(image_file.read())
+    image_file.seek(0)
+    if full is None:
+        raise FeaturesRejected("image")
+    reference = colour_statistics(cv2.resize(full, (width, height), interpolation=cv2.INTER_AREA))
+    mismatched = deviations(claimed, reference, SPOT_CHECK_FACTOR)
+    if mismatched:
+        raise FeaturesRejected("spot_check", mismatched)
+    return actual, "client_checked"
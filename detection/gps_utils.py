@@ -1,42 +1,161 @@
-from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
+import struct
 
-def extract_gps_from_image(image_path):
-    try:
-        image = Image.open(image_path)
-        exif_data = image._getexif()
-        if not exif_data:
+# Le segment APP1 (EXIF) est limité à 64 Ko et suit au plus un APP0 : 128 Ko suffisent
+HEADER_READ_SIZE = 128 * 1024
+
+GPS_IFD_TAG = 0x8825
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+
+# Types TIFF utiles : ASCII, SHORT, LONG, RATIONAL, SRATIONAL
+TYPE_ASCII = 2
+TYPE_SHORT = 3
+TYPE_LONG = 4
+TYPE_RATIONAL = 5
+TYPE_SRATIONAL = 10
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+
+
+def dms_to_dd(d, m, s, ref):
+    dd = d + m / 60.0 + s / 3600.0
+    if ref in ["S", "W"]:
+        dd *= -1
+    return dd
+
+
+def _find_exif_segment(data):
+    """Retourne le bloc TIFF du segment APP1 'Exif' d'un JPEG, sans décoder les pixels."""
+    if data[:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    size = len(data)
+    while pos + 4 <= size:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # octet de remplissage
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):  # fin d'image / début des données compressées
             return None
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # marqueurs sans longueur
+            pos += 2
+            continue
+        length = struct.unpack_from('>H', data, pos + 2)[0]
+        if marker == 0xE1 and data[pos + 4:pos + 10] == b'Exif\x00\x00':
+            return data[pos + 10:pos + 2 + length]
+        pos += 2 + length
+    return None
 
-        gps_info = {}
-        for tag, value in exif_data.items():
-            decoded = TAGS.get(tag)
-            if decoded == "GPSInfo":
-                for t in value:
-                    sub_decoded = GPSTAGS.get(t)
-                    gps_info[sub_decoded] = value[t]
-
-        def dms_to_dd(d, m, s, ref):
-            dd = d + m / 60.0 + s / 3600.0
-            if ref in ["S", "W"]:
-                dd *= -1
-            return dd
-
-        if "GPSLatitude" in gps_info and "GPSLatitudeRef" in gps_info \
-           and "GPSLongitude" in gps_info and "GPSLongitudeRef" in gps_info:
-            lat_dms = gps_info["GPSLatitude"]
-            lon_dms = gps_info["GPSLongitude"]
-            lat = dms_to_dd(lat_dms[0][0]/lat_dms[0][1],
-                            lat_dms[1][0]/lat_dms[1][1],
-                            lat_dms[2][0]/lat_dms[2][1],
-                            gps_info["GPSLatitudeRef"])
-            lon = dms_to_dd(lon_dms[0][0]/lon_dms[0][1],
-                            lon_dms[1][0]/lon_dms[1][1],
-                            lon_dms[2][0]/lon_dms[2][1],
-                            gps_info["GPSLongitudeRef"])
-            return (lat, lon)
+
+def _read_ifd(tiff, offset, endian):
+    """Lit les entrées d'un IFD : {tag: (type, count, offset de la valeur)}."""
+    count = struct.unpack_from(endian + 'H', tiff, offset)[0]
+    entries = {}
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        tag, typ, n = struct.unpack_from(endian + 'HHI', tiff, entry)
+        # Les valeurs de 4 octets ou moins sont stockées directement dans l'entrée
+        if TYPE_SIZES.get(typ, 1) * n <= 4:
+            value_offset = entry + 8
+        else:
+            value_offset = struct.unpack_from(endian + 'I', tiff, entry + 8)[0]
+        entries[tag] = (typ, n, value_offset)
+    return entries
+
+
+def _read_value(tiff, entry, endian):
+    typ, n, offset = entry
+    if typ == TYPE_ASCII:
+        return tiff[offset:offset + n].split(b'\x00', 1)[0].decode('ascii', 'ignore').strip()
+    if typ in (TYPE_RATIONAL, TYPE_SRATIONAL):
+        fmt = endian + ('%dI' if typ == TYPE_RATIONAL else '%di') % (2 * n)
+        raw = struct.unpack_from(fmt, tiff, offset)
+        return [num / den if den else 0.0 for num, den in zip(raw[::2], raw[1::2])]
+    if typ in (TYPE_SHORT, TYPE_LONG):
+        fmt = endian + ('%dH' if typ == TYPE_SHORT else '%dI') % n
+        return [float(v) for v in struct.unpack_from(fmt, tiff, offset)]
+    return None
+
+
+def extract_gps_from_bytes(data):
+    """
+    Extrait (latitude, longitude) en degrés décimaux depuis le début d'un fichier JPEG.
+
+    Seul le segment APP1 est parcouru (IFD0 -> IFD GPS) : aucun décodage de
+    pixels, quelques microsecondes par image.
+    """
+    try:
+        tiff = _find_exif_segment(data)
+        if not tiff or len(tiff) < 8:
+            return None
+        if tiff[:2] == b'II':
+            endian = '<'
+        elif tiff[:2] == b'MM':
+            endian = '>'
         else:
             return None
+
+        ifd0 = _read_ifd(tiff, struct.unpack_from(endian + 'I', tiff, 4)[0], endian)
+        if GPS_IFD_TAG not in ifd0:
+            return None
+        gps_offset = struct.unpack_from(endian + 'I', tiff, ifd0[GPS_IFD_TAG][2])[0]
+        gps = _read_ifd(tiff, gps_offset, endian)
+        if not all(tag in gps for tag in (GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE)):
+            return None
+
+        lat = _read_value(tiff, gps[GPS_LATITUDE], endian)
+        lon = _read_value(tiff, gps[GPS_LONGITUDE], endian)
+        if not lat or not lon or len(lat) < 3 or len(lon) < 3:
+            return None
+        return (
+            dms_to_dd(lat[0], lat[1], lat[2], _read_value(tiff, gps[GPS_LATITUDE_REF], endian)),
+            dms_to_dd(lon[0], lon[1], lon[2], _read_value(tiff, gps[GPS_LONGITUDE_REF], endian)),
+        )
+    except (struct.error, IndexError, ValueError):
+        return None
+
+
+def read_gps(image_file):
+    """Coordonnées GPS d'un fichier uploadé (lecture de l'en-tête seulement, curseur remis au début)."""
+    try:
+        image_file.seek(0)
+        head = image_file.read(HEADER_READ_SIZE)
+    finally:
+        image_file.seek(0)
+    return extract_gps_from_bytes(head)
+
+
+def extract_gps_with_pil(image_path):
+    """Chemin PIL (API publique), utilisé pour les formats autres que JPEG."""
+    from PIL import Image
+    from PIL.ExifTags import IFD
+
+    try:
+        with Image.open(image_path) as image:
+            gps_info = image.getexif().get_ifd(IFD.GPSInfo)
     except Exception as e:
         print(f"Erreur EXIF GPS: {e}")
         return None
+
+    if all(tag in gps_info for tag in (GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE)):
+        lat_dms = [float(v) for v in gps_info[GPS_LATITUDE]]
+        lon_dms = [float(v) for v in gps_info[GPS_LONGITUDE]]
+        lat = dms_to_dd(*lat_dms, gps_info[GPS_LATITUDE_REF])
+        lon = dms_to_dd(*lon_dms, gps_info[GPS_LONGITUDE_REF])
+        return (lat, lon)
+    return None
+
+
+def extract_gps_from_image(image_path):
+    try:
+        with open(image_path, 'rb') as f:
+            head = f.read(HEADER_READ_SIZE)
+    except OSError as e:
+        print(f"Erreur EXIF GPS: {e}")
+        return None
+    if head[:2] == b'\xff\xd8':
+        return extract_gps_from_bytes(head)
+    return extract_gps_with_pil(image_path)
@@ -0,0 +1,115 @@
+# dHash 64 bits : 8 lignes x 9 colonnes, on compare chaque pixel à son voisin de droite
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+# Distance de Hamming maximale pour considérer deux images comme identiques
+MAX_DISTANCE = 6
+
+# Recherche indexée multi-tranches : les 64 bits sont découpés en MAX_DISTANCE + 1
+# tranches (10 + 6 x 9 bits). Deux hash à distance <= MAX_DISTANCE ont forcément une
+# tranche identique (principe des tiroirs) : chercher les uploads qui partagent au
+# moins une tranche exacte retrouve tous les quasi-doublons, sans balayage complet.
+HASH_BITS = 64
+BAND_COUNT = MAX_DISTANCE + 1
+
+
+def _band_widths():
+    base, extra = divmod(HASH_BITS, BAND_COUNT)
+    return [base + (i < extra) for i in range(BAND_COUNT)]
+
+
+BAND_WIDTHS = _band_widths()
+
+
+def compute_dhash(image_file):
+    """
+    Calcule le dHash (64 bits, 16 caractères hex) d'une image.
+
+    Le décodage JPEG est réduit via draft() : seule une vignette est décodée,
+    ce qui rend le calcul quasi gratuit même pour une photo de 12 MP. L'image
+    est d'abord redressée selon son orientation EXIF : le hash est celui de
+    l'image telle qu'elle s'affiche (et que le client en fait une miniature).
+    Accepte un chemin ou un fichier (le curseur est remis au début).
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(image_file) as img:
+            img.draft('L', (HASH_WIDTH * 8, HASH_HEIGHT * 8))
+            upright = ImageOps.exif_transpose(img.convert('L'))
+            small = upright.resize((HASH_WIDTH, HASH_HEIGHT), Image.Resampling.BILINEAR)
+            pixels = small.tobytes()
+    except Exception as e:
+        print(f"Erreur calcul dHash: {e}")
+        return None
+    finally:
+        if hasattr(image_file, 'seek'):
+            image_file.seek(0)
+
+    value = 0
+    for row in range(HASH_HEIGHT):
+        offset = row * HASH_WIDTH
+        for col in range(HASH_WIDTH - 1):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return f"{value:016x}"
+
+
+def hamming_distance(hash_a, hash_b):
+    """Nombre de bits différents entre deux hash hexadécimaux."""
+    return (int(hash_a, 16) ^ int(hash_b, 16)).bit_count()
+
+
+def hash_bands(phash):
+    """Valeurs des BAND_COUNT tranches d'un hash hexadécimal, bits de poids fort d'abord."""
+    value = int(phash, 16)
+    bands, shift = [], HASH_BITS
+    for width in BAND_WIDTHS:
+        shift -= width
+        bands.append((value >> shift) & ((1 << width) - 1))
+    return bands
+
+
+def index_phash(upload):
+    """Enregistre les tranches du hash d'un upload sauvegardé (à appeler après save())."""
+    from .models import PhashBand
+
+    if not upload.phash:
+        return
+    PhashBand.objects.bulk_create(
+        PhashBand(upload=upload, band=band, value=value) for band, value in enumerate(hash_bands(upload.phash))
+    )
+
+
+def find_near_duplicate(phash, max_distance=MAX_DISTANCE, exclude_id=None):
+    """
+    Cherche un upload existant quasi identique (distance de Hamming <= max_distance).
+
+    Les candidats sont les uploads qui partagent au moins une tranche exacte du
+    hash (PhashBand, recherche indexée) ; la distance exacte n'est calculée que
+    sur eux. Le résultat est le même qu'un balayage de tous les uploads tant que
+    max_distance <= MAX_DISTANCE.
+
+    La position n'est pas utilisée : la même photo renvoyée avec d'autres
+    coordonnées doit rester un doublon.
+    """
+    from django.db.models import Q
+    from .models import ImageUpload, PhashBand
+
+    if not phash:
+        return None
+    if max_distance > MAX_DISTANCE:
+        raise ValueError(f"max_distance > {MAX_DISTANCE} : des quasi-doublons ne seraient pas retrouvés")
+
+    query = Q()
+    for band, value in enumerate(hash_bands(phash)):
+        query |= Q(band=band, value=value)
+    candidates = ImageUpload.objects.filter(pk__in=PhashBand.objects.filter(query).values('upload_id'))
+    if exclude_id is not None:
+        candidates = candidates.exclude(pk=exclude_id)
+    best = None
+    best_distance = max_distance + 1
+    for candidate in candidates.only('id', 'phash', 'annotation').order_by('id'):
+        distance = hamming_distance(phash, candidate.phash)
+        if distance < best_distance:
+            best, best_distance = candidate, distance
+    return best
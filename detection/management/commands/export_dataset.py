@@ -0,0 +1,175 @@
+import csv
+import glob
+import json
+import os
+import shutil
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from detection.ai.feature_extractor import COLOUR_STATISTICS
+from detection.models import ImageUpload
+
+WATERMARK_FILE = "watermark.json"
+# Annotations de l'application -> classes de Data/csv (convertibles par detection.ai.feature_store)
+CLASSES = {"vide": "clean", "pleine": "dirty"}
+FILE_COLUMNS = ["id", "user_id", "chemin", "type", "date", "taille", "hauteur", "largeur", "pixels",
+                "latitude", "longitude", "classe", "annotation", "image"]
+FIELDS = ("id", "uploader_id", "image", "upload_date", "latitude", "longitude", "annotation", "features",
+          "chemin", "type", "date_csv", "taille", "hauteur", "largeur", "pixels", "updated_at")
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporte les uploads (colonnes de df_fichiers_img.csv + caractéristiques couleur) en lots CSV ou NDJSON, "
+        "dans l'ordre de leur dernière modification, à partir de la dernière exportée (watermark.json du "
+        "répertoire de sortie). Un upload modifié depuis (annotation corrigée...) est réexporté dans un lot "
+        "suivant : pour un même id, la ligne du lot le plus récent fait foi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='exports/dataset')
+        parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+        parser.add_argument('--shard-size', type=int, default=10000, help="lignes par fichier")
+        parser.add_argument('--images', action='store_true', help="copie aussi les images dans <output>/images/")
+        parser.add_argument('--all-annotations', action='store_true',
+                            help="inclut les uploads non annotés (auto, non) ; par défaut pleine/vide seulement")
+        parser.add_argument('--full', action='store_true',
+                            help="supprime les lots, images et watermark déjà exportés et reprend depuis le début")
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if options['shard_size'] < 1:
+            raise CommandError("--shard-size doit être positif")
+        if options['full']:
+            self._clear_output(output)
+        os.makedirs(output, exist_ok=True)
+        if options['images']:
+            os.makedirs(os.path.join(output, 'images'), exist_ok=True)
+
+        watermark = {"last_updated": None, "last_id": 0, "rows": 0, "shards": []}
+        watermark_path = os.path.join(output, WATERMARK_FILE)
+        if os.path.exists(watermark_path):
+            with open(watermark_path, encoding='utf-8') as f:
+                watermark = json.load(f)
+            if 'last_updated' not in watermark:
+                raise CommandError("watermark.json d'un ancien format (dernier id seulement) : relancer avec --full")
+
+        queryset = ImageUpload.objects.order_by('updated_at', 'id')
+        if watermark['last_updated'] is not None:
+            last_updated = parse_datetime(watermark['last_updated'])
+            queryset = queryset.filter(
+                Q(updated_at__gt=last_updated) | Q(updated_at=last_updated, id__gt=watermark['last_id'])
+            )
+        if not options['all_annotations']:
+            queryset = queryset.filter(annotation__in=CLASSES)
+
+        start = time.perf_counter()
+        exported = missing_images = 0
+        writer = None
+        # Lecture en flux : pas de cache du queryset, lignes instanciées par paquets
+        for values in queryset.values_list(*FIELDS).iterator(chunk_size=2000):
+            row = dict(zip(FIELDS, values))
+            if writer is None:
+                writer = _ShardWriter(output, options['format'], len(watermark['shards']))
+            if options['images']:
+                copied = self._copy_image(row, output)
+                missing_images += copied is None
+                row['chemin'] = copied or ''
+            writer.write(row)
+            exported += 1
+            if writer.rows >= options['shard_size']:
+                self._close_shard(writer, row, watermark, watermark_path)
+                writer = None
+        if writer is not None:
+            self._close_shard(writer, row, watermark, watermark_path)
+
+        elapsed = time.perf_counter() - start
+        if missing_images:
+            self.stdout.write(self.style.WARNING(f"{missing_images} images introuvables dans le stockage"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{exported} uploads exportés en {elapsed:.1f} s ({watermark['rows']} au total, "
+            f"modifiés jusqu'au {watermark['last_updated']}) -> {output}"
+        ))
+
+    def _clear_output(self, output):
+        """Export complet : les anciens lots (même ceux de numéro plus élevé) ne doivent pas rester."""
+        for pattern in ('shard-*.csv', 'shard-*.ndjson', 'shard-*.tmp', f'{WATERMARK_FILE}*'):
+            for path in glob.glob(os.path.join(output, pattern)):
+                os.remove(path)
+        shutil.rmtree(os.path.join(output, 'images'), ignore_errors=True)
+
+    def _close_shard(self, writer, last_row, watermark, watermark_path):
+        """Lot terminé : fichier renommé puis watermark mis à jour (reprise possible après interruption)."""
+        name = writer.close()
+        watermark['last_updated'] = last_row['updated_at'].isoformat()
+        watermark['last_id'] = last_row['id']
+        watermark['rows'] += writer.rows
+        watermark['shards'].append(name)
+        tmp = f"{watermark_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(watermark, f, indent=2)
+        os.replace(tmp, watermark_path)
+        self.stdout.write(f"{name} : {writer.rows} lignes")
+
+    def _copy_image(self, row, output):
+        if not row['image']:
+            return None
+        relative = os.path.join('images', f"{row['id']}_{os.path.basename(row['image'])}")
+        try:
+            with default_storage.open(row['image'], 'rb') as src, open(os.path.join(output, relative), 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        except (FileNotFoundError, OSError):
+            return None
+        return relative
+
+
+class _ShardWriter:
+    """Un fichier de lot, écrit sous un nom temporaire jusqu'à sa fermeture."""
+
+    def __init__(self, output, fmt, index):
+        self.format = fmt
+        self.rows = 0
+        self.name = f"shard-{index:05d}.{fmt}"
+        self.path = os.path.join(output, self.name)
+        self.file = open(f"{self.path}.tmp", 'w', newline='', encoding='utf-8')
+        if fmt == 'csv':
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(FILE_COLUMNS + COLOUR_STATISTICS)
+
+    def write(self, row):
+        record = {
+            "id": row['id'],
+            "user_id": row['uploader_id'],
+            "chemin": row['chemin'] or row['image'],
+            "type": row['type'],
+            "date": row['date_csv'] or row['upload_date'].date().isoformat(),
+            "taille": row['taille'],
+            "hauteur": row['hauteur'],
+            "largeur": row['largeur'],
+            "pixels": row['pixels'],
+            "latitude": row['latitude'],
+            "longitude": row['longitude'],
+            "classe": CLASSES.get(row['annotation'], ''),
+            "annotation": row['annotation'],
+            "image": row['image'],
+        }
+        features = row['features'] or {}
+        if self.format == 'csv':
+            self.csv.writerow([_cell(record[c]) for c in FILE_COLUMNS] + [_cell(features.get(n)) for n in COLOUR_STATISTICS])
+        else:
+            record['features'] = features or None
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.rows += 1
+
+    def close(self):
+        self.file.close()
+        os.replace(f"{self.path}.tmp", self.path)
+        return self.name
+
+
+def _cell(value):
+    return '' if value is None else value
@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from detection.media_gc import DEFAULT_TEMP_AGE, DEFAULT_UPLOAD_AGE, collect
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les fichiers temporaires d'analyse abandonnés (media/temp) et les images "
+        "qu'aucun ImageUpload ne référence plus (media/uploads)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--temp-age', type=int, default=getattr(settings, 'MEDIA_GC_TEMP_AGE', DEFAULT_TEMP_AGE),
+                            help="âge minimal (s) d'un fichier temporaire supprimé")
+        parser.add_argument('--upload-age', type=int,
+                            default=getattr(settings, 'MEDIA_GC_UPLOAD_AGE', DEFAULT_UPLOAD_AGE),
+                            help="âge minimal (s) d'une image orpheline supprimée")
+        parser.add_argument('--temp-max-bytes', type=int, default=getattr(settings, 'MEDIA_GC_TEMP_MAX_BYTES', None),
+                            help="taille maximale de media/temp après passage")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="orphelins revérifiés en base par requête")
+        parser.add_argument('--dry-run', action='store_true', help="compte sans supprimer")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = collect(
+            temp_age=options['temp_age'],
+            upload_age=options['upload_age'],
+            temp_max_bytes=options['temp_max_bytes'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        verb = "à supprimer" if options['dry_run'] else "supprimés"
+        sessions = stats.pop('sessions')
+        for area, values in stats.items():
+            self.stdout.write(
+                f"{area}: {values['scanned']} fichiers parcourus, {values['deleted']} {verb} "
+                f"({values['bytes'] / 1e6:.1f} Mo)"
+            )
+        self.stdout.write(
+            f"{sessions} sessions d'upload en morceaux expirées {'à supprimer' if options['dry_run'] else 'supprimées'}"
+        )
+        reclaimed = sum(values['bytes'] for values in stats.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{reclaimed / 1e6:.1f} Mo {'récupérables' if options['dry_run'] else 'libérés'} "
+            f"en {time.perf_counter() - start:.1f} s"
+        ))
@@ -0,0 +1,78 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from detection.models import ImageUpload
+from detection.storage import ContentAddressedStorage, is_content_addressed
+
+
+class Command(BaseCommand):
+    help = (
+        "Déplace les images existantes (uploads/ à plat) vers le rangement par empreinte "
+        "(uploads/ab/cd/<sha256>.ext) et réécrit ImageUpload.image, par lots."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=None, help="nombre max d'uploads à traiter")
+        parser.add_argument('--dry-run', action='store_true', help="compte les fichiers sans rien modifier")
+        parser.add_argument('--keep-originals', action='store_true',
+                            help="laisse les anciens fichiers en place (à supprimer plus tard)")
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError(
+                "Le stockage par défaut n'est pas detection.storage.ContentAddressedStorage (STORAGES / MEDIA_STORAGE_BACKEND)"
+            )
+
+        start = time.perf_counter()
+        moved = missing = removed = 0
+        last_id = 0
+        limit = options['limit']
+        while limit is None or moved + missing < limit:
+            batch = list(
+                ImageUpload.objects.filter(id__gt=last_id).exclude(image='')
+                .order_by('id').values_list('id', 'image')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            renamed, old_names = {}, set()
+            for upload_id, name in batch:
+                if is_content_addressed(name):
+                    continue
+                if limit is not None and moved + missing >= limit:
+                    break
+                if not default_storage.exists(name):
+                    missing += 1
+                    continue
+                if options['dry_run']:
+                    moved += 1
+                    continue
+                with default_storage.open(name, 'rb') as f:
+                    new_name = default_storage.save(name, f)
+                renamed[upload_id] = new_name
+                old_names.add(name)
+                moved += 1
+
+            if renamed:
+                with transaction.atomic():
+                    ImageUpload.objects.bulk_update(
+                        [ImageUpload(id=upload_id, image=new_name) for upload_id, new_name in renamed.items()], ['image']
+                    )
+                if not options['keep_originals']:
+                    # Un ancien nom peut être partagé (imports CSV) : supprimé quand plus aucune ligne n'y renvoie
+                    still_used = set(ImageUpload.objects.filter(image__in=old_names).values_list('image', flat=True))
+                    for name in old_names - still_used:
+                        default_storage.delete(name)
+                        removed += 1
+            self.stdout.write(f"{moved} fichiers traités...")
+
+        elapsed = time.perf_counter() - start
+        verb = "à déplacer" if options['dry_run'] else "déplacés"
+        self.stdout.write(self.style.SUCCESS(
+            f"{moved} fichiers {verb} ({removed} anciens fichiers supprimés, "
+            f"{missing} introuvables) en {elapsed:.1f} s"
+        ))
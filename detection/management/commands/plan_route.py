@@ -0,0 +1,61 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from detection.rollup import recent_full_locations
+
+
+class Command(BaseCommand):
+    help = "Calcule l'ordre de collecte des emplacements signalés pleins, depuis un dépôt."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depot', required=True, help="lat,lon du dépôt")
+        parser.add_argument('--hours', type=float, default=24, help="fenêtre des signalements (heures)")
+        parser.add_argument('--bbox', default=None, help="lat_min,lon_min,lat_max,lon_max")
+        parser.add_argument('--max-stops', type=int, default=5000)
+        parser.add_argument('--time-budget', type=float, default=5.0, help="secondes d'amélioration 2-opt/Or-opt")
+        parser.add_argument('--output', default=None, help="fichier GeoJSON (LineString + points numérotés)")
+
+    def handle(self, *args, **options):
+        try:
+            depot = tuple(float(v) for v in options['depot'].split(','))
+            bbox = tuple(float(v) for v in options['bbox'].split(',')) if options['bbox'] else None
+        except ValueError:
+            raise CommandError("--depot lat,lon et --bbox lat_min,lon_min,lat_max,lon_max attendus")
+        if len(depot) != 2 or (bbox is not None and len(bbox) != 4):
+            raise CommandError("--depot lat,lon et --bbox lat_min,lon_min,lat_max,lon_max attendus")
+
+        since = timezone.now() - timedelta(hours=options['hours'])
+        stops = list(
+            recent_full_locations(since, bbox).values('id', 'latitude', 'longitude')[:options['max_stops']]
+        )
+        if not stops:
+            self.stdout.write("Aucun emplacement signalé plein sur la période.")
+            return
+
+        from detection.routing import plan_route
+        order, stats = plan_route(depot, [(s['latitude'], s['longitude']) for s in stops], options['time_budget'])
+        route = [stops[k] for k in order]
+
+        for rank, stop in enumerate(route, start=1):
+            self.stdout.write(f"{rank:5d}  emplacement {stop['id']:<8d} {stop['latitude']:.6f}, {stop['longitude']:.6f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['stops']} arrêts : {stats['initial_m'] / 1000:.2f} km (plus proche voisin) -> "
+            f"{stats['length_m'] / 1000:.2f} km en {stats['elapsed_s']} s"
+            + ("" if stats['optimal_locally'] else " (budget de temps atteint)")
+        ))
+
+        if options['output']:
+            path = [[depot[1], depot[0]]] + [[s['longitude'], s['latitude']] for s in route] + [[depot[1], depot[0]]]
+            features = [{"type": "Feature", "geometry": {"type": "LineString", "coordinates": path},
+                         "properties": stats}]
+            features += [
+                {"type": "Feature", "geometry": {"type": "Point", "coordinates": [s['longitude'], s['latitude']]},
+                 "properties": {"rank": rank, "location": s['id']}}
+                for rank, s in enumerate(route, start=1)
+            ]
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({"type": "FeatureCollection", "features": features}, f)
+            self.stdout.write(f"Tournée écrite dans {options['output']}")
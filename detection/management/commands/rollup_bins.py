@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from detection.models import BinLocation
+from detection.rollup import paused, pending_uploads, record_upload
+
+
+class Command(BaseCommand):
+    help = "Rattache les uploads géolocalisés non encore agrégés à leur emplacement (BinLocation)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=None, help="nombre max d'uploads à traiter")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="supprime emplacements et agrégats puis reprend tout l'historique")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            with paused():
+                deleted, _ = BinLocation.objects.all().delete()
+            self.stdout.write(f"{deleted} lignes d'agrégats supprimées")
+
+        start = time.perf_counter()
+        done = 0
+        last_id = 0
+        limit = options['limit']
+        while limit is None or done < limit:
+            # Reprise par id croissant : chaque lot ne relit que les uploads restants
+            batch = list(pending_uploads().filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            for upload_id in batch[:None if limit is None else limit - done]:
+                record_upload(upload_id)
+                done += 1
+            last_id = batch[-1]
+            self.stdout.write(f"{done} uploads agrégés...")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{done} uploads rattachés à {BinLocation.objects.count()} emplacements en {elapsed:.1f} s"
+        ))
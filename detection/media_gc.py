@@ -0,0 +1,205 @@
+"""
+Ramasse-miettes des médias :
+
+  - MEDIA_ROOT/temp    : fichiers d'analyse et d'upload en morceaux plus vieux
+                         que `temp_age` secondes (abandonnés), puis les plus
+                         anciens tant que le répertoire dépasse `temp_max_bytes` ;
+                         les UploadSession inactives depuis `temp_age` sont supprimées
+  - MEDIA_ROOT/uploads : images qu'aucun ImageUpload ne référence plus, plus
+                         vieilles que `upload_age` (un upload en cours a déjà
+                         écrit son fichier mais pas encore sa ligne)
+
+Parcours par os.scandir (type des entrées lu avec le répertoire), références
+chargées en flux dans un ensemble, puis revérifiées par lots en base juste
+avant suppression (un nouvel upload dédupliqué peut reprendre un fichier
+orphelin, voir detection/storage.py). Chaque fichier est restat juste avant
+os.remove : s'il a été modifié depuis (mtime rafraîchi par la déduplication,
+morceau ajouté), il est gardé. Les fichiers de morceaux des UploadSession
+encore actives ne sont jamais supprimés, même pour tenir le plafond.
+
+Avec MEDIA_GC_INTERVAL > 0, un thread par worker lance collect() à cet
+intervalle ; un verrou dans le cache partagé évite que plusieurs workers
+parcourent le disque en même temps.
+"""
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from . import metrics
+from .chunked_upload import SPOOL_DIR
+from .models import ImageUpload, UploadSession
+
+TEMP_DIR = 'temp'
+UPLOADS_DIR = 'uploads'
+DEFAULT_TEMP_AGE = 3600
+DEFAULT_UPLOAD_AGE = 24 * 3600
+# Fichier d'analyse encore en cours d'utilisation : jamais supprimé pour tenir le plafond
+MIN_TEMP_AGE = 60
+LOCK_KEY = 'media-gc-lock'
+
+_lock = threading.Lock()
+_state = {'pid': None}
+
+
+def scan_files(root):
+    """(chemin relatif à root avec '/', taille, mtime) de chaque fichier, récursivement."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    yield os.path.relpath(entry.path, root).replace(os.sep, '/'), st.st_size, st.st_mtime
+
+
+def referenced_names():
+    """Noms de fichiers (relatifs à MEDIA_ROOT) encore référencés en base, lus en flux."""
+    return set(ImageUpload.objects.exclude(image='').values_list('image', flat=True).iterator(chunk_size=5000))
+
+
+def _still_referenced(names):
+    return set(ImageUpload.objects.filter(image__in=names).values_list('image', flat=True))
+
+
+def _remove(path, stats, area, dry_run, cutoff):
+    """Supprime `path` s'il n'a pas été modifié après `cutoff` (mtime) ; True si supprimé."""
+    try:
+        st = os.stat(path, follow_symlinks=False)
+        if st.st_mtime > cutoff:  # repris ou réécrit depuis le parcours
+            return False
+        if not dry_run:
+            os.remove(path)
+    except FileNotFoundError:
+        return False
+    stats[area]['deleted'] += 1
+    stats[area]['bytes'] += st.st_size
+    return True
+
+
+def _live_spool_names(since):
+    """Fichiers de morceaux (relatifs à MEDIA_ROOT/temp) des sessions actives depuis `since`."""
+    spool_dir = os.path.relpath(SPOOL_DIR, TEMP_DIR).replace(os.sep, '/')
+    return {
+        f'{spool_dir}/{session_id}.part'
+        for session_id in UploadSession.objects.filter(updated_at__gte=since).values_list('id', flat=True)
+    }
+
+
+def _prune_empty_dirs(root):
+    """Supprime les sous-répertoires de préfixe (ab/cd) devenus vides."""
+    for directory, _, files in os.walk(root, topdown=False):
+        if directory != root and not files:
+            try:
+                os.rmdir(directory)
+            except OSError:  # pas vide
+                pass
+
+
+def collect(temp_age=DEFAULT_TEMP_AGE, upload_age=DEFAULT_UPLOAD_AGE, temp_max_bytes=None,
+            batch_size=1000, dry_run=False):
+    """
+    Un passage complet. Retourne, par zone ("temp", "uploads"), le nombre de
+    fichiers parcourus, supprimés et les octets libérés, et le nombre de
+    sessions d'upload expirées ("sessions").
+    """
+    now = time.time()
+    stats = {area: {'scanned': 0, 'deleted': 0, 'bytes': 0} for area in (TEMP_DIR, UPLOADS_DIR)}
+
+    session_cutoff = timezone.now() - timedelta(seconds=temp_age)
+    expired = UploadSession.objects.filter(updated_at__lt=session_cutoff)
+    stats['sessions'] = expired.count() if dry_run else expired.delete()[0]
+    live_spools = _live_spool_names(session_cutoff)
+
+    temp_root = os.path.join(settings.MEDIA_ROOT, TEMP_DIR)
+    kept = []
+    for name, size, mtime in scan_files(temp_root):
+        stats[TEMP_DIR]['scanned'] += 1
+        if name in live_spools:
+            continue
+        if now - mtime > temp_age:
+            _remove(os.path.join(temp_root, name), stats, TEMP_DIR, dry_run, now - temp_age)
+        else:
+            kept.append((mtime, size, name))
+    if temp_max_bytes is not None:
+        # Les morceaux des sessions actives comptent dans le volume sans être supprimables
+        used = sum(size for _, size, _ in kept) + sum(
+            os.path.getsize(os.path.join(temp_root, name))
+            for name in live_spools if os.path.exists(os.path.join(temp_root, name))
+        )
+        for mtime, size, name in sorted(kept):
+            if used <= temp_max_bytes or now - mtime < MIN_TEMP_AGE:
+                break
+            if _remove(os.path.join(temp_root, name), stats, TEMP_DIR, dry_run, mtime):
+                used -= size
+
+    uploads_root = os.path.join(settings.MEDIA_ROOT, UPLOADS_DIR)
+    referenced = referenced_names()
+    candidates = []
+
+    def flush():
+        for name in set(candidates) - _still_referenced(candidates):
+            _remove(os.path.join(settings.MEDIA_ROOT, name), stats, UPLOADS_DIR, dry_run, now - upload_age)
+        candidates.clear()
+
+    for name, size, mtime in scan_files(uploads_root):
+        stats[UPLOADS_DIR]['scanned'] += 1
+        name = f'{UPLOADS_DIR}/{name}'
+        if name not in referenced and now - mtime > upload_age:
+            candidates.append(name)
+            if len(candidates) >= batch_size:
+                flush()
+    flush()
+    if not dry_run and stats[UPLOADS_DIR]['deleted']:
+        _prune_empty_dirs(uploads_root)
+
+    if not dry_run:
+        for area, values in stats.items():
+            if area == 'sessions':
+                continue
+            metrics.inc('urbin_media_gc_bytes_total', values['bytes'], area=area)
+            metrics.inc('urbin_media_gc_files_total', values['deleted'], area=area)
+    return stats
+
+
+def _loop(interval):
+    pid = os.getpid()
+    while _state['pid'] == pid:
+        time.sleep(interval)
+        # Un seul worker par intervalle (cache fichier partagé par défaut)
+        if not cache.add(LOCK_KEY, pid, timeout=interval):
+            continue
+        try:
+            collect(
+                temp_age=getattr(settings, 'MEDIA_GC_TEMP_AGE', DEFAULT_TEMP_AGE),
+                upload_age=getattr(settings, 'MEDIA_GC_UPLOAD_AGE', DEFAULT_UPLOAD_AGE),
+                temp_max_bytes=getattr(settings, 'MEDIA_GC_TEMP_MAX_BYTES', None),
+            )
+        except Exception as e:
+            print(f"Erreur ramasse-miettes médias: {e}")
+        finally:
+            connection.close()
+
+
+def ensure_thread():
+    """Démarre le thread périodique du processus courant (une fois par pid, y compris après fork)."""
+    interval = getattr(settings, 'MEDIA_GC_INTERVAL', 0)
+    if interval <= 0 or _state['pid'] == os.getpid():
+        return
+    with _lock:
+        if _state['pid'] == os.getpid():
+            return
+        _state['pid'] = os.getpid()
+    threading.Thread(target=_loop, args=(interval,), daemon=True, name='media-gc').start()
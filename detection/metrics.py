@@ -0,0 +1,283 @@
+"""
+Métriques au format d'exposition Prometheus (compteurs, jauges, histogrammes).
+
+Chaque processus garde ses valeurs en mémoire. Si METRICS_MULTIPROC_DIR est
+défini, elles sont recopiées (au plus une fois par seconde, et à la sortie)
+dans un fichier JSON par PID ; /metrics fusionne tous ces fichiers, ce qui
+agrège les workers gunicorn. Quand un worker se termine, le master
+(hook child_exit de gunicorn.conf.py) reporte ses compteurs et histogrammes
+dans ARCHIVE_FILE et supprime son fichier ; ses jauges sont abandonnées.
+
+Aucune dépendance à Django : utilisable depuis detection/ai et detection/tracing.
+"""
+import atexit
+import bisect
+import glob
+import json
+import math
+import os
+import threading
+import time
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+FLUSH_INTERVAL = 1.0
+# Compteurs et histogrammes cumulés des workers terminés
+ARCHIVE_FILE = 'metrics_archive.json'
+
+# name -> (type, help, buckets)
+_definitions = {}
+# (name, labels) -> float (compteur/jauge) ou [counts, sum, count] (histogramme)
+_values = {}
+_lock = threading.Lock()
+_state = {'pid': None, 'dirty': False, 'thread': None}
+
+
+def define(name, kind, help_text, buckets=None):
+    _definitions[name] = (kind, help_text, tuple(buckets) if buckets else None)
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v).lower() if isinstance(v, bool) else str(v)) for k, v in labels.items()))
+
+
+def _check_pid():
+    """Après un fork (gunicorn --preload), le worker repart de zéro pour ne pas recompter le master."""
+    pid = os.getpid()
+    if _state['pid'] != pid:
+        _values.clear()
+        _state.update(pid=pid, dirty=False, thread=None)
+        if multiproc_dir():
+            _state['thread'] = threading.Thread(target=_flush_loop, daemon=True)
+            _state['thread'].start()
+
+
+def inc(name, amount=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _check_pid()
+        _values[key] = _values.get(key, 0.0) + amount
+        _state['dirty'] = True
+
+
+def set_gauge(name, value, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _check_pid()
+        _values[key] = float(value)
+        _state['dirty'] = True
+
+
+def observe(name, value, **labels):
+    buckets = _definitions.get(name, (None, None, TIME_BUCKETS))[2] or TIME_BUCKETS
+    key = (name, _labels(labels))
+    with _lock:
+        _check_pid()
+        state = _values.get(key)
+        if state is None:
+            state = _values[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+        _state['dirty'] = True
+
+
+# --- Multi-processus ---------------------------------------------------------
+
+def multiproc_dir():
+    return os.environ.get('METRICS_MULTIPROC_DIR')
+
+
+def _serialize():
+    return {
+        'pid': os.getpid(),
+        'values': [[name, list(labels), value] for (name, labels), value in _values.items()],
+    }
+
+
+def flush():
+    directory = multiproc_dir()
+    if not directory:
+        return
+    with _lock:
+        if _state['pid'] != os.getpid() or not _state['dirty']:
+            return
+        payload = json.dumps(_serialize())
+        _state['dirty'] = False
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'metrics_{os.getpid()}.json')
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def _flush_loop():
+    pid = os.getpid()
+    while _state['pid'] == pid:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+atexit.register(flush)
+
+
+def _write_json(path, data):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def mark_process_dead(pid):
+    """
+    Reporte les compteurs et histogrammes du processus `pid` (terminé) dans
+    ARCHIVE_FILE et supprime son fichier. Appelé par le master gunicorn, un
+    worker à la fois : le nombre de fichiers reste borné par celui des workers.
+    """
+    directory = multiproc_dir()
+    if not directory:
+        return
+    path = os.path.join(directory, f'metrics_{pid}.json')
+    try:
+        with open(path) as f:
+            values = json.load(f)['values']
+    except (OSError, ValueError):
+        return
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    merged = {}
+    try:
+        with open(archive_path) as f:
+            values = json.load(f)['values'] + values
+    except (OSError, ValueError):
+        pass
+    for name, labels, value in values:
+        if _definitions.get(name, (COUNTER,))[0] != GAUGE:
+            _merge(merged, name, tuple(tuple(pair) for pair in labels), value)
+    _write_json(archive_path, {
+        'pid': None,
+        'values': [[name, list(labels), value] for (name, labels), value in merged.items()],
+    })
+    os.remove(path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(target, name, labels, value):
+    kind = _definitions.get(name, (COUNTER,))[0]
+    key = (name, labels)
+    if kind == HISTOGRAM:
+        state = target.setdefault(key, [[0] * len(value[0]), 0.0, 0])
+        state[0] = [a + b for a, b in zip(state[0], value[0])]
+        state[1] += value[1]
+        state[2] += value[2]
+    else:
+        target[key] = target.get(key, 0.0) + value
+
+
+def collect():
+    """Valeurs agrégées de tous les processus (fichiers) et du processus courant (mémoire)."""
+    merged = {}
+    pid = os.getpid()
+    directory = multiproc_dir()
+    if directory:
+        for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data['pid'] == pid:
+                continue
+            alive = data['pid'] is not None and _pid_alive(data['pid'])
+            for name, labels, value in data['values']:
+                if _definitions.get(name, (COUNTER,))[0] == GAUGE and not alive:
+                    continue
+                _merge(merged, name, tuple(tuple(pair) for pair in labels), value)
+    with _lock:
+        _check_pid()
+        for (name, labels), value in _values.items():
+            _merge(merged, name, labels, value if not isinstance(value, list) else [list(value[0]), value[1], value[2]])
+    return merged
+
+
+# --- Exposition ----------------------------------------------------------------
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if value != int(value) else str(int(value))
+
+
+def render():
+    """Texte au format d'exposition Prometheus 0.0.4."""
+    merged = collect()
+    lines = []
+    for name in sorted({key[0] for key in merged} | set(_definitions)):
+        kind, help_text, buckets = _definitions.get(name, (COUNTER, '', None))
+        series = sorted((labels, value) for (n, labels), value in merged.items() if n == name)
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind == HISTOGRAM:
+                counts, total, count = value
+                running = 0
+                for bound, n in zip(list(buckets or TIME_BUCKETS) + ['+Inf'], counts):
+                    running += n
+                    le = bound if bound == '+Inf' else _format_value(bound)
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", le)])} {running}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {count}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- Métriques de l'application ---------------------------------------------
+
+define('urbin_uploads_total', COUNTER, "Images uploadées, par source et statut de doublon.")
+define('urbin_classifications_total', COUNTER, "Classifications effectuées, par résultat.")
+define('urbin_cache_requests_total', COUNTER, "Accès aux caches applicatifs (hit/miss).")
+define('urbin_extraction_stage_seconds', HISTOGRAM, "Durée des étapes d'extraction/classification.", TIME_BUCKETS)
+define('urbin_temp_file_bytes_total', COUNTER, "Octets écrits dans les fichiers temporaires d'analyse.")
+define('urbin_feature_verifications_total', COUNTER, "Caractéristiques envoyées par le client, par résultat de vérification.")
+define('urbin_upload_chunk_bytes_total', COUNTER, "Octets reçus par l'upload en morceaux.")
+define('urbin_media_gc_bytes_total', COUNTER, "Octets libérés par le ramasse-miettes des médias, par zone.")
+define('urbin_media_gc_files_total', COUNTER, "Fichiers supprimés par le ramasse-miettes des médias, par zone.")
+define('urbin_requests_in_progress', GAUGE, "Requêtes HTTP en cours de traitement (file d'attente des workers).")
+define('urbin_db_connections', GAUGE, "Connexions base de données ouvertes, par état.")
+define('urbin_request_seconds', HISTOGRAM, "Durée des requêtes échantillonnées, par vue.", TIME_BUCKETS)
+define('urbin_db_seconds', HISTOGRAM, "Temps SQL des requêtes échantillonnées, par vue.", TIME_BUCKETS)
+define('urbin_db_connect_seconds', HISTOGRAM, "Durée d'ouverture (ou d'emprunt au pool) des connexions base de données.", TIME_BUCKETS)
+define('urbin_db_queries', HISTOGRAM, "Nombre de requêtes SQL par requête échantillonnée.", COUNT_BUCKETS)
+define('urbin_response_bytes', HISTOGRAM, "Taille des réponses échantillonnées, par vue.", SIZE_BUCKETS)
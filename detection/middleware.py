@@ -0,0 +1,103 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import connection, connections
+
+from . import media_gc, metrics
+from .tracing import start_trace, end_trace
+
+
+class RequestTimingMiddleware:
+    """
+    Mesure, pour une fraction des requêtes (REQUEST_TIMING_SAMPLE_RATE) :
+    nombre et durée des requêtes SQL, coût d'ouverture de la connexion
+    (si la vue en ouvre une), temps par étape CV, taille de la réponse.
+    Les mesures sont agrégées en histogrammes (detection.metrics, exposés sur
+    /metrics) et renvoyées dans l'en-tête Server-Timing aux seuls membres du
+    staff (ou avec DEBUG) : le détail SQL n'est pas destiné aux clients.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 1.0)
+
+    def __call__(self, request):
+        media_gc.ensure_thread()
+        metrics.inc('urbin_requests_in_progress', 1)
+        try:
+            if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+                return self.get_response(request)
+            return self._traced(request)
+        finally:
+            metrics.inc('urbin_requests_in_progress', -1)
+            self._record_connections()
+
+    def _record_connections(self):
+        metrics.set_gauge(
+            'urbin_db_connections',
+            sum(1 for c in connections.all(initialized_only=True) if c.connection is not None),
+            state='open',
+        )
+        # Pool psycopg (DB_POOL=1) : taille, connexions libres, requêtes en attente d'une connexion
+        if connection.settings_dict.get('OPTIONS', {}).get('pool'):
+            stats = connection.pool.get_stats()
+            for state in ('pool_size', 'pool_available', 'requests_waiting'):
+                metrics.set_gauge('urbin_db_connections', stats.get(state, 0), state=state)
+
+    def _traced(self, request):
+        trace, token = start_trace()
+
+        def count_queries(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                trace.db_queries += 1
+                trace.db_time += time.perf_counter() - start
+
+        # Établissement de la connexion (TLS complet, ou simple emprunt au pool / à PgBouncer),
+        # mesuré à part : execute_wrapper ne voit que les requêtes SQL. Seulement si la vue
+        # ouvre elle-même la connexion : aucune n'est ouverte pour la mesure.
+        timed_connect = connection.connection is None
+        if timed_connect:
+            connect = connection.connect
+
+            def measured_connect():
+                start = time.perf_counter()
+                try:
+                    return connect()
+                finally:
+                    trace.db_connect = time.perf_counter() - start
+
+            connection.connect = measured_connect
+        try:
+            with connection.execute_wrapper(count_queries):
+                response = self.get_response(request)
+        finally:
+            if timed_connect:
+                connection.connect = connect
+            end_trace(token)
+
+        total = trace.elapsed()
+        match = getattr(request, 'resolver_match', None)
+        view = match.route if match is not None else 'unmatched'
+
+        metrics.observe('urbin_request_seconds', total, view=view)
+        metrics.observe('urbin_db_seconds', trace.db_time, view=view)
+        metrics.observe('urbin_db_queries', trace.db_queries, view=view)
+        if trace.db_connect is not None:
+            metrics.observe('urbin_db_connect_seconds', trace.db_connect)
+        if not response.streaming:
+            metrics.observe('urbin_response_bytes', len(response.content), view=view)
+
+        user = getattr(request, 'user', None)
+        if not (settings.DEBUG or getattr(user, 'is_staff', False)):
+            return response
+        timings = [f'db;dur={trace.db_time * 1000:.1f};desc="{trace.db_queries} queries"']
+        if trace.db_connect is not None:
+            timings.append(f'db_connect;dur={trace.db_connect * 1000:.1f}')
+        timings += [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in trace.stages.items()]
+        timings.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+        return response
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0003_remove_imageupload_avg_b_remove_imageupload_avg_g_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='detection.imageupload'),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='phash',
+            field=models.CharField(blank=True, db_index=True, max_length=16, null=True),
+        ),
+    ]
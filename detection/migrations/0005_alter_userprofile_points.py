@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0004_imageupload_duplicate_of_imageupload_phash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='points',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0005_alter_userprofile_points'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BinLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell_lat', models.IntegerField()),
+                ('cell_lon', models.IntegerField()),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('reports', models.PositiveIntegerField(default=0)),
+                ('full_reports', models.PositiveIntegerField(default=0)),
+                ('last_annotation', models.CharField(blank=True, max_length=10, null=True)),
+                ('last_report', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_annotation', 'last_report'], name='detection_b_last_an_390ab4_idx')],
+                'unique_together': {('cell_lat', 'cell_lon')},
+            },
+        ),
+        migrations.CreateModel(
+            name='BinReport',
+            fields=[
+                ('upload', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='bin_report', serialize=False, to='detection.imageupload')),
+                ('annotation', models.CharField(max_length=10)),
+                ('reported_at', models.DateTimeField()),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bin_reports', to='detection.binlocation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['location', '-reported_at'], name='detection_b_locatio_aac259_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BinStatDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('reports', models.PositiveIntegerField(default=0)),
+                ('full', models.PositiveIntegerField(default=0)),
+                ('empty', models.PositiveIntegerField(default=0)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='detection.binlocation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='detection_b_day_1b98d7_idx')],
+                'unique_together': {('location', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='BinStatHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('reports', models.PositiveIntegerField(default=0)),
+                ('full', models.PositiveIntegerField(default=0)),
+                ('empty', models.PositiveIntegerField(default=0)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='detection.binlocation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='detection_b_hour_bdd385_idx')],
+                'unique_together': {('location', 'hour')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0006_bin_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='features',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
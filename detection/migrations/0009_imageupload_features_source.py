@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0008_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='features_source',
+            field=models.CharField(blank=True, choices=[('server', 'Calculées par le serveur'), ('client', 'Client, vérifiées sur la miniature'), ('client_checked', 'Client, vérifiées en pleine résolution'), ('rejected', 'Client, rejetées')], db_index=True, max_length=16, null=True),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Découpage figé à la création de la table (7 tranches : 10 + 6 x 9 bits) : recopié
+# ici plutôt qu'importé de detection.image_hash, qui peut changer par la suite
+BAND_WIDTHS = [10, 9, 9, 9, 9, 9, 9]
+
+
+def hash_bands(phash):
+    value = int(phash, 16)
+    bands, shift = [], 64
+    for width in BAND_WIDTHS:
+        shift -= width
+        bands.append((value >> shift) & ((1 << width) - 1))
+    return bands
+
+
+def index_existing_hashes(apps, schema_editor):
+    """Tranches des hash des uploads existants (recherche de quasi-doublons)."""
+    ImageUpload = apps.get_model('detection', 'ImageUpload')
+    PhashBand = apps.get_model('detection', 'PhashBand')
+    batch = []
+    for upload_id, phash in ImageUpload.objects.exclude(phash__isnull=True).exclude(phash='') \
+            .values_list('id', 'phash').iterator(chunk_size=2000):
+        batch.extend(PhashBand(upload_id=upload_id, band=band, value=value)
+                     for band, value in enumerate(hash_bands(phash)))
+        if len(batch) >= 7000:
+            PhashBand.objects.bulk_create(batch)
+            batch = []
+    PhashBand.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0009_imageupload_features_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhashBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('value', models.IntegerField()),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='phash_bands', to='detection.imageupload')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'value'], name='detection_p_band_3720a3_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing_hashes, migrations.RunPython.noop),
+    ]
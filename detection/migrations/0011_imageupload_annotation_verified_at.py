@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0010_phashband'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='annotation_verified_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_upload_date(apps, schema_editor):
+    """Uploads existants : date de modification = date d'upload."""
+    ImageUpload = apps.get_model('detection', 'ImageUpload')
+    ImageUpload.objects.update(updated_at=F('upload_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0011_imageupload_annotation_verified_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(copy_upload_date, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -26,6 +28,32 @@ class ImageUpload(models.Model):
     largeur = models.CharField(max_length=50, null=True, blank=True)
     pixels = models.CharField(max_length=50, null=True, blank=True)
 
+    # Hash perceptuel (dHash 64 bits en hex) pour détecter les ré-uploads
+    phash = models.CharField(max_length=16, null=True, blank=True, db_index=True)
+    duplicate_of = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.SET_NULL, related_name='duplicates'
+    )
+
+    # Caractéristiques couleur (colonnes de df_features_img.csv) des uploads annotés par l'utilisateur :
+    # exemples ajoutés à la base du classifieur k-NN
+    features = models.JSONField(null=True, blank=True)
+    # Origine de `features` (voir detection/feature_verification.py)
+    features_source = models.CharField(
+        max_length=16,
+        choices=[
+            ("server", "Calculées par le serveur"),
+            ("client", "Client, vérifiées sur la miniature"),
+            ("client_checked", "Client, vérifiées en pleine résolution"),
+            ("rejected", "Client, rejetées"),
+        ],
+        null=True, blank=True, db_index=True,
+    )
+    # Annotation confirmée par un modérateur (action de l'admin) : l'annotation envoyée par
+    # l'utilisateur n'est pas vérifiée, seuls ces uploads entrent dans la base k-NN
+    annotation_verified_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Dernière modification (annotation corrigée...) : reprise de l'export (export_dataset)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -42,7 +70,103 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     langue = models.CharField(max_length=10, choices=LANG_CHOICES, default='fr')
     theme = models.CharField(max_length=10, choices=THEME_CHOICES, default='light')
-    points = models.PositiveIntegerField(default=0)  # 1 point par photo pleine
+    points = models.PositiveIntegerField(default=0, db_index=True)  # 1 point par photo pleine
+
+    def __str__(self):
+        return f"Profil de {self.user.username}"
+
+class BinLocation(models.Model):
+    """Emplacement de poubelle : regroupe les uploads d'une même cellule de grille (voir detection/rollup.py)."""
+    cell_lat = models.IntegerField()
+    cell_lon = models.IntegerField()
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    reports = models.PositiveIntegerField(default=0)
+    full_reports = models.PositiveIntegerField(default=0)
+    last_annotation = models.CharField(max_length=10, null=True, blank=True)
+    last_report = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('cell_lat', 'cell_lon')
+        indexes = [models.Index(fields=['last_annotation', 'last_report'])]
 
     def __str__(self):
-        return f"Profil de {self.user.username}"
\ No newline at end of file
+        return f"Emplacement {self.pk} ({self.latitude:.5f}, {self.longitude:.5f})"
+
+
+class BinReport(models.Model):
+    """Rattachement d'un upload à un emplacement, avec l'annotation déjà comptée dans les agrégats."""
+    upload = models.OneToOneField(ImageUpload, primary_key=True, on_delete=models.CASCADE, related_name='bin_report')
+    location = models.ForeignKey(BinLocation, on_delete=models.CASCADE, related_name='bin_reports')
+    annotation = models.CharField(max_length=10)
+    reported_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['location', '-reported_at'])]
+
+
+class BinStatHourly(models.Model):
+    location = models.ForeignKey(BinLocation, on_delete=models.CASCADE, related_name='hourly_stats')
+    hour = models.DateTimeField()
+    reports = models.PositiveIntegerField(default=0)
+    full = models.PositiveIntegerField(default=0)
+    empty = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('location', 'hour')
+        indexes = [models.Index(fields=['hour'])]
+
+
+class BinStatDaily(models.Model):
+    location = models.ForeignKey(BinLocation, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    reports = models.PositiveIntegerField(default=0)
+    full = models.PositiveIntegerField(default=0)
+    empty = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('location', 'day')
+        indexes = [models.Index(fields=['day'])]
+
+
+class UploadSession(models.Model):
+    """
+    Upload en plusieurs morceaux (detection/chunked_upload.py) : le fichier est
+    écrit dans un fichier temporaire et peut reprendre à `received` après une coupure.
+    """
+    PURPOSES = [("upload", "Upload"), ("analyze", "Analyse")]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uploader = models.ForeignKey(User, on_delete=models.CASCADE)
+    purpose = models.CharField(max_length=10, choices=PURPOSES, default="upload")
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    # Empreinte annoncée par le client (vérifiée à la finalisation)
+    sha256 = models.CharField(max_length=64, blank=True, default="")
+    # Champs du formulaire d'upload (annotation, latitude, taille...)
+    fields = models.JSONField(default=dict, blank=True)
+    # Position EXIF, lue dès que l'en-tête du fichier est arrivé
+    exif_checked = models.BooleanField(default=False)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Réponse de la finalisation, renvoyée telle quelle si le client la redemande
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.received}/{self.size})"
+
+
+class PhashBand(models.Model):
+    """
+    Tranche du dHash d'un upload (voir detection/image_hash.py) : deux hash à
+    distance <= MAX_DISTANCE ont au moins une tranche identique, cherchée par index.
+    """
+    upload = models.ForeignKey(ImageUpload, on_delete=models.CASCADE, related_name='phash_bands')
+    band = models.PositiveSmallIntegerField()
+    value = models.IntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['band', 'value'])]
@@ -0,0 +1,142 @@
+from django.core.cache import cache
+from django.db.models import Count, F
+from . import metrics
+from .models import ImageUpload, UserProfile
+
+# Le classement mis en cache couvre le top LEADERBOARD_SIZE ; les requêtes plus courtes en sont un extrait
+LEADERBOARD_SIZE = 50
+LEADERBOARD_CACHE_KEY = "leaderboard:top"
+
+# Le rang dépend aussi des points des autres : on borne sa fraîcheur
+STATS_CACHE_TIMEOUT = 60
+
+# Préférences et points servis par /api/user/me/ (invalidés à chaque modification)
+PROFILE_CACHE_TIMEOUT = 300
+
+
+def _stats_cache_key(user_id):
+    return f"stats:{user_id}"
+
+
+def _profile_cache_key(user_id):
+    return f"profile:v2:{user_id}"
+
+
+def award_points(user, amount=1):
+    """
+    Ajoute `amount` points au profil de façon atomique.
+
+    Un seul UPDATE ... SET points = points + n : pas de lecture préalable,
+    donc pas de points perdus entre deux uploads simultanés, et seule la
+    colonne `points` est réécrite.
+    Retourne le nouveau total, ou None si l'utilisateur n'a pas de profil.
+    """
+    profiles = UserProfile.objects.filter(user=user)
+    if not profiles.update(points=F('points') + amount):
+        return None
+    total = profiles.values_list('points', flat=True).first()
+    _invalidate_leaderboard(user.pk, total)
+    invalidate_user_stats(user.pk)
+    invalidate_profile(user.pk)
+    return total
+
+
+def _invalidate_leaderboard(user_id, total):
+    """
+    Invalidation incrémentale : le top n'est recalculé que si l'utilisateur
+    y figure déjà ou si son nouveau total lui permet d'y entrer.
+    """
+    top = cache.get(LEADERBOARD_CACHE_KEY)
+    if top is None:
+        return
+    if (len(top) < LEADERBOARD_SIZE
+            or total >= top[-1]['points']
+            or any(entry['user_id'] == user_id for entry in top)):
+        cache.delete(LEADERBOARD_CACHE_KEY)
+
+
+def invalidate_user_stats(user_id):
+    cache.delete(_stats_cache_key(user_id))
+
+
+def invalidate_profile(user_id):
+    cache.delete(_profile_cache_key(user_id))
+
+
+def profile_snapshot(user_id):
+    """Thème, langue, points et is_active, depuis le cache (une requête en cas d'absence)."""
+    key = _profile_cache_key(user_id)
+    snapshot = cache.get(key)
+    metrics.inc('urbin_cache_requests_total', cache='profile', result='miss' if snapshot is None else 'hit')
+    if snapshot is None:
+        snapshot = (
+            UserProfile.objects.filter(user_id=user_id)
+            .values('points', 'theme', 'langue', is_active=F('user__is_active'))
+            .first()
+        )
+        if snapshot is not None:
+            cache.set(key, snapshot, PROFILE_CACHE_TIMEOUT)
+    return snapshot
+
+
+def leaderboard(limit=10):
+    """Top `limit` des utilisateurs par points (parcours de l'index sur `points`)."""
+    return list(
+        UserProfile.objects
+        .order_by('-points', 'id')
+        .values('user_id', 'user__first_name', 'user__last_name', 'points')[:limit]
+    )
+
+
+def competition_rank(points):
+    """Rang de compétition (1, 2, 2, 4) : 1 + nombre de profils strictement devant."""
+    return UserProfile.objects.filter(points__gt=points).count() + 1
+
+
+def get_leaderboard(limit=10):
+    """
+    Classement des utilisateurs connectés, servi depuis le cache. Même règle de
+    rang que user_stats : les ex æquo partagent le rang du premier d'entre eux.
+    """
+    top = cache.get(LEADERBOARD_CACHE_KEY)
+    metrics.inc('urbin_cache_requests_total', cache='leaderboard', result='miss' if top is None else 'hit')
+    if top is None:
+        top = leaderboard(LEADERBOARD_SIZE)
+        cache.set(LEADERBOARD_CACHE_KEY, top, None)
+    rows, rank = [], 0
+    for position, entry in enumerate(top[:limit], start=1):
+        # Le top est trié par points décroissants : tous ceux qui sont devant y figurent
+        if position == 1 or entry['points'] != top[position - 2]['points']:
+            rank = position
+        rows.append({
+            "rank": rank,
+            "first_name": entry['user__first_name'],
+            "last_name": entry['user__last_name'],
+            "points": entry['points'],
+        })
+    return rows
+
+
+def user_stats(user):
+    """Points, rang et nombre d'uploads par annotation de l'utilisateur."""
+    key = _stats_cache_key(user.pk)
+    stats = cache.get(key)
+    metrics.inc('urbin_cache_requests_total', cache='stats', result='miss' if stats is None else 'hit')
+    if stats is not None:
+        return stats
+
+    points = UserProfile.objects.filter(user=user).values_list('points', flat=True).first() or 0
+    # Comptage sur l'index `points`
+    rank = competition_rank(points)
+
+    uploads = {value: 0 for value, _ in ImageUpload._meta.get_field('annotation').choices}
+    for row in ImageUpload.objects.filter(uploader=user).values('annotation').annotate(n=Count('id')):
+        uploads[row['annotation']] = row['n']
+
+    stats = {
+        "points": points,
+        "rank": rank,
+        "uploads": {"total": sum(uploads.values()), **uploads},
+    }
+    cache.set(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
@@ -0,0 +1,64 @@
+"""
+Formats compacts des données de la carte, choisis par négociation de contenu
+(en-tête Accept ou ?format=) sur /api/bins/.
+
+  - columnar (application/vnd.urbin.columnar+json) : un tableau par champ,
+    nombres convertis, classes codées sur un entier.
+  - packed (application/vnd.urbin.bins) : tampons binaires little-endian
+    directement utilisables comme typed arrays côté client.
+
+Format packed, version 2 (ids alignés sur 8 octets, sections suivantes sur 4) :
+
+    en-tête  : magic "UBIN", version u8, nb de classes u8, 2 octets nuls,
+               n u32, puis total, pleine, vide, inconnu en u32, 4 octets nuls
+               (32 octets)
+    ids      : u64[n]  (clés BigAutoField ; BigUint64Array côté client)
+    latitude : f32[n]  (NaN si inconnue)
+    longitude: f32[n]  (NaN si inconnue)
+    classe   : u8[n]   (indice dans CLASSES : pleine, vide, auto, non)
+"""
+import struct
+import sys
+from array import array
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+PACKED_MAGIC = b'UBIN'
+PACKED_VERSION = 2
+PACKED_HEADER = struct.Struct('<4sBBxxIIIIIxxxx')
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+class BinsColumnarRenderer(JSONRenderer):
+    media_type = 'application/vnd.urbin.columnar+json'
+    format = 'columnar'
+
+
+class BinsPackedRenderer(BaseRenderer):
+    media_type = 'application/vnd.urbin.bins'
+    format = 'packed'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        columns = data['columns']
+        stats = data['stats']
+        nan = float('nan')
+        n = len(columns['id'])
+        header = PACKED_HEADER.pack(
+            PACKED_MAGIC, PACKED_VERSION, len(data['classes']), n,
+            stats['total'], stats['pleine'], stats['vide'], stats['inconnu'],
+        )
+        return b''.join([
+            header,
+            _little_endian(array('Q', columns['id'])),
+            _little_endian(array('f', (nan if v is None else v for v in columns['latitude']))),
+            _little_endian(array('f', (nan if v is None else v for v in columns['longitude']))),
+            bytes(columns['classe']),
+            b'\x00' * (-n % 4),
+        ])
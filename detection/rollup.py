@@ -0,0 +1,214 @@
+"""
+Agrégats par emplacement de poubelle (BinLocation), tenus à jour au fil des uploads.
+
+Chaque upload géolocalisé est rattaché à un emplacement : la cellule de grille
+(GRID_SIZE degrés) de sa position, ou l'emplacement existant le plus proche
+dans les cellules voisines s'il est à moins de MERGE_RADIUS_M mètres (une
+poubelle à cheval sur deux cellules reste un seul emplacement).
+
+Le rattachement (BinReport) mémorise l'annotation déjà comptée : un nouvel
+enregistrement de l'upload (classification après coup) n'applique que la
+différence aux tables horaires et journalières, sans jamais relire l'historique.
+La commande `rollup_bins` rattache les uploads passés (ou créés par bulk_create).
+"""
+import math
+import threading
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+
+from .models import BinLocation, BinReport, BinStatDaily, BinStatHourly, ImageUpload
+
+GRID_SIZE = 0.0005  # degrés (~55 m en latitude)
+MERGE_RADIUS_M = 30
+EARTH_RADIUS_M = 6_371_000
+
+_local = threading.local()
+
+
+def cell_of(latitude, longitude):
+    return math.floor(latitude / GRID_SIZE), math.floor(longitude / GRID_SIZE)
+
+
+def cell_range(min_lat, min_lon, max_lat, max_lon):
+    """Filtre sur l'index (cell_lat, cell_lon) couvrant une zone."""
+    (lat_lo, lon_lo), (lat_hi, lon_hi) = cell_of(min_lat, min_lon), cell_of(max_lat, max_lon)
+    return {
+        'cell_lat__gte': lat_lo, 'cell_lat__lte': lat_hi,
+        'cell_lon__gte': lon_lo, 'cell_lon__lte': lon_hi,
+    }
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Distance haversine en mètres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def locate(latitude, longitude):
+    """Emplacement existant le plus proche (cellules voisines), sinon celui de la cellule, créé au besoin."""
+    cell_lat, cell_lon = cell_of(latitude, longitude)
+    neighbours = BinLocation.objects.filter(
+        cell_lat__range=(cell_lat - 1, cell_lat + 1), cell_lon__range=(cell_lon - 1, cell_lon + 1)
+    )
+    best = min(neighbours, key=lambda loc: distance_m(latitude, longitude, loc.latitude, loc.longitude), default=None)
+    if best is not None and (
+            (best.cell_lat, best.cell_lon) == (cell_lat, cell_lon)
+            or distance_m(latitude, longitude, best.latitude, best.longitude) <= MERGE_RADIUS_M):
+        return best
+    try:
+        with transaction.atomic():
+            return BinLocation.objects.create(
+                cell_lat=cell_lat, cell_lon=cell_lon, latitude=latitude, longitude=longitude
+            )
+    except IntegrityError:
+        # Créé entre-temps par un autre worker
+        return BinLocation.objects.get(cell_lat=cell_lat, cell_lon=cell_lon)
+
+
+def _counts(annotation):
+    return (1 if annotation == "pleine" else 0), (1 if annotation == "vide" else 0)
+
+
+def _add(model, location_id, period_field, period, reports, full, empty):
+    """UPDATE ... SET x = x + n de la ligne (emplacement, période), créée si absente."""
+    lookup = {'location_id': location_id, period_field: period}
+    deltas = {'reports': F('reports') + reports, 'full': F('full') + full, 'empty': F('empty') + empty}
+    if model.objects.filter(**lookup).update(**deltas):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, reports=reports, full=full, empty=empty)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**deltas)
+
+
+def _apply(location_id, reported_at, reports, full, empty):
+    hour = reported_at.replace(minute=0, second=0, microsecond=0)
+    _add(BinStatHourly, location_id, 'hour', hour, reports, full, empty)
+    _add(BinStatDaily, location_id, 'day', reported_at.date(), reports, full, empty)
+    BinLocation.objects.filter(pk=location_id).update(
+        reports=F('reports') + reports, full_reports=F('full_reports') + full
+    )
+
+
+def _refresh_last(location_id):
+    last = (BinReport.objects.filter(location_id=location_id)
+            .order_by('-reported_at').values('annotation', 'reported_at').first())
+    BinLocation.objects.filter(pk=location_id).update(
+        last_annotation=last['annotation'] if last else None,
+        last_report=last['reported_at'] if last else None,
+    )
+
+
+@transaction.atomic
+def record_upload(upload_id):
+    """
+    Rattache l'upload à son emplacement et met à jour les agrégats (idempotent).
+    Retourne l'emplacement, ou None si l'upload n'est pas géolocalisé.
+    """
+    upload = (ImageUpload.objects.filter(pk=upload_id)
+              .values('latitude', 'longitude', 'annotation', 'upload_date').first())
+    if upload is None or upload['latitude'] is None or upload['longitude'] is None:
+        return None
+
+    report = BinReport.objects.select_for_update().filter(upload_id=upload_id).first()
+    full, empty = _counts(upload['annotation'])
+    if report is None:
+        location = locate(upload['latitude'], upload['longitude'])
+        report = BinReport.objects.create(
+            upload_id=upload_id, location=location,
+            annotation=upload['annotation'], reported_at=upload['upload_date'],
+        )
+        n = BinLocation.objects.filter(pk=location.pk).values_list('reports', flat=True).first()
+        # Centre de l'emplacement = moyenne des positions rattachées
+        BinLocation.objects.filter(pk=location.pk).update(
+            latitude=(F('latitude') * n + upload['latitude']) / (n + 1),
+            longitude=(F('longitude') * n + upload['longitude']) / (n + 1),
+        )
+        _apply(location.pk, report.reported_at, 1, full, empty)
+    elif report.annotation != upload['annotation']:
+        old_full, old_empty = _counts(report.annotation)
+        BinReport.objects.filter(pk=upload_id).update(annotation=upload['annotation'])
+        _apply(report.location_id, report.reported_at, 0, full - old_full, empty - old_empty)
+    else:
+        return report.location
+    _refresh_last(report.location_id)
+    return report.location
+
+
+def forget_report(report):
+    """Retire des agrégats un rattachement supprimé (suppression de l'upload)."""
+    if getattr(_local, 'paused', False):
+        return
+    full, empty = _counts(report.annotation)
+    _apply(report.location_id, report.reported_at, -1, -full, -empty)
+    _refresh_last(report.location_id)
+
+
+@contextmanager
+def paused():
+    """Suspend forget_report (reconstruction complète par `rollup_bins --rebuild`)."""
+    _local.paused = True
+    try:
+        yield
+    finally:
+        _local.paused = False
+
+
+def pending_uploads():
+    """Uploads géolocalisés pas encore rattachés à un emplacement."""
+    return ImageUpload.objects.filter(
+        latitude__isnull=False, longitude__isnull=False, bin_report__isnull=True
+    ).order_by('id')
+
+
+def recent_full_locations(since, bbox=None):
+    """Emplacements dont le dernier signalement (depuis `since`) est « pleine » : index (last_annotation, last_report)."""
+    locations = BinLocation.objects.filter(last_annotation="pleine", last_report__gte=since)
+    if bbox:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        locations = locations.filter(
+            **cell_range(min_lat, min_lon, max_lat, max_lon),
+            latitude__range=(min_lat, max_lat), longitude__range=(min_lon, max_lon),
+        )
+    return locations.order_by('-last_report')
+
+
+def _fill_rate(row):
+    return round(row['full'] / row['reports'], 3) if row['reports'] else None
+
+
+def history(locations, granularity, start, end):
+    """
+    Série temporelle (somme sur les emplacements donnés) lue dans les tables
+    d'agrégats, et profil de remplissage par jour de semaine (1 = lundi) et heure UTC.
+    """
+    hourly = BinStatHourly.objects.filter(location__in=locations, hour__gte=start, hour__lte=end)
+    if granularity == 'day':
+        rows = BinStatDaily.objects.filter(location__in=locations, day__gte=start.date(), day__lte=end.date())
+        field = 'day'
+    else:
+        rows, field = hourly, 'hour'
+    rows = (rows
+            .values(field).order_by(field)
+            .annotate(reports=Sum('reports'), full=Sum('full'), empty=Sum('empty')))
+    series = [
+        {"period": row[field].isoformat(), "reports": row['reports'], "full": row['full'],
+         "empty": row['empty'], "fill_rate": _fill_rate(row)}
+        for row in rows
+    ]
+
+    profile = [
+        {"weekday": row['weekday'], "hour": row['hour_of_day'], "reports": row['reports'],
+         "full": row['full'], "fill_rate": _fill_rate(row)}
+        for row in (hourly
+                    .annotate(weekday=ExtractIsoWeekDay('hour'), hour_of_day=ExtractHour('hour'))
+                    .values('weekday', 'hour_of_day').order_by('weekday', 'hour_of_day')
+                    .annotate(reports=Sum('reports'), full=Sum('full')))
+    ]
+    return {"series": series, "profile": profile}
@@ -1,10 +1,44 @@
 # detection/signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import UserProfile
+from .models import BinReport, ImageUpload, UserProfile
+from .points import invalidate_profile, invalidate_user_stats
+from .bins import bump_data_version
+from .rollup import record_upload, forget_report
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def refresh_profile_snapshot(sender, instance, **kwargs):
+    # is_active fait partie de l'instantané lu par /api/user/me/
+    invalidate_profile(instance.pk)
+
+
+@receiver(post_save, sender=ImageUpload)
+def refresh_uploader_stats(sender, instance, **kwargs):
+    invalidate_user_stats(instance.uploader_id)
+
+
+@receiver(post_save, sender=ImageUpload)
+@receiver(post_delete, sender=ImageUpload)
+def bump_bins_version(sender, **kwargs):
+    # Après le commit : une requête concurrente ne peut pas mettre en cache la nouvelle version sans la ligne
+    transaction.on_commit(bump_data_version)
+
+
+@receiver(post_save, sender=ImageUpload)
+def rollup_upload(sender, instance, **kwargs):
+    # Agrégats par emplacement : seule la différence avec ce qui est déjà compté est appliquée
+    upload_id = instance.pk
+    transaction.on_commit(lambda: record_upload(upload_id))
+
+
+@receiver(post_delete, sender=BinReport)
+def rollup_report_deleted(sender, instance, **kwargs):
+    forget_report(instance)
@@ -0,0 +1,59 @@
+"""
+Stockage des médias adressé par contenu.
+
+Un fichier enregistré sous "uploads/photo.jpg" est écrit sous
+"uploads/ab/cd/abcd….jpg" (SHA-256 du contenu, deux niveaux de répertoires
+de 256 entrées) : les répertoires restent petits même avec des centaines de
+milliers d'images, et un contenu déjà présent n'est pas réécrit. Plusieurs
+ImageUpload peuvent donc partager un fichier ; la suppression des fichiers
+n'est jamais faite à la suppression d'une ligne.
+
+Un fichier dont l'empreinte est déjà connue (attribut `sha256`, posé par
+l'upload en morceaux) n'est pas relu pour la calculer.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK_SIZE = 1 << 20
+CONTENT_ADDRESSED_NAME = re.compile(r"(^|/)([0-9a-f]{2})/([0-9a-f]{2})/\2\3[0-9a-f]{60}(\.\w+)?$")
+
+
+def content_hash(content):
+    """SHA-256 hexadécimal d'un File Django, lu par blocs ; curseur remis au début."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def is_content_addressed(name):
+    return bool(name) and CONTENT_ADDRESSED_NAME.search(name) is not None
+
+
+def content_addressed_name(name, digest):
+    """"uploads/photo.JPG" + empreinte -> "uploads/ab/cd/<empreinte>.jpg"."""
+    directory = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return '/'.join(filter(None, (directory, digest[:2], digest[2:4], digest + extension)))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage dont les noms sont dérivés du contenu (voir le module)."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = content_addressed_name(name, getattr(content, 'sha256', None) or content_hash(content))
+        if self.exists(name):
+            # Contenu identique déjà stocké : dédupliqué. mtime rafraîchi pour que le
+            # ramasse-miettes (detection/media_gc.py) ne le prenne pas pour un vieil orphelin
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
@@ -1,3 +1,1245 @@
-from django.test import TestCase
+import argparse
+import hashlib
+import csv
+import importlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from benchmarks import extractor as extractor_benchmark, load_test
+
+from . import chunked_upload, classifier, media_gc, metrics
+from .ai.feature_store import (
+    CSV_LABELS, DEFAULT_FEATURES_CSV, DEFAULT_FILES_CSV, FeatureStore, _append_rows, convert_csv, read_files_csv,
+)
+from .ai.knn_classifier import FEATURE_NAMES, KNNClassifier
+from .bins import CLASSES, bump_data_version
+from .ai.feature_extractor import ImageFeatureExtractor, colour_statistics, decode_analysis_image
+from .feature_verification import FeaturesRejected, verify
+from .gps_utils import extract_gps_with_pil, read_gps
+from .image_hash import BAND_WIDTHS, MAX_DISTANCE, compute_dhash, find_near_duplicate, hash_bands, index_phash
+from .models import BinLocation, BinReport, BinStatDaily, BinStatHourly, ImageUpload, UploadSession, UserProfile
+from .points import LEADERBOARD_CACHE_KEY, award_points, get_leaderboard, user_stats
+from .renderers import PACKED_HEADER, PACKED_MAGIC, PACKED_VERSION
+from .rollup import record_upload
+from .routing import plan_route
+from .storage import is_content_addressed
+from .tokens import ProfileTokenObtainPairSerializer
+
+
+def photo_bytes(width=900, height=600, orientation=None, seed=0):
+    """JPEG de synthèse (dégradés et formes), avec une orientation EXIF éventuelle."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + 2 * y) % 256], axis=-1).astype(np.uint8)
+    left, top = int(rng.integers(0, width // 2)), int(rng.integers(0, height // 2))
+    cv2.rectangle(pixels, (left, top), (left + width // 3, top + height // 3), (200, 30, 30), -1)
+    cv2.circle(pixels, (width * 3 // 4, height * 3 // 4), min(width, height) // 5, (20, 180, 60), -1)
+    image = Image.fromarray(pixels)
+    exif = image.getexif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=92, exif=exif.tobytes())
+    return out.getvalue()
+
+
+def thumbnail_bytes(data, max_side=320):
+    """Miniature telle que la produit un client honnête : image affichée (redressée), réduite."""
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    image.thumbnail((max_side, max_side))
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=90)
+    return out.getvalue()
+
+
+def client_features(thumbnail):
+    return colour_statistics(cv2.imdecode(np.frombuffer(thumbnail, dtype=np.uint8), cv2.IMREAD_COLOR))
+
+
+def jpeg_file(data, name='photo.jpg'):
+    return SimpleUploadedFile(name, data, content_type='image/jpeg')
+
+
+class LocMemCacheMixin:
+    """Cache mémoire vide à chaque test (le cache fichier par défaut est partagé avec le serveur de dev)."""
+
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'},
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+
+class TempMediaMixin:
+    """MEDIA_ROOT temporaire, supprimé après chaque test."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root
+
+
+class FeatureVerificationTests(TestCase):
+    def verify(self, data, thumbnail, features=None, spot_check_rate=1.0):
+        image = jpeg_file(data)
+        return verify(
+            client_features(thumbnail) if features is None else features,
+            jpeg_file(thumbnail, 'thumb.jpg'), image, compute_dhash(image), spot_check_rate,
+        )
+
+    def test_honest_thumbnail_accepted(self):
+        data = photo_bytes()
+        self.assertEqual(self.verify(data, thumbnail_bytes(data))[1], 'client_checked')
+
+    def test_exif_rotated_photo_accepted(self):
+        # Photo de portrait stockée en paysage avec orientation=6 : le client voit l'image redressée
+        data = photo_bytes(orientation=6)
+        self.assertEqual(Image.open(io.BytesIO(thumbnail_bytes(data))).size, (213, 320))
+        self.assertEqual(self.verify(data, thumbnail_bytes(data))[1], 'client_checked')
+
+    def test_dhash_follows_exif_orientation(self):
+        upright = ImageOps.exif_transpose(Image.open(io.BytesIO(photo_bytes(orientation=6))))
+        out = io.BytesIO()
+        upright.save(out, 'JPEG', quality=92)
+        self.assertEqual(
+            compute_dhash(io.BytesIO(photo_bytes(orientation=6))),
+            compute_dhash(io.BytesIO(out.getvalue())),
+        )
+
+    def test_tampered_features_rejected(self):
+        data = photo_bytes()
+        thumbnail = thumbnail_bytes(data)
+        features = client_features(thumbnail)
+        features['r_channel_mean'] += 40
+        with self.assertRaises(FeaturesRejected) as raised:
+            self.verify(data, thumbnail, features)
+        self.assertEqual(raised.exception.reason, 'features')
+        self.assertIn('r_channel_mean', raised.exception.details)
+
+    def test_thumbnail_of_another_image_rejected(self):
+        other = thumbnail_bytes(photo_bytes(width=600, height=900, seed=1))
+        with self.assertRaises(FeaturesRejected) as raised:
+            self.verify(photo_bytes(), other)
+        self.assertEqual(raised.exception.reason, 'thumbnail_aspect')
+
+    def test_oversized_thumbnail_rejected(self):
+        data = photo_bytes()
+        with self.assertRaises(FeaturesRejected) as raised:
+            self.verify(data, thumbnail_bytes(data, max_side=640))
+        self.assertEqual(raised.exception.reason, 'thumbnail_size')
+
+
+class UploadFeaturesApiTests(LocMemCacheMixin, TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('a@example.com', 'a@example.com', 'x'))
+
+    def post(self, **fields):
+        return self.client.post('/api/upload-image/', {'annotation': 'vide', **fields}, format='multipart')
+
+    def test_rotated_upload_keeps_client_features(self):
+        data = photo_bytes(orientation=6)
+        thumbnail = thumbnail_bytes(data)
+        response = self.post(
+            image=jpeg_file(data), thumbnail=jpeg_file(thumbnail, 'thumb.jpg'),
+            features=json.dumps(client_features(thumbnail)),
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(ImageUpload.objects.get().features_source, ('client', 'client_checked'))
+
+    def test_features_without_thumbnail_rejected(self):
+        data = photo_bytes()
+        response = self.post(image=jpeg_file(data), features=json.dumps(client_features(thumbnail_bytes(data))))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_thumbnail_without_features_rejected(self):
+        data = photo_bytes()
+        response = self.post(image=jpeg_file(data), thumbnail=jpeg_file(thumbnail_bytes(data), 'thumb.jpg'))
+        self.assertEqual(response.status_code, 400)
+
+
+class GpsHeaderTests(TestCase):
+    def geotagged(self, size=(1200, 900)):
+        # 48°51'29.6"N, 2°21'7.9"W
+        exif = Image.Exif()
+        gps = exif.get_ifd(0x8825)
+        gps.update({1: 'N', 2: (48.0, 51.0, 29.6), 3: 'W', 4: (2.0, 21.0, 7.9)})
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (90, 120, 60)).save(buffer, 'JPEG', exif=exif)
+        buffer.seek(0)
+        return buffer
+
+    def test_header_reader_matches_pil(self):
+        image_file = self.geotagged()
+        lat, lon = read_gps(image_file)
+        self.assertAlmostEqual(lat, 48.858222, places=5)
+        self.assertAlmostEqual(lon, -2.352194, places=5)
+        self.assertEqual(image_file.tell(), 0)
+        self.assertEqual((lat, lon), tuple(extract_gps_with_pil(image_file)))
+
+    def test_no_gps_block(self):
+        self.assertIsNone(read_gps(io.BytesIO(photo_bytes())))
+
+
+class AwardPointsTests(LocMemCacheMixin, TransactionTestCase):
+    # SQLite en mémoire (cache partagé) lève « table is locked » entre threads au lieu d'attendre
+    @skipIf(connection.vendor == 'sqlite', "écritures concurrentes : base PostgreSQL requise")
+    def test_concurrent_awards_are_not_lost(self):
+        user = User.objects.create_user('p', 'p@example.com', 'x')
+        errors = []
+
+        def award():
+            try:
+                for _ in range(20):
+                    award_points(user, 2)
+            except Exception as e:  # remonté dans le thread principal
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=award) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(UserProfile.objects.get(user=user).points, 6 * 20 * 2)
+
+    def test_single_atomic_update(self):
+        # Sans lecture préalable : aucune fenêtre entre lecture et écriture où perdre des points
+        user = User.objects.create_user('p', 'p@example.com', 'x')
+        with CaptureQueriesContext(connection) as queries:
+            award_points(user, 2)
+        first = queries.captured_queries[0]['sql']
+        self.assertTrue(first.startswith('UPDATE'), first)
+        self.assertRegex(first, r'SET "points" = \("detection_userprofile"\."points" \+ 2\)')
+
+    def test_other_profile_writes_keep_awarded_points(self):
+        user = User.objects.create_user('p', 'p@example.com', 'x')
+        stale = UserProfile.objects.get(user=user)
+        award_points(user, 5)
+        stale.theme = 'dark'
+        stale.save(update_fields=['theme'])  # comme UpdateUserView
+        self.assertEqual(UserProfile.objects.get(user=user).points, 5)
+
+    def test_returns_total_and_none_without_profile(self):
+        user = User.objects.create_user('p', 'p@example.com', 'x')
+        self.assertEqual(award_points(user, 3), 3)
+        self.assertEqual(award_points(user, 2), 5)
+        UserProfile.objects.filter(user=user).delete()
+        self.assertIsNone(award_points(user, 1))
+
+    @mock.patch('detection.points.LEADERBOARD_SIZE', 2)
+    def test_leaderboard_invalidated_only_when_top_changes(self):
+        users = [User.objects.create_user(name, f'{name}@example.com', 'x') for name in 'abc']
+        for user, points in zip(users, (30, 20, 5)):
+            UserProfile.objects.filter(user=user).update(points=points)
+        get_leaderboard()
+        award_points(users[2], 1)  # 6 < 20 : reste hors du top
+        self.assertIsNotNone(cache.get(LEADERBOARD_CACHE_KEY))
+        award_points(users[2], 20)  # 26 : entre dans le top
+        self.assertIsNone(cache.get(LEADERBOARD_CACHE_KEY))
+        self.assertEqual([row['points'] for row in get_leaderboard()], [30, 26])
+
+
+class LeaderboardTests(LocMemCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = {}
+        for name, points in (('a', 30), ('b', 20), ('c', 20), ('d', 10)):
+            user = User.objects.create_user(name, f'{name}@example.com', 'x', first_name=name.upper())
+            UserProfile.objects.filter(user=user).update(points=points)
+            self.users[name] = user
+
+    def test_requires_authentication(self):
+        self.assertEqual(APIClient().get('/api/leaderboard/').status_code, 401)
+
+    def test_ties_share_a_competition_rank(self):
+        client = APIClient()
+        client.force_authenticate(self.users['a'])
+        response = client.get('/api/leaderboard/?limit=4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['rank'] for row in response.data['leaderboard']], [1, 2, 2, 4])
+
+    def test_stats_rank_matches_leaderboard(self):
+        ranks = {row['first_name']: row['rank'] for row in get_leaderboard(4)}
+        for name, user in self.users.items():
+            self.assertEqual(user_stats(user)['rank'], ranks[name.upper()])
+
+
+class UserProfileApiTests(LocMemCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('u', 'u@example.com', 'x', first_name='Ursule', last_name='Ubin')
+        token = ProfileTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_identity_from_token_claims(self):
+        with self.assertNumQueries(1):  # instantané du profil, identité lue dans le token
+            response = self.client.get('/api/user/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], 'u@example.com')
+        self.assertEqual(response.data['first_name'], 'Ursule')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/user/me/').status_code, 200)
+
+    def test_deactivated_user_rejected_before_token_expiry(self):
+        self.assertEqual(self.client.get('/api/user/me/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/user/me/').status_code, 401)
+        self.assertEqual(self.client.get('/api/user/me/stats/').status_code, 401)
+
+    def test_login_opens_session(self):
+        response = self.client.post('/api/login/', {'email': 'u', 'password': 'x'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('_auth_user_id', self.client.session)
+
+
+class MetricsTests(TestCase):
+    def test_special_float_values(self):
+        self.assertEqual(metrics._format_value(float('inf')), '+Inf')
+        self.assertEqual(metrics._format_value(float('-inf')), '-Inf')
+        self.assertEqual(metrics._format_value(float('nan')), 'NaN')
+        self.assertEqual(metrics._format_value(3.0), '3')
+        self.assertEqual(metrics._format_value(0.25), '0.25')
+
+    @override_settings(DEBUG=False, METRICS_TOKEN=None)
+    def test_refused_without_token_outside_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(DEBUG=True, METRICS_TOKEN=None)
+    def test_served_without_token_in_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='secret')
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_dead_worker_files_are_archived(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        dead_pid = 2 ** 22 + 12345  # au-delà de pid_max : aucun processus vivant
+
+        def worker_file(pid, uploads):
+            path = f'{directory}/metrics_{pid}.json'
+            with open(path, 'w') as f:
+                json.dump({'pid': pid, 'values': [
+                    ['urbin_uploads_total', [['source', 'test']], uploads],
+                    ['urbin_requests_in_progress', [], 3],
+                ]}, f)
+            return path
+
+        def uploads(merged):
+            return merged.get(('urbin_uploads_total', (('source', 'test'),)), 0)
+
+        with mock.patch.dict('os.environ', {'METRICS_MULTIPROC_DIR': directory}):
+            before = uploads(metrics.collect())
+            first = worker_file(dead_pid, 5)
+            metrics.mark_process_dead(dead_pid)
+            second = worker_file(dead_pid + 1, 2)
+            metrics.mark_process_dead(dead_pid + 1)
+            merged = metrics.collect()
+        self.assertFalse(os.path.exists(first) or os.path.exists(second))
+        self.assertEqual(uploads(merged) - before, 7)
+        self.assertEqual(os.listdir(directory), [metrics.ARCHIVE_FILE])
+        with open(f'{directory}/{metrics.ARCHIVE_FILE}') as f:
+            names = {name for name, _, _ in json.load(f)['values']}
+        self.assertNotIn('urbin_requests_in_progress', names)
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0, DEBUG=False)
+class RequestTimingTests(TestCase):
+    def test_server_timing_hidden_from_regular_users(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('a', 'a@example.com', 'x'))
+        self.assertNotIn('Server-Timing', client.get('/api/user/me/stats/'))
+
+    def test_server_timing_for_staff(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('s', 's@example.com', 'x', is_staff=True))
+        response = client.get('/api/user/me/stats/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries"')
+
+    def test_no_connection_opened_for_views_without_sql(self):
+        with mock.patch.object(connection, 'connection', None), \
+                mock.patch.object(connection, 'ensure_connection') as ensure_connection:
+            response = self.client.get('/api/hello/')
+        self.assertEqual(response.status_code, 200)
+        ensure_connection.assert_not_called()
+
+
+def flip_bits(phash, positions):
+    value = int(phash, 16)
+    for position in positions:
+        value ^= 1 << int(position)
+    return f"{value:016x}"
+
+
+class NearDuplicateTests(LocMemCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('a', 'a@example.com', 'x')
+
+    def upload(self, phash):
+        upload = ImageUpload.objects.create(uploader=self.user, image='uploads/x.jpg', phash=phash)
+        index_phash(upload)
+        return upload
+
+    def test_finds_hashes_up_to_max_distance(self):
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            original = f"{int(rng.integers(0, 2 ** 63)):016x}"
+            upload = self.upload(original)
+            flipped = flip_bits(original, rng.choice(64, size=MAX_DISTANCE, replace=False))
+            self.assertEqual(find_near_duplicate(flipped), upload)
+            upload.delete()
+
+    def test_one_flip_per_band_is_found(self):
+        # Pire cas de la recherche par tranches : une seule tranche reste intacte
+        upload = self.upload('0123456789abcdef')
+        starts = np.cumsum([0] + BAND_WIDTHS[:-1])
+        self.assertEqual(find_near_duplicate(flip_bits('0123456789abcdef', starts[:MAX_DISTANCE])), upload)
+
+    def test_ignores_distant_hashes_and_excluded_upload(self):
+        upload = self.upload('0123456789abcdef')
+        self.assertIsNone(find_near_duplicate(flip_bits('0123456789abcdef', range(MAX_DISTANCE + 1))))
+        self.assertIsNone(find_near_duplicate('0123456789abcdef', exclude_id=upload.pk))
+
+    def test_closest_candidate_wins(self):
+        self.upload(flip_bits('0123456789abcdef', range(5)))
+        closest = self.upload(flip_bits('0123456789abcdef', [63]))
+        self.assertEqual(find_near_duplicate('0123456789abcdef'), closest)
+
+    def test_migration_bands_match_the_index(self):
+        migration = importlib.import_module('detection.migrations.0010_phashband')
+        for phash in ('0000000000000000', 'ffffffffffffffff', '0123456789abcdef'):
+            self.assertEqual(migration.hash_bands(phash), hash_bands(phash))
+
+
+@override_settings(CLASSIFIER_ENGINE='knn')
+class KNNTrainingTests(LocMemCacheMixin, TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        state = mock.patch.dict(classifier._state, {'classifier': None, 'last_verified': None, 'version': None})
+        state.start()
+        self.addCleanup(state.stop)
+        self.user = User.objects.create_user('a', 'a@example.com', 'x')
+        self.base_size = classifier.knn_classifier().size
+
+    def upload(self, annotation='pleine', verified=False):
+        features = dict.fromkeys(FEATURE_NAMES, 1.0)
+        return ImageUpload.objects.create(
+            uploader=self.user, image='uploads/x.jpg', annotation=annotation, features=features,
+            features_source='server', annotation_verified_at=timezone.now() if verified else None,
+        )
+
+    def learned(self):
+        bump_data_version()
+        return classifier.knn_classifier().size - self.base_size
+
+    def test_unverified_annotations_are_not_learned(self):
+        self.upload()
+        self.upload(annotation='vide')
+        self.assertEqual(self.learned(), 0)
+
+    def test_verified_annotations_are_learned_once(self):
+        self.upload(verified=True)
+        self.assertEqual(self.learned(), 1)
+        self.assertEqual(self.learned(), 1)
+
+    def test_later_verification_of_an_older_upload(self):
+        older = self.upload()
+        self.upload(verified=True)
+        self.assertEqual(self.learned(), 1)
+        older.annotation_verified_at = timezone.now()
+        older.save()
+        self.assertEqual(self.learned(), 2)
+
+    def test_admin_action_verifies_and_computes_features(self):
+        staff = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        upload = ImageUpload.objects.create(
+            uploader=self.user, image=jpeg_file(photo_bytes()), annotation='vide',
+        )
+        self.client.force_login(staff)
+        self.client.post('/admin/detection/imageupload/', {
+            'action': 'verify_annotation', '_selected_action': [upload.pk],
+        })
+        upload.refresh_from_db()
+        self.assertIsNotNone(upload.annotation_verified_at)
+        self.assertEqual(set(upload.features), set(FEATURE_NAMES))
+        self.assertEqual(self.learned(), 1)
+
+
+class KNNConcurrencyTests(TestCase):
+    def test_predict_while_adding_samples(self):
+        import threading
+
+        rng = np.random.default_rng(0)
+        knn = KNNClassifier(k=3)
+        knn.fit(rng.random((8, len(FEATURE_NAMES))), ['pleine', 'vide'] * 4)
+        errors, done = [], threading.Event()
+
+        def predict():
+            queries = np.random.default_rng(1)
+            while not done.is_set():
+                try:
+                    knn.predict(queries.random(len(FEATURE_NAMES)))
+                except Exception as e:
+                    errors.append(e)
+                    return
+
+        thread = threading.Thread(target=predict)
+        thread.start()
+        for i in range(5000):
+            knn.add_sample(np.full(len(FEATURE_NAMES), i, dtype=np.float32), 'pleine' if i % 2 else 'vide')
+        done.set()
+        thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(knn.size, 5008)
+
+
+class ChunkedUploadTests(LocMemCacheMixin, TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('a', 'a@example.com', 'x'))
+        self.data = photo_bytes()
+
+    def create(self, **fields):
+        response = self.client.post('/api/uploads/', {
+            'size': len(self.data), 'filename': 'photo.jpg', 'annotation': 'vide', **fields,
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def put(self, session_id, start, end):
+        return self.client.generic(
+            'PUT', f'/api/uploads/{session_id}/', self.data[start:end + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.data)}',
+        )
+
+    def finalize(self, session_id):
+        return self.client.post(f'/api/uploads/{session_id}/finalize/')
+
+    def test_resume_after_interruption(self):
+        session_id = self.create(sha256=hashlib.sha256(self.data).hexdigest())
+        middle = len(self.data) // 2
+        self.assertEqual(self.put(session_id, 0, middle - 1).data['offset'], middle)
+        # Reprise : le client redemande l'offset puis envoie la suite
+        offset = self.client.get(f'/api/uploads/{session_id}/').data['offset']
+        self.assertEqual(offset, middle)
+        self.assertTrue(self.put(session_id, offset, len(self.data) - 1).data['complete'])
+
+        response = self.finalize(session_id)
+        self.assertEqual(response.status_code, 201)
+        upload = ImageUpload.objects.get()
+        with upload.image.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        # Réponse perdue : la même réponse est renvoyée sans nouvel upload
+        self.assertEqual(self.finalize(session_id).status_code, 201)
+        self.assertEqual(ImageUpload.objects.count(), 1)
+
+    def test_unexpected_offset_rejected(self):
+        session_id = self.create()
+        self.put(session_id, 0, 99)
+        response = self.put(session_id, 50, 149)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 100)
+
+    def test_incomplete_upload_cannot_be_finalized(self):
+        session_id = self.create()
+        self.put(session_id, 0, 99)
+        self.assertEqual(self.finalize(session_id).status_code, 409)
+
+    def test_sha256_mismatch(self):
+        session_id = self.create(sha256='0' * 64)
+        self.put(session_id, 0, len(self.data) - 1)
+        self.assertEqual(self.finalize(session_id).status_code, 422)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_save_error_finalizes_the_session(self):
+        session_id = self.create()
+        self.put(session_id, 0, len(self.data) - 1)
+        session = UploadSession.objects.get()
+        with mock.patch('detection.views._save_api_upload', side_effect=RuntimeError('disque plein')), \
+                self.assertLogs('detection.views', 'ERROR'):
+            response = self.finalize(session_id)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.data, {'error': 'disque plein'})
+        self.assertFalse(os.path.exists(chunked_upload.spool_path(session)))
+        self.assertEqual(self.finalize(session_id).status_code, 500)
+
+
+class ExportDatasetTests(LocMemCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output, ignore_errors=True)
+        self.user = User.objects.create_user('a', 'a@example.com', 'x')
+
+    def upload(self, annotation):
+        return ImageUpload.objects.create(uploader=self.user, image='uploads/x.jpg', annotation=annotation)
+
+    def export(self, *args):
+        call_command('export_dataset', '--output', self.output, '--shard-size', '2', *args, stdout=io.StringIO())
+        return sorted(os.listdir(self.output))
+
+    def rows(self, shard):
+        with open(os.path.join(self.output, shard), newline='', encoding='utf-8') as f:
+            return [(int(row['id']), row['annotation']) for row in csv.DictReader(f)]
+
+    def test_incremental_export(self):
+        first, second = self.upload('pleine'), self.upload('vide')
+        self.upload('non')
+        self.assertEqual(self.export(), ['shard-00000.csv', 'watermark.json'])
+        self.assertEqual(self.rows('shard-00000.csv'), [(first.pk, 'pleine'), (second.pk, 'vide')])
+        # Rien de nouveau : aucun lot
+        self.assertEqual(self.export(), ['shard-00000.csv', 'watermark.json'])
+        third = self.upload('vide')
+        self.export()
+        self.assertEqual(self.rows('shard-00001.csv'), [(third.pk, 'vide')])
+
+    def test_changed_annotation_is_reexported(self):
+        first = self.upload('pleine')
+        self.upload('vide')
+        self.export()
+        first.annotation = 'vide'
+        first.save()
+        self.export()
+        self.assertEqual(self.rows('shard-00001.csv'), [(first.pk, 'vide')])
+
+    def test_full_export_removes_stale_shards(self):
+        for _ in range(5):
+            self.upload('pleine')
+        self.assertEqual(len([name for name in self.export() if name.startswith('shard-')]), 3)
+        ImageUpload.objects.filter(pk__in=list(ImageUpload.objects.values_list('pk', flat=True)[:4])).delete()
+        self.assertEqual(self.export('--full'), ['shard-00000.csv', 'watermark.json'])
+        self.assertEqual(len(self.rows('shard-00000.csv')), 1)
+
+
+class BinsConditionalGetTests(LocMemCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user('u', 'u@example.com', 'x')
+        ImageUpload.objects.create(uploader=user, image='uploads/a.jpg', annotation='pleine', latitude=48.85)
+
+    def test_matching_etag_gives_304_without_queries(self):
+        first = self.client.get('/api/bins/')
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            revalidated = self.client.get('/api/bins/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], first['ETag'])
+        self.assertEqual(revalidated.content, b'')
+
+    def test_body_served_from_cache_until_data_changes(self):
+        first = self.client.get('/api/bins/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/bins/').content, first.content)
+        bump_data_version()  # signal d'un nouvel upload (on_commit)
+        changed = self.client.get('/api/bins/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_etag_depends_on_format_and_filter(self):
+        etags = {
+            self.client.get('/api/bins/')['ETag'],
+            self.client.get('/api/bins/?format=packed')['ETag'],
+            self.client.get('/api/bins/?classe=pleine')['ETag'],
+        }
+        self.assertEqual(len(etags), 3)
+        response = self.client.get('/api/bins/?format=packed', HTTP_IF_NONE_MATCH=self.client.get('/api/bins/')['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept', response['Vary'])
+
+
+def decode_packed(body):
+    """Décodage du format packed v2 tel qu'un client le lit (typed arrays aux décalages alignés)."""
+    magic, version, n_classes, n, total, pleine, vide, inconnu = PACKED_HEADER.unpack_from(body)
+    offset = PACKED_HEADER.size
+    ids = np.frombuffer(body, '<u8', n, offset)
+    offset += 8 * n
+    latitude = np.frombuffer(body, '<f4', n, offset)
+    longitude = np.frombuffer(body, '<f4', n, offset + 4 * n)
+    offset += 8 * n
+    classes = np.frombuffer(body, 'u1', n, offset)
+    offset += n
+    return {
+        "magic": magic, "version": version, "n_classes": n_classes, "padding": body[offset:],
+        "stats": {"total": total, "pleine": pleine, "vide": vide, "inconnu": inconnu},
+        "ids": ids.tolist(), "latitude": latitude, "longitude": longitude, "classes": classes.tolist(),
+    }
+
+
+class BinsFormatTests(LocMemCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user('u', 'u@example.com', 'x')
+        for annotation, lat, lon in (('pleine', 48.8566, 2.3522), ('vide', None, None), ('auto', -33.5, 151.25)):
+            ImageUpload.objects.create(uploader=user, image='uploads/a.jpg', annotation=annotation,
+                                       latitude=lat, longitude=lon, hauteur='600', taille='12.5')
+
+    def test_packed_round_trip(self):
+        response = self.client.get('/api/bins/', HTTP_ACCEPT='application/vnd.urbin.bins')
+        self.assertEqual(response['Content-Type'], 'application/vnd.urbin.bins')
+        packed = decode_packed(response.content)
+        rows = self.client.get('/api/bins/?format=json').json()
+        self.assertEqual((packed['magic'], packed['version']), (PACKED_MAGIC, PACKED_VERSION))
+        self.assertEqual(packed['n_classes'], len(CLASSES))
+        self.assertEqual(packed['stats'], rows['stats'])
+        self.assertEqual(packed['padding'], b'\x00' * (-len(rows['bins']) % 4))
+        self.assertEqual(packed['ids'], [row['id'] for row in rows['bins']])
+        self.assertEqual([CLASSES[code] for code in packed['classes']], [row['classe'] for row in rows['bins']])
+        for lat, lon, row in zip(packed['latitude'], packed['longitude'], rows['bins']):
+            if row['latitude'] is None:
+                self.assertTrue(np.isnan(lat) and np.isnan(lon))
+            else:
+                self.assertAlmostEqual(float(lat), row['latitude'], places=5)
+                self.assertAlmostEqual(float(lon), row['longitude'], places=5)
+
+    def test_packed_ids_use_64_bits(self):
+        upload = ImageUpload.objects.first()
+        ImageUpload.objects.filter(pk=upload.pk).update(id=2 ** 40 + 7)
+        packed = decode_packed(self.client.get('/api/bins/?format=packed').content)
+        self.assertIn(2 ** 40 + 7, packed['ids'])
+
+    def test_columnar_matches_rows(self):
+        columnar = self.client.get('/api/bins/?format=columnar').json()
+        rows = self.client.get('/api/bins/?format=json').json()['bins']
+        self.assertEqual(columnar['count'], len(rows))
+        self.assertEqual(columnar['classes'], list(CLASSES))
+        self.assertEqual(columnar['columns']['id'], [row['id'] for row in rows])
+        self.assertEqual(columnar['columns']['hauteur'], [600] * len(rows))
+        self.assertEqual(columnar['columns']['taille'], [12.5] * len(rows))
+        self.assertEqual([CLASSES[c] for c in columnar['columns']['classe']], [row['classe'] for row in rows])
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('u', 'u@example.com', 'x')
+
+    def upload(self, annotation='non', latitude=48.8502, longitude=2.3502):
+        return ImageUpload.objects.create(uploader=self.user, image='uploads/a.jpg', annotation=annotation,
+                                          latitude=latitude, longitude=longitude)
+
+    def totals(self, location):
+        location.refresh_from_db()
+        hourly = BinStatHourly.objects.get(location=location)
+        daily = BinStatDaily.objects.get(location=location)
+        self.assertEqual((hourly.reports, hourly.full, hourly.empty), (daily.reports, daily.full, daily.empty))
+        self.assertEqual((location.reports, location.full_reports), (daily.reports, daily.full))
+        return daily.reports, daily.full, daily.empty
+
+    def test_record_upload_is_idempotent(self):
+        upload = self.upload('pleine')
+        location = record_upload(upload.pk)
+        self.assertEqual(record_upload(upload.pk), location)
+        self.assertEqual(BinReport.objects.count(), 1)
+        self.assertEqual(self.totals(location), (1, 1, 0))
+        self.assertIsNone(record_upload(self.upload(latitude=None, longitude=None).pk))
+
+    def test_annotation_change_applies_only_the_delta(self):
+        upload = self.upload('non')
+        location = record_upload(upload.pk)
+        self.assertEqual(self.totals(location), (1, 0, 0))
+        for annotation, expected in (('pleine', (1, 1, 0)), ('vide', (1, 0, 1)), ('vide', (1, 0, 1))):
+            ImageUpload.objects.filter(pk=upload.pk).update(annotation=annotation)
+            record_upload(upload.pk)
+            self.assertEqual(self.totals(location), expected)
+        self.assertEqual(location.last_annotation, 'vide')
+
+    def test_deleted_upload_is_removed_from_aggregates(self):
+        kept, deleted = self.upload('vide'), self.upload('pleine')
+        location = record_upload(kept.pk)
+        record_upload(deleted.pk)
+        self.assertEqual(self.totals(location), (2, 1, 1))
+        deleted.delete()
+        self.assertEqual(self.totals(location), (1, 0, 1))
+        self.assertEqual(location.last_annotation, 'vide')
+
+    def test_nearby_uploads_across_a_cell_border_share_a_location(self):
+        # 48.8505 est une frontière de cellule ; les deux points sont à ~2 m
+        first = record_upload(self.upload(latitude=48.85049).pk)
+        second = record_upload(self.upload(latitude=48.85051).pk)
+        far = record_upload(self.upload(latitude=48.8515).pk)
+        self.assertEqual(first.pk, second.pk)
+        self.assertNotEqual(first.pk, far.pk)
+        first.refresh_from_db()
+        self.assertAlmostEqual(first.latitude, 48.8505, places=7)
+
+    def test_history_endpoint_reads_aggregates(self):
+        location = record_upload(self.upload('pleine').pk)
+        record_upload(self.upload('vide').pk)
+        response = self.client.get(f'/api/bins/history/?location={location.pk}&granularity=hour')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['reports'], row['full'], row['empty']) for row in response.json()['series']],
+                         [(2, 1, 1)])
+
+
+class RouteTests(TestCase):
+    def test_plan_is_a_permutation_of_the_stops(self):
+        rng = np.random.default_rng(0)
+        for n in (0, 1, 2, 3, 4, 60):
+            stops = [(48.85 + dlat, 2.35 + dlon) for dlat, dlon in rng.uniform(-0.02, 0.02, (n, 2))]
+            order, stats = plan_route((48.85, 2.35), stops, time_budget=1)
+            self.assertEqual(sorted(order), list(range(n)))
+            self.assertEqual(stats['stops'], n)
+            self.assertLessEqual(stats['length_m'], stats['initial_m'])
+
+    def test_points_on_a_circle_are_visited_in_angular_order(self):
+        # Points en position convexe : l'optimum local 2-opt sans croisement est l'optimum
+        angles = np.linspace(0, 2 * np.pi, 13)[:-1]
+        circle = [(48.85 + 0.01 * np.sin(a), 2.35 + 0.015 * np.cos(a)) for a in angles]
+        shuffled = np.random.default_rng(1).permutation(np.arange(1, 12))
+        order, stats = plan_route(circle[0], [circle[k] for k in shuffled], time_budget=1)
+        visited = [int(shuffled[k]) for k in order]
+        self.assertIn(visited, (list(range(1, 12)), list(range(11, 0, -1))))
+        self.assertTrue(stats['optimal_locally'])
+
+    def test_collection_route_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('u', 'u@example.com', 'x'))
+        now = timezone.now()
+        for k in range(5):
+            BinLocation.objects.create(cell_lat=k, cell_lon=0, latitude=48.85 + k * 0.001, longitude=2.35,
+                                       last_annotation='pleine', last_report=now)
+        BinLocation.objects.create(cell_lat=9, cell_lon=0, latitude=48.9, longitude=2.35,
+                                   last_annotation='vide', last_report=now)
+        response = client.get('/api/routes/collection/?depot=48.85,2.35')
+        self.assertEqual(response.status_code, 200)
+        full = set(BinLocation.objects.filter(last_annotation='pleine').values_list('id', flat=True))
+        stops = [stop['id'] for stop in response.data['stops']]
+        self.assertEqual(sorted(stops), sorted(full))
+        self.assertEqual(client.get('/api/routes/collection/?depot=120,2').status_code, 400)
+
+
+class MediaGcTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('u', 'u@example.com', 'x')
+
+    def write(self, name, age, size=10):
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def collect(self, **options):
+        return media_gc.collect(**{'temp_age': 3600, 'upload_age': 86400, **options})
+
+    def test_keep_rules(self):
+        old_temp = self.write('temp/old.jpg', 7200)
+        young_temp = self.write('temp/young.jpg', 600)
+        orphan = self.write('uploads/ab/cd/orphan.jpg', 2 * 86400)
+        young_orphan = self.write('uploads/ab/ef/young.jpg', 3600)
+        referenced = self.write('uploads/12/34/kept.jpg', 2 * 86400)
+        ImageUpload.objects.create(uploader=self.user, image='uploads/12/34/kept.jpg')
+
+        stats = self.collect()
+        self.assertEqual((stats['temp']['deleted'], stats['uploads']['deleted']), (1, 1))
+        self.assertEqual(stats['uploads']['bytes'], 10)
+        for path in (old_temp, orphan):
+            self.assertFalse(os.path.exists(path))
+        for path in (young_temp, young_orphan, referenced):
+            self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'uploads/ab/cd')))
+
+    def test_dry_run_removes_nothing(self):
+        orphan = self.write('uploads/ab/cd/orphan.jpg', 2 * 86400)
+        self.assertEqual(self.collect(dry_run=True)['uploads']['deleted'], 1)
+        self.assertTrue(os.path.exists(orphan))
+
+    def test_reference_added_after_scan_is_kept(self):
+        # Upload dédupliqué qui reprend le fichier pendant le passage
+        orphan = self.write('uploads/ab/cd/orphan.jpg', 2 * 86400)
+        ImageUpload.objects.create(uploader=self.user, image='uploads/ab/cd/orphan.jpg')
+        with mock.patch.object(media_gc, 'referenced_names', return_value=set()):
+            self.assertEqual(self.collect()['uploads']['deleted'], 0)
+        self.assertTrue(os.path.exists(orphan))
+
+    def test_file_touched_after_scan_is_kept(self):
+        path = self.write('temp/old.jpg', 7200)
+        real_scan = media_gc.scan_files
+
+        def scan_then_touch(root):
+            for entry in real_scan(root):
+                os.utime(path)  # mtime rafraîchi entre le parcours et la suppression
+                yield entry
+
+        with mock.patch.object(media_gc, 'scan_files', scan_then_touch):
+            self.assertEqual(self.collect()['temp']['deleted'], 0)
+        self.assertTrue(os.path.exists(path))
+
+    def test_live_spool_files_are_protected(self):
+        live = UploadSession.objects.create(uploader=self.user, filename='a.jpg', size=100)
+        expired = UploadSession.objects.create(uploader=self.user, filename='b.jpg', size=100)
+        UploadSession.objects.filter(pk=expired.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+        # Dernier morceau reçu il y a longtemps pour le fichier, session encore active
+        live_spool = self.write(f'temp/chunks/{live.pk}.part', 7200, size=1000)
+        expired_spool = self.write(f'temp/chunks/{expired.pk}.part', 7200, size=1000)
+        self.write('temp/analysis.jpg', 120, size=100)
+
+        stats = self.collect(temp_max_bytes=0)
+        self.assertEqual(stats['sessions'], 1)
+        self.assertTrue(os.path.exists(live_spool))
+        self.assertFalse(os.path.exists(expired_spool))
+        # Plafond dépassé par le seul morceau actif : le reste du répertoire est vidé
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'temp/analysis.jpg')))
+
+    def test_size_cap_removes_oldest_but_not_files_in_use(self):
+        oldest = self.write('temp/a.jpg', 900, size=100)
+        newer = self.write('temp/b.jpg', 600, size=100)
+        in_use = self.write('temp/c.jpg', 10, size=100)
+        stats = self.collect(temp_max_bytes=150)
+        self.assertEqual(stats['temp']['deleted'], 2)
+        self.assertFalse(os.path.exists(oldest) or os.path.exists(newer))
+        self.assertTrue(os.path.exists(in_use))
+
+
+class ColourStatisticsTests(TestCase):
+    def reference(self, image):
+        """Définition de df_features_img.csv, calculée directement sur les pixels."""
+        features = {}
+        for name, channel in (("r", 2), ("g", 1), ("b", 0)):
+            values = image[:, :, channel].ravel().astype(np.float64)
+            p25, p50, p75 = np.percentile(values, [25, 50, 75])
+            features.update({
+                f"{name}_channel_mean": values.mean(), f"{name}_channel_var": values.var(),
+                f"{name}_channel_std": values.std(), f"{name}_channel_25p": p25, f"{name}_channel_50p": p50,
+                f"{name}_channel_75p": p75, f"{name}_channel_iqr": p75 - p25,
+            })
+            for i in range(4):
+                features[f"{name}_hist_{i}"] = round(np.count_nonzero(values // 64 == i) * 100 / values.size, 2)
+        return features
+
+    def test_matches_pixel_definition(self):
+        rng = np.random.default_rng(0)
+        for shape in ((37, 53, 3), (1, 1, 3), (240, 320, 3)):
+            image = rng.integers(0, 256, shape, dtype=np.uint8)
+            ours, reference = colour_statistics(image), self.reference(image)
+            self.assertEqual(list(ours), FEATURE_NAMES)
+            for key in FEATURE_NAMES:
+                self.assertAlmostEqual(ours[key], reference[key], places=6, msg=key)
+
+    def test_column_order_matches_csv(self):
+        with open(os.path.join(settings.BASE_DIR, 'Data/csv/df_features_img.csv'), newline='', encoding='utf-8') as f:
+            header = next(csv.reader(f))
+        self.assertEqual(header[3:], FEATURE_NAMES)
+
+    def test_analysis_image_is_downscaled(self):
+        image = decode_analysis_image(photo_bytes(2400, 1000))
+        self.assertEqual(image.shape[:2], (333, 800))
+        self.assertEqual(decode_analysis_image(photo_bytes(300, 200)).shape[:2], (200, 300))
+        self.assertIsNone(decode_analysis_image(b'not an image'))
+
+
+class FeatureStoreTests(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+
+    def convert(self):
+        return convert_csv(self.path, os.path.join(settings.BASE_DIR, DEFAULT_FEATURES_CSV),
+                           os.path.join(settings.BASE_DIR, DEFAULT_FILES_CSV))
+
+    def csv_rows(self):
+        with open(os.path.join(settings.BASE_DIR, DEFAULT_FEATURES_CSV), newline='', encoding='utf-8') as f:
+            return [row for row in csv.DictReader(f) if row['classe'].strip().lower() in CSV_LABELS]
+
+    def test_csv_round_trip(self):
+        count = self.convert()
+        rows = self.csv_rows()
+        store = FeatureStore(self.path)
+        self.assertEqual((count, len(store)), (len(rows), len(rows)))
+        self.assertIsInstance(store.features, np.memmap)
+        self.assertEqual(store.feature_names, FEATURE_NAMES)
+        np.testing.assert_array_equal(
+            store.features, np.array([[float(row[name]) for name in FEATURE_NAMES] for row in rows], dtype=np.float32)
+        )
+        self.assertEqual(store.ids.tolist(), [int(row['id']) for row in rows])
+        self.assertEqual(store.label_names(), [CSV_LABELS[row['classe'].strip().lower()] for row in rows])
+        self.assertEqual(store.chemins, [row['chemin'] for row in rows])
+        files = read_files_csv(os.path.join(settings.BASE_DIR, DEFAULT_FILES_CSV))
+        self.assertEqual(store.files['hauteur'].tolist(), [files[int(i)][1] for i in store.ids])
+
+    def test_append_grows_arrays_in_place(self):
+        FeatureStore.create(self.path)
+        vectors = np.arange(2 * len(FEATURE_NAMES), dtype=np.float32).reshape(2, -1)
+        FeatureStore.append(self.path, vectors, [1, 2], ['vide', 'pleine'], ['a.jpg', 'b.jpg'])
+        FeatureStore.append(self.path, vectors[:1] + 1, [3], ['pleine'], ['c.jpg'])
+        store = FeatureStore(self.path)
+        self.assertEqual(len(store), 3)
+        np.testing.assert_array_equal(store.features[2], vectors[0] + 1)
+        self.assertEqual(store.label_names(), ['vide', 'pleine', 'pleine'])
+        self.assertEqual(store.chemins, ['a.jpg', 'b.jpg', 'c.jpg'])
+        self.assertTrue(np.isnan(store.files['latitude']).all())
+        # Lecture classique (sans mmap) : en-tête cohérent avec les données
+        self.assertEqual(np.load(os.path.join(self.path, 'ids.npy')).tolist(), [1, 2, 3])
+        with self.assertRaises(ValueError):
+            FeatureStore.append(self.path, vectors[:1], [4], ['vide'], ['d\n.jpg'])
+
+    def test_partial_append_is_not_visible(self):
+        # Écrivain interrompu après features.npy : les lecteurs s'arrêtent à la plus courte
+        FeatureStore.create(self.path)
+        vectors = np.zeros((1, len(FEATURE_NAMES)), dtype=np.float32)
+        FeatureStore.append(self.path, vectors, [1], ['vide'], ['a.jpg'])
+        _append_rows(os.path.join(self.path, 'features.npy'), vectors)
+        store = FeatureStore(self.path)
+        self.assertEqual((len(store), len(store.features)), (1, 1))
+
+    def test_knn_from_store_matches_csv(self):
+        self.convert()
+        from_csv = KNNClassifier.from_csv(os.path.join(settings.BASE_DIR, DEFAULT_FEATURES_CSV))
+        from_store = KNNClassifier.from_store(self.path)
+        for vector in FeatureStore(self.path).features[:20]:
+            self.assertEqual(from_csv.predict(vector), from_store.predict(vector))
+
+
+class ContentAddressedStorageTests(TempMediaMixin, TestCase):
+    def test_identical_content_is_stored_once(self):
+        data = photo_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        first = default_storage.save('uploads/photo.JPG', ContentFile(data))
+        self.assertEqual(first, f'uploads/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertTrue(is_content_addressed(first))
+        path = default_storage.path(first)
+        os.utime(path, (0, 0))
+        self.assertEqual(default_storage.save('uploads/other.jpg', ContentFile(data)), first)
+        # Dédupliqué : mtime rafraîchi pour le ramasse-miettes
+        self.assertGreater(os.stat(path).st_mtime, 0)
+        self.assertEqual(len(os.listdir(os.path.dirname(path))), 1)
+        self.assertNotEqual(default_storage.save('uploads/photo.jpg', ContentFile(photo_bytes(seed=1))), first)
+
+    def test_known_digest_is_not_recomputed(self):
+        content = ContentFile(b'abc', name='a.jpg')
+        content.sha256 = 'f' * 64
+        with mock.patch('detection.storage.content_hash') as content_hash:
+            name = default_storage.save('uploads/a.jpg', content)
+        content_hash.assert_not_called()
+        self.assertEqual(name, f"uploads/ff/ff/{'f' * 64}.jpg")
+
+    def test_is_content_addressed(self):
+        digest = hashlib.sha256(b'x').hexdigest()
+        self.assertTrue(is_content_addressed(f'uploads/{digest[:2]}/{digest[2:4]}/{digest}.png'))
+        self.assertFalse(is_content_addressed(f'uploads/00/00/{digest}.png'))
+        self.assertFalse(is_content_addressed('uploads/photo.jpg'))
+        self.assertFalse(is_content_addressed(''))
+
+    def test_migrate_media_layout(self):
+        user = User.objects.create_user('u', 'u@example.com', 'x')
+        flat = os.path.join(settings.MEDIA_ROOT, 'uploads', 'flat.jpg')
+        os.makedirs(os.path.dirname(flat))
+        data = photo_bytes()
+        with open(flat, 'wb') as f:
+            f.write(data)
+        # Deux lignes partagent l'ancien nom (import CSV), une troisième n'a plus de fichier
+        shared = [ImageUpload.objects.create(uploader=user, image='uploads/flat.jpg') for _ in range(2)]
+        lost = ImageUpload.objects.create(uploader=user, image='uploads/lost.jpg')
+
+        call_command('migrate_media_layout', '--dry-run', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(flat))
+        out = io.StringIO()
+        call_command('migrate_media_layout', '--batch-size', '2', stdout=out)
+        digest = hashlib.sha256(data).hexdigest()
+        for upload in shared:
+            upload.refresh_from_db()
+            self.assertEqual(upload.image.name, f'uploads/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+            self.assertEqual(upload.image.read(), data)
+        lost.refresh_from_db()
+        self.assertEqual(lost.image.name, 'uploads/lost.jpg')
+        self.assertFalse(os.path.exists(flat))
+        self.assertIn('1 introuvables', out.getvalue())
+
+
+class TextureFeaturesTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.paths = []
+        for seed, (width, height) in enumerate(((640, 480), (640, 480), (301, 199))):
+            path = os.path.join(directory, f'{seed}.png')  # sans perte : même image relue par la référence
+            Image.open(io.BytesIO(photo_bytes(width, height, seed=seed))).save(path)
+            self.paths.append(path)
+
+    def reference(self, path):
+        """Calcul float64 d'origine (filter2D et NumPy)."""
+        gray = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2GRAY)
+        edges = cv2.Canny(gray, 50, 150)
+        grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
+        grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
+        magnitude = np.sqrt(grad_x ** 2 + grad_y ** 2)
+        kernel = np.ones((5, 5), np.float32) / 25
+        mean_local = cv2.filter2D(gray.astype(np.float32), -1, kernel)
+        variance_local = cv2.filter2D((gray.astype(np.float32) - mean_local) ** 2, -1, kernel)
+        return {
+            'edge_density': round(np.sum(edges > 0) / edges.size, 4), 'total_edges': int(np.sum(edges > 0)),
+            'gradient_mean': magnitude.mean(), 'gradient_std': magnitude.std(), 'texture_mean': variance_local.mean(),
+        }
+
+    def test_float32_stage_matches_float64_reference(self):
+        extractor = ImageFeatureExtractor()
+        for path in self.paths:
+            ours, reference = extractor._extract_texture_features(path), self.reference(path)
+            self.assertEqual(ours['total_edges'], reference['total_edges'])
+            self.assertEqual(ours['edge_density'], reference['edge_density'])
+            for key in ('gradient_mean', 'gradient_std', 'texture_mean'):
+                self.assertAlmostEqual(ours[key], reference[key], delta=0.01 + 1e-5 * reference[key], msg=key)
+            json.dumps(ours)
+
+    def test_scratch_buffers_reused_for_same_size(self):
+        extractor = ImageFeatureExtractor()
+        extractor._extract_texture_features(self.paths[0])
+        buffers = extractor._scratch
+        extractor._extract_texture_features(self.paths[1])
+        self.assertIs(extractor._scratch, buffers)
+        extractor._extract_texture_features(self.paths[2])
+        self.assertEqual(extractor._scratch[0].shape, (199, 301))
+        self.assertEqual(extractor._scratch[0].dtype, np.float32)
+
+
+def run_python(code, **env):
+    """Code exécuté dans un interpréteur neuf (imports et settings non partagés avec les tests)."""
+    environ = {key: value for key, value in os.environ.items() if not key.startswith(('DB_', 'DATABASE_URL'))}
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=settings.BASE_DIR, env={**environ, **env},
+        capture_output=True, text=True, timeout=120,
+    )
+    if result.returncode:
+        raise AssertionError(result.stderr)
+    return result
+
+
+class StartupTests(TestCase):
+    def test_urlconf_does_not_load_the_cv_stack(self):
+        result = run_python(
+            "import json, os, sys, django;"
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'urbin.settings'); django.setup();"
+            "from django.conf import settings; __import__(settings.ROOT_URLCONF);"
+            "print(json.dumps(sorted(m for m in ('cv2', 'numpy', 'PIL') if m in sys.modules)))"
+        )
+        self.assertEqual(json.loads(result.stdout), [])
+
+    def test_settings_do_not_print_the_environment(self):
+        result = run_python("import urbin.settings", URBIN_TEST_SECRET='s3cr3t-value')
+        self.assertNotIn('s3cr3t-value', result.stdout + result.stderr)
+        self.assertEqual(result.stdout, '')
+
+
+class DatabaseSettingsTests(TestCase):
+    URL = 'postgres://u:p@db.example.com:5432/urbin'
+
+    def database(self, **env):
+        code = ("import json, urbin.settings as s; d = s.DATABASES['default'];"
+                "keys = ('ENGINE', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'DISABLE_SERVER_SIDE_CURSORS');"
+                "print(json.dumps({**{k: d.get(k) for k in keys}, 'OPTIONS': d.get('OPTIONS') or {}}))")
+        return json.loads(run_python(code, DATABASE_URL=self.URL, **env).stdout)
+
+    def test_persistent_connections_are_health_checked(self):
+        database = self.database(DB_CONN_MAX_AGE='120')
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((database['CONN_MAX_AGE'], database['CONN_HEALTH_CHECKS']), (120, True))
+        self.assertFalse(database['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertNotIn('pool', database['OPTIONS'])
+
+    def test_pool_mode(self):
+        database = self.database(DB_POOL='1', DB_POOL_MAX_SIZE='4')
+        # Django refuse un pool avec des connexions persistantes
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool']['max_size'], 4)
+        self.assertEqual(database['OPTIONS']['sslmode'], 'require')
+
+    def test_pgbouncer_mode(self):
+        database = self.database(DB_PGBOUNCER='1', DB_SSL_REQUIRE='0')
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertNotIn('sslmode', database['OPTIONS'])
+
+
+class ExtractorBenchmarkTests(TestCase):
+    def test_compare_flags_only_regressions_past_threshold(self):
+        baseline = {"summary": {"synthetic": {
+            "_extract_texture_features": {"wall_ms": 100.0, "alloc_peak_mb": 50.0},
+            "classify_image": {"wall_ms": 10.0, "alloc_peak_mb": 1.0},
+        }}}
+        summary = {"synthetic": {
+            "_extract_texture_features": {"wall_ms": 114.0, "alloc_peak_mb": 80.0},
+            "classify_image": {"wall_ms": 5.0, "alloc_peak_mb": 1.0},
+            "_extract_shape_features": {"wall_ms": 1000.0, "alloc_peak_mb": 1000.0},  # absente de la référence
+        }}
+        regressions = extractor_benchmark.compare(summary, baseline, 0.15)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('synthetic/_extract_texture_features alloc_peak_mb: 50.0 -> 80.0'))
+
+    def test_synthetic_image_is_reproducible(self):
+        image = extractor_benchmark.synthetic_image(0.3)
+        self.assertEqual(image.shape, (474, 632, 3))
+        np.testing.assert_array_equal(image, extractor_benchmark.synthetic_image(0.3))
+
+    def test_measure_reports_time_and_memory(self):
+        result = extractor_benchmark.measure(lambda path: np.ones(1_000_000, dtype=np.uint8), 'unused', 2)
+        self.assertEqual(set(result), {'wall_ms', 'peak_rss_mb', 'rss_growth_mb', 'alloc_peak_mb'})
+        self.assertGreaterEqual(result['alloc_peak_mb'], 1.0)
+
+
+class LoadTestHarnessTests(LocMemCacheMixin, TempMediaMixin, LiveServerTestCase):
+    def test_percentile_and_mix(self):
+        values = list(range(1, 101))
+        self.assertEqual([load_test.percentile(values, q) for q in (50, 95, 99)], [51, 95, 99])
+        self.assertIsNone(load_test.percentile([], 50))
+        self.assertEqual(load_test.parse_mix('bins=6,token'), {'bins': 6.0, 'token': 1.0})
+        with self.assertRaises(argparse.ArgumentTypeError):
+            load_test.parse_mix('bins=1,unknown=2')
+
+    def test_run_against_live_server(self):
+        username = f'{load_test.USER_PREFIX}0{load_test.USER_DOMAIN}'
+        User.objects.create_user(username, username, load_test.PASSWORD)
+        # Un seul client : SQLite en mémoire partage une connexion avec le serveur de test
+        report = load_test.run_load(self.live_server_url, 1, 1.0, {'bins': 2, 'token': 1, 'upload': 1},
+                                    [username], [('photo.jpg', photo_bytes())])
+        self.assertGreater(report['total']['requests'], 0)
+        self.assertEqual(report['total']['errors'], 0)
+        for row in report['endpoints'].values():
+            self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+        self.assertTrue(ImageUpload.objects.filter(uploader__username=username).exists())
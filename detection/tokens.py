@@ -0,0 +1,23 @@
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+
+class ProfileTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Ajoute au token les informations du profil (copiées aussi dans le token d'accès)."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['first_name'] = user.first_name
+        token['last_name'] = user.last_name
+        token['email'] = user.email
+        profile = getattr(user, 'userprofile', None)
+        if profile is not None:
+            token['theme'] = profile.theme
+            token['langue'] = profile.langue
+            token['points'] = profile.points  # instantané au moment du login
+        return token
+
+
+class ProfileTokenObtainPairView(TokenObtainPairView):
+    serializer_class = ProfileTokenObtainPairSerializer
@@ -0,0 +1,60 @@
+"""
+Traçage léger des requêtes : temps par étape (décodage, crop, Canny, contours,
+classification...) et requêtes SQL de la requête en cours.
+
+Chaque étape alimente l'histogramme urbin_extraction_stage_seconds
+(detection.metrics) ; le détail par requête n'est conservé que pour les
+requêtes échantillonnées par RequestTimingMiddleware.
+Aucune dépendance à Django : les modules de detection/ai peuvent l'importer.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from . import metrics
+
+_current_trace = ContextVar('request_trace', default=None)
+
+
+class RequestTrace:
+    """Mesures d'une requête : durée cumulée par étape et requêtes SQL."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.db_connect = None
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start_trace():
+    trace = RequestTrace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_stage(name):
+    """Chronomètre un bloc : histogramme par étape, et détail de la requête si elle est échantillonnée."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe('urbin_extraction_stage_seconds', elapsed, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, elapsed)
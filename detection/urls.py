@@ -2,10 +2,8 @@ from django.urls import path
 from . import views
 from django.shortcuts import render
 from .views import hello_world, register_user, login_user, UpdateUserView
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from rest_framework_simplejwt.views import TokenRefreshView
+from .tokens import ProfileTokenObtainPairView
 from django.conf import settings
 from django.conf.urls.static import static
 from .views import analyze_image_api
@@ -20,13 +18,21 @@ urlpatterns = [
     path('api/register/', register_user),
     path('api/login/', login_user),
     path("api/bins/", views.bins_data, name="bins_data"),
+    path("api/bins/history/", views.bins_history, name="bins_history"),
+    path("api/routes/collection/", views.collection_route, name="collection_route"),
     path('api/update-user/', UpdateUserView.as_view()),
     path('api/user/me/', views.get_user_profile),
+    path('api/user/me/stats/', views.get_user_stats, name='user_stats'),
+    path('api/leaderboard/', views.leaderboard_view, name='leaderboard'),
     path('api/user/update/', views.update_user_profile),
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/', ProfileTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/upload-image/', views.upload_image_api, name='upload_image_api'),
     path('api/analyze-image/', analyze_image_api, name='analyze_image_api'),
+    path('api/uploads/', views.upload_session_create, name='upload_session_create'),
+    path('api/uploads/<uuid:session_id>/', views.upload_session_chunk, name='upload_session_chunk'),
+    path('api/uploads/<uuid:session_id>/finalize/', views.upload_session_finalize, name='upload_session_finalize'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
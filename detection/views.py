@@ -1,9 +1,11 @@
 from django.shortcuts import render, redirect
 from .forms import ImageUploadForm, RegisterForm
 from .models import ImageUpload
-from detection.ai.feature_extractor import ImageFeatureExtractor, create_classification_rules
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
+import hmac
+import logging
+import math
 import os
 from django.contrib.auth.models import User
 from rest_framework.decorators import api_view
@@ -13,18 +15,52 @@ from .models import UserProfile
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.decorators import permission_classes
+from rest_framework.decorators import permission_classes, authentication_classes
 from detection.models import UserProfile
 from django.contrib.auth.models import User
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.decorators import parser_classes
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from rest_framework.parsers import MultiPartParser, FormParser
 from .models import ImageUpload
-from .ai.demo_extraction import extract_features, classify_image, load_rules
+from .image_hash import compute_dhash, find_near_duplicate, index_phash
+from .gps_utils import read_gps
+from .bins import (
+    get_data_version, last_modified, bins_etag, bins_queryset, bins_stats, bins_rows, bins_columns,
+    cached_payload, PACKED_FIELDS
+)
+from .renderers import BinsColumnarRenderer, BinsPackedRenderer
+from .classifier import classify_path, engine_name, feature_snapshot
+from . import chunked_upload
+from .models import UploadSession
+from django.core.files import File
+from django.shortcuts import get_object_or_404
+from .models import BinLocation
+from .rollup import cell_range, history, recent_full_locations
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.decorators import renderer_classes
+from rest_framework.renderers import JSONRenderer
+from . import metrics
+from .points import (
+    award_points, get_leaderboard, user_stats, profile_snapshot, invalidate_profile, LEADERBOARD_SIZE
+)
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
 from django.conf import settings
 import uuid
 
+logger = logging.getLogger(__name__)
+
+# Matrice de distances float32 : 3000 arrêts = 36 Mo
+MAX_ROUTE_STOPS = 3000
+MAX_ROUTE_TIME_BUDGET = 10
+# Fenêtre maximale de ?hours= (un an)
+MAX_ROUTE_HOURS = 24 * 366
+
 
 @login_required
 def upload_image(request):
@@ -33,35 +69,54 @@ def upload_image(request):
         if form.is_valid():
             instance = form.save(commit=False)
             instance.uploader = request.user
+
+            # Extraire coordonnées GPS si EXIF disponibles (en-tête seulement)
+            if instance.latitude is None or instance.longitude is None:
+                gps = read_gps(form.cleaned_data['image'])
+                if gps:
+                    instance.latitude, instance.longitude = gps
+
+            # Ré-upload d'une image déjà reçue : on reprend sa classification, sans points
+            instance.phash = compute_dhash(form.cleaned_data['image'])
+            duplicate = find_near_duplicate(instance.phash)
+            metrics.inc('urbin_uploads_total', source='form', duplicate=duplicate is not None)
+            if duplicate is not None:
+                instance.duplicate_of = duplicate
+                instance.annotation = duplicate.annotation
+                instance.save()
+                index_phash(instance)
+                return redirect('image_success')
+
             instance.save()
-            
-            extractor = ImageFeatureExtractor()
+            index_phash(instance)
+
             img_path = instance.image.path
-            
-            # Extraire coordonnées GPS si EXIF disponibles
-            #gps = extract_gps_from_image(img_path)
-            #if gps:
-            #   instance.latitude, instance.longitude = gps
 
             try:
-                features = extractor.extract_all_features(img_path)
-                instance.file_size_kb = features.get('file_size_kb')
-                instance.width = features.get('width')
-                instance.height = features.get('height')
-                instance.avg_r = features.get('mean_red')
-                instance.avg_g = features.get('mean_green')
-                instance.avg_b = features.get('mean_blue')
-                instance.contrast = features.get('contrast_range')
-                instance.contours = features.get('total_contours')
-                instance.annotation = create_classification_rules(features)
+                if engine_name() == 'knn':
+                    instance.annotation = classify_path(img_path)['status']
+                else:
+                    # Import différé : cv2/NumPy ne sont chargés qu'à la première analyse
+                    from .ai.feature_extractor import ImageFeatureExtractor, create_classification_rules
+                    extractor = ImageFeatureExtractor()
+                    features = extractor.extract_all_features(img_path)
+                    instance.file_size_kb = features.get('file_size_kb')
+                    instance.width = features.get('width')
+                    instance.height = features.get('height')
+                    instance.avg_r = features.get('mean_red')
+                    instance.avg_g = features.get('mean_green')
+                    instance.avg_b = features.get('mean_blue')
+                    instance.contrast = features.get('contrast_range')
+                    instance.contours = features.get('total_contours')
+                    instance.annotation = create_classification_rules(features)
+                metrics.inc('urbin_classifications_total', outcome=instance.annotation)
             except Exception as e:
+                metrics.inc('urbin_classifications_total', outcome='error')
                 print(f"Erreur d'extraction: {e}")
 
             instance.save()
             if instance.annotation == "pleine":
-                profile = request.user.userprofile
-                profile.points += 1
-                profile.save()
+                award_points(request.user, 1)
             return redirect('image_success')
     else:
         form = ImageUploadForm()
@@ -120,8 +175,7 @@ def register_user(request):
         password=password,
         first_name=first_name,
         last_name=last_name
-    )
-    UserProfile.objects.create(user=user)  # Crée aussi le profil
+    )  # Le profil est créé par le signal post_save (detection/signals.py)
 
     return Response({'message': 'Utilisateur créé avec succès.'}, status=status.HTTP_201_CREATED)
 
@@ -134,10 +188,11 @@ def login_user(request):
     email = data.get('email')
     password = data.get('password')
 
+    # ProfileModelBackend charge le profil avec l'utilisateur
     user = authenticate(username=email, password=password)
     if user is not None:
         login(request, user)  # <- Ce login crée une session côté Django
-        profile = UserProfile.objects.get(user=user)
+        profile = user.userprofile
         return Response({
             'first_name': user.first_name,
             'last_name': user.last_name,
@@ -152,33 +207,139 @@ def login_user(request):
     
 
 @api_view(['GET'])
+@renderer_classes([JSONRenderer, BinsColumnarRenderer, BinsPackedRenderer])
 def bins_data(request):
-    bins = ImageUpload.objects.all()
+    # Format négocié (Accept ou ?format=json|columnar|packed) ; 304 via ETag tant qu'aucune image
+    # n'est ajoutée/modifiée, sinon corps sérialisé servi depuis le cache
+    version = get_data_version()
+    etag = quote_etag(bins_etag(request, version))
+    modified = last_modified(version)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=modified)
+    if not_modified is None:
+        renderer = request.accepted_renderer
+
+        def build():
+            bins = bins_queryset(request)
+            data = {"stats": bins_stats()}
+            if renderer.format == 'packed':
+                data.update(bins_columns(bins, PACKED_FIELDS))
+            elif renderer.format == 'columnar':
+                data.update(bins_columns(bins))
+            else:
+                data["bins"] = bins_rows(bins)
+            return renderer.render(data, request.accepted_media_type, {'request': request})
+
+        response = HttpResponse(cached_payload(request, version, build), content_type=renderer.media_type)
+    else:
+        response = not_modified
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    # Le navigateur garde la réponse mais revalide à chaque chargement ; le corps dépend de Accept
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+def _parse_moment(value, default):
+    """Date (YYYY-MM-DD) ou date-heure ISO 8601 ; `default` si absent, ValueError si invalide."""
+    if not value:
+        return default
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, time.min)
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment, dt_timezone.utc)
 
-    stats = {
-        "total": bins.count(),
-        "pleine": bins.filter(annotation="pleine").count(),
-        "vide": bins.filter(annotation="vide").count(),
-        "inconnu": bins.filter(annotation="auto").count(),
-    }
 
-    bins_list = []
-    for b in bins:
-        bins_list.append({
-            "id": b.id,
-            "chemin": b.chemin,
-            "type": b.type,
-            "date": b.date_csv,
-            "taille": b.taille,
-            "hauteur": b.hauteur,
-            "largeur": b.largeur,
-            "pixels": b.pixels,
-            "latitude": b.latitude,
-            "longitude": b.longitude,
-            "classe": b.annotation,
-        })
+@api_view(['GET'])
+def bins_history(request):
+    # Historique d'un emplacement (?location=) ou d'une zone (?bbox=lat_min,lon_min,lat_max,lon_max),
+    # lu dans les agrégats horaires/journaliers : jamais de parcours de ImageUpload
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in ('hour', 'day'):
+        return Response({"error": "granularity doit valoir hour ou day"}, status=400)
+    try:
+        end = _parse_moment(request.GET.get('end'), timezone.now())
+        start = _parse_moment(request.GET.get('start'), end - timedelta(days=30))
+        if request.GET.get('end') and 'T' not in request.GET['end']:
+            end += timedelta(days=1) - timedelta(microseconds=1)  # journée incluse
+    except ValueError:
+        return Response({"error": "start/end : date ISO 8601 attendue"}, status=400)
+
+    if request.GET.get('location'):
+        try:
+            location_id = int(request.GET['location'])
+        except ValueError:
+            return Response({"error": "location : identifiant entier attendu"}, status=400)
+        locations = BinLocation.objects.filter(pk=location_id)
+    elif request.GET.get('bbox'):
+        try:
+            min_lat, min_lon, max_lat, max_lon = (float(v) for v in request.GET['bbox'].split(','))
+        except ValueError:
+            return Response({"error": "bbox : lat_min,lon_min,lat_max,lon_max attendu"}, status=400)
+        locations = BinLocation.objects.filter(
+            **cell_range(min_lat, min_lon, max_lat, max_lon),
+            latitude__range=(min_lat, max_lat), longitude__range=(min_lon, max_lon),
+        )
+    else:
+        return Response({"error": "location ou bbox requis"}, status=400)
+
+    summary = list(locations.values(
+        'id', 'latitude', 'longitude', 'reports', 'full_reports', 'last_annotation', 'last_report'
+    ))
+    if request.GET.get('location') and not summary:
+        return Response({"error": "Emplacement introuvable"}, status=404)
+    return Response({
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "locations": summary,
+        **history(locations, granularity, start, end),
+    })
+
+def _parse_point(value):
+    lat, lon = (float(v) for v in value.split(','))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(value)
+    return lat, lon
 
-    return Response({"stats": stats, "bins": bins_list})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def collection_route(request):
+    # Tournée depuis le dépôt (?depot=lat,lon) sur les emplacements signalés pleins depuis ?hours= heures
+    try:
+        depot = _parse_point(request.GET.get('depot', ''))
+        hours = float(request.GET.get('hours', 24))
+        time_budget = float(request.GET.get('time_budget', 2))
+        max_stops = int(request.GET.get('max_stops', MAX_ROUTE_STOPS))
+        bbox = tuple(float(v) for v in request.GET['bbox'].split(',')) if request.GET.get('bbox') else None
+        if not (math.isfinite(hours) and hours > 0 and math.isfinite(time_budget) and time_budget >= 0
+                and max_stops >= 1):
+            raise ValueError()
+    except ValueError:
+        return Response({"error": "depot=lat,lon requis ; hours et time_budget positifs, max_stops >= 1"}, status=400)
+    hours = min(hours, MAX_ROUTE_HOURS)
+    time_budget = min(time_budget, MAX_ROUTE_TIME_BUDGET)
+    max_stops = min(max_stops, MAX_ROUTE_STOPS)
+    if bbox is not None and len(bbox) != 4:
+        return Response({"error": "bbox : lat_min,lon_min,lat_max,lon_max attendu"}, status=400)
+
+    since = timezone.now() - timedelta(hours=hours)
+    stops = list(recent_full_locations(since, bbox).values('id', 'latitude', 'longitude', 'last_report')[:max_stops])
+    if not stops:
+        return Response({"depot": depot, "since": since.isoformat(), "stops": [], "stats": {"stops": 0}})
+
+    # Import différé : NumPy n'est chargé qu'au premier calcul de tournée
+    from .routing import plan_route
+    order, stats = plan_route(depot, [(s['latitude'], s['longitude']) for s in stops], time_budget)
+    return Response({
+        "depot": depot,
+        "since": since.isoformat(),
+        "stops": [stops[k] for k in order],
+        "stats": stats,
+    })
 
 class UpdateUserView(APIView):
     def patch(self, request):
@@ -191,28 +352,53 @@ class UpdateUserView(APIView):
             if not request.user or request.user.is_anonymous:
                 return Response({'error': 'Utilisateur non connecté'}, status=401)
 
-            profile = UserProfile.objects.get(user=request.user)
+            profile = request.user.userprofile
             profile.theme = theme
-            profile.save()
+            profile.save(update_fields=['theme'])
+            invalidate_profile(request.user.pk)
             return Response({'status': 'theme updated', 'theme': theme})
         except Exception as e:
             print("Erreur update-user:", e)
             return Response({'error': str(e)}, status=500)
 
 @api_view(['GET'])
+@authentication_classes([JWTStatelessUserAuthentication])
 @permission_classes([IsAuthenticated])
 def get_user_profile(request):
-    user = request.user
-    profile = user.userprofile
+    # Identité lue dans le token (aucune requête), profil depuis le cache
+    identity = request.auth
+    if "email" not in identity:
+        # Token émis avant l'ajout des claims de profil
+        identity = User.objects.filter(pk=request.user.id).values('first_name', 'last_name', 'email').first() or {}
+    profile = profile_snapshot(request.user.id)
+    if profile is None:
+        return Response({'error': 'Profil introuvable'}, status=404)
+    if not profile["is_active"]:
+        # L'authentification sans état ne lit pas l'utilisateur : compte désactivé vérifié ici
+        raise AuthenticationFailed("User is inactive", code="user_inactive")
     return Response({
-        "first_name": user.first_name,
-        "last_name": user.last_name,
-        "email": user.email,
-        "points": profile.points,
-        "theme": profile.theme,
-        "langue": profile.langue,
+        "first_name": identity.get("first_name", ""),
+        "last_name": identity.get("last_name", ""),
+        "email": identity.get("email", ""),
+        "points": profile["points"],
+        "theme": profile["theme"],
+        "langue": profile["langue"],
     })
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def leaderboard_view(request):
+    try:
+        limit = min(int(request.GET.get('limit', 10)), LEADERBOARD_SIZE)
+    except ValueError:
+        return Response({"error": "limit doit être un nombre"}, status=400)
+    return Response({"leaderboard": get_leaderboard(max(limit, 1))})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_user_stats(request):
+    return Response(user_stats(request.user))
+
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 def update_user_profile(request):
@@ -223,6 +409,12 @@ def update_user_profile(request):
 
     updated = {}
 
+    if points is not None:
+        try:
+            points = int(points)
+        except (TypeError, ValueError):
+            return Response({"error": "points doit être un nombre"}, status=400)
+
     if theme in ['dark', 'light']:
         profile.theme = theme
         updated['theme'] = theme
@@ -231,20 +423,72 @@ def update_user_profile(request):
         profile.langue = langue
         updated['langue'] = langue
 
+    if updated:
+        profile.save(update_fields=list(updated))
+        invalidate_profile(request.user.pk)
+
     if points is not None:
-        try:
-            profile.points += int(points)  
-            updated['points'] = profile.points
-        except Exception as e:
-            return Response({"error": "points doit être un nombre"}, status=400)
+        # Incrément atomique : pas de read-modify-write sur le profil
+        updated['points'] = award_points(request.user, points)
 
     if updated:
-        profile.save()
         return Response({"message": "Updated", **updated})
 
     return Response({"error": "No valid fields to update"}, status=400)
 
 
+UPLOAD_FIELDS = ('annotation', 'latitude', 'longitude', 'taille', 'largeur', 'hauteur', 'pixels', 'type')
+
+
+def _save_api_upload(user, image_file, data, source, gps=None, client_features=None, thumbnail=None):
+    """
+    Enregistre un upload de l'API (formulaire multipart ou upload en morceaux).
+    `gps` : position EXIF déjà lue, sinon lue dans l'en-tête du fichier si absente de `data`.
+    `client_features` / `thumbnail` : caractéristiques calculées par le client, vérifiées
+    sur la miniature (detection/feature_verification.py) au lieu d'être recalculées.
+    Retourne l'upload dont c'est un doublon, ou None.
+    """
+    obj = ImageUpload()
+    obj.uploader = user
+    obj.image = image_file
+    for field in UPLOAD_FIELDS:
+        setattr(obj, field, data.get(field))
+
+    # Position absente : on la lit dans l'EXIF de l'image
+    if not obj.latitude or not obj.longitude:
+        gps = gps or read_gps(image_file)
+        obj.latitude, obj.longitude = gps if gps else (None, None)
+
+    obj.phash = compute_dhash(image_file)
+    duplicate = find_near_duplicate(obj.phash)
+    if duplicate is not None:
+        obj.duplicate_of = duplicate
+        obj.annotation = duplicate.annotation
+    elif client_features is not None and thumbnail is not None:
+        # Import différé : cv2/NumPy ne sont chargés qu'à la première vérification
+        from .feature_verification import FeaturesRejected, verify as verify_features
+        try:
+            features, obj.features_source = verify_features(
+                client_features, thumbnail, image_file, obj.phash,
+                getattr(settings, 'FEATURE_SPOT_CHECK_RATE', 0.0),
+            )
+            obj.features = {name: round(float(v), 4) for name, v in features.items()}
+        except FeaturesRejected as e:
+            obj.features_source = 'rejected'
+            print(f"Caractéristiques client rejetées ({user.username}): {e.reason} {e.details}")
+        metrics.inc('urbin_feature_verifications_total', outcome=obj.features_source)
+        if obj.features is None and engine_name() == 'knn' and obj.annotation in ('pleine', 'vide'):
+            obj.features, obj.features_source = feature_snapshot(image_file), 'server'
+    elif engine_name() == 'knn' and obj.annotation in ('pleine', 'vide'):
+        # Image annotée par l'utilisateur : exemple pour la base k-NN une fois l'annotation confirmée (admin)
+        obj.features, obj.features_source = feature_snapshot(image_file), 'server'
+
+    obj.save()
+    index_phash(obj)
+    metrics.inc('urbin_uploads_total', source=source, duplicate=duplicate is not None)
+    return duplicate
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser, FormParser])
@@ -256,23 +500,25 @@ def upload_image_api(request):
         if not image_file:
             return Response({'error': 'Image manquante.'}, status=400)
 
-        # Tu crées l'objet manuellement :
-        obj = ImageUpload()
-        obj.uploader = request.user
-        obj.image = image_file
-        obj.annotation = request.POST.get('annotation')
-        obj.latitude = request.POST.get('latitude')
-        obj.longitude = request.POST.get('longitude')
-        obj.taille = request.POST.get('taille')
-        obj.largeur = request.POST.get('largeur')
-        obj.hauteur = request.POST.get('hauteur')
-        obj.pixels = request.POST.get('pixels')
-        obj.type = request.POST.get('type')
-        # Tu ajoutes ici tous les champs utiles
+        # Les caractéristiques ne sont vérifiables que sur la miniature : l'une sans l'autre est refusée
+        thumbnail = request.FILES.get('thumbnail')
+        if bool(request.POST.get('features')) != (thumbnail is not None):
+            metrics.inc('urbin_feature_verifications_total', outcome='incomplete')
+            return Response({'error': 'features et thumbnail doivent être envoyés ensemble.'}, status=400)
 
-        obj.save()
+        client_features = None
+        if request.POST.get('features'):
+            from .feature_verification import parse_features
+            try:
+                client_features = parse_features(request.POST['features'])
+            except (ValueError, KeyError, TypeError) as e:
+                return Response({'error': f'features invalides : {e}'}, status=400)
 
-        return Response({'status': 'success'}, status=201)
+        duplicate = _save_api_upload(
+            request.user, image_file, request.POST, source='api',
+            client_features=client_features, thumbnail=thumbnail,
+        )
+        return Response({'status': 'success', 'duplicate': duplicate is not None}, status=201)
 
     except Exception as e:
         print("Erreur upload_image_api:", e)
@@ -295,23 +541,171 @@ def analyze_image_api(request):
     with open(temp_path, 'wb+') as destination:
         for chunk in image_file.chunks():
             destination.write(chunk)
+    metrics.inc('urbin_temp_file_bytes_total', image_file.size)
 
     try:
-        # Analyse de l’image
-        features = extract_features(temp_path)
-        rules = load_rules()
-        classification_result = classify_image(features, rules)
+        # Analyse de l’image avec le moteur configuré (CLASSIFIER_ENGINE)
+        result = classify_path(temp_path)
 
-        # Supprimer le fichier temporaire
-        os.remove(temp_path)
+        metrics.inc('urbin_classifications_total', outcome=result['status'])
 
         # Retourner le résultat
-        return Response({
-            "status": "pleine" if classification_result['classification'] == "Poubelle pleine" else "vide",
-            "score": classification_result['fullness_score'],
-            "details": classification_result['validation_details']
-        })
+        return Response(result)
 
     except Exception as e:
+        metrics.inc('urbin_classifications_total', outcome='error')
         print("Erreur classification:", e)
-        return Response({'error': str(e)}, status=500)
\ No newline at end of file
+        return Response({'error': str(e)}, status=500)
+
+    finally:
+        # Supprimer le fichier temporaire, y compris quand l'analyse échoue
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+
+
+def _session_state(session):
+    return {
+        "id": str(session.id),
+        "size": session.size,
+        "offset": session.received,
+        "chunk_size": chunked_upload.MAX_CHUNK_SIZE,
+        "complete": session.received == session.size,
+    }
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_session_create(request):
+    """Début d'un upload en morceaux (detection/chunked_upload.py)."""
+    data = request.data
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return Response({"error": "size doit être un entier"}, status=400)
+    if not 0 < size <= chunked_upload.MAX_UPLOAD_SIZE:
+        return Response({"error": f"size doit être compris entre 1 et {chunked_upload.MAX_UPLOAD_SIZE}"}, status=400)
+    purpose = data.get('purpose') or 'upload'
+    if purpose not in dict(UploadSession.PURPOSES):
+        return Response({"error": "purpose doit valoir upload ou analyze"}, status=400)
+    sha256 = (data.get('sha256') or '').lower()
+    if sha256 and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256)):
+        return Response({"error": "sha256 doit être une empreinte hexadécimale"}, status=400)
+
+    session = UploadSession.objects.create(
+        uploader=request.user,
+        purpose=purpose,
+        filename=os.path.basename(str(data.get('filename') or 'image.jpg'))[:255],
+        size=size,
+        sha256=sha256,
+        fields={f: data.get(f) for f in UPLOAD_FIELDS if data.get(f) not in (None, '')},
+    )
+    return Response(_session_state(session), status=201)
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def upload_session_chunk(request, session_id):
+    """
+    GET : octets déjà reçus. PUT : morceau brut décrit par l'en-tête
+    Content-Range ; 409 avec l'offset attendu s'il ne commence pas là.
+    """
+    session = get_object_or_404(UploadSession, id=session_id, uploader=request.user)
+    if request.method == 'GET':
+        return Response(_session_state(session))
+    if session.result is not None:
+        return Response({"error": "Upload déjà finalisé", **_session_state(session)}, status=409)
+
+    content_range = chunked_upload.parse_content_range(request.headers.get('Content-Range'))
+    if content_range is None or content_range[2] != session.size:
+        return Response({"error": "Content-Range invalide", **_session_state(session)}, status=400)
+    start, end, _ = content_range
+    if end - start + 1 > chunked_upload.MAX_CHUNK_SIZE:
+        return Response({"error": "Morceau trop grand", **_session_state(session)}, status=413)
+
+    try:
+        with chunked_upload.spool_file(session) as f:
+            if session.result is not None or start != session.received:
+                return Response({"error": "Offset inattendu", **_session_state(session)}, status=409)
+            # Corps lu en flux (pas de request.body ni de parseur) : rien n'est mis en mémoire
+            stream = request.stream
+            written = chunked_upload.append_chunk(session, f, stream, end - start + 1) if stream else 0
+            session.save(update_fields=['received', 'exif_checked', 'latitude', 'longitude', 'updated_at'])
+    except chunked_upload.UploadBusy:
+        return Response({"error": "Morceau déjà en cours de réception", **_session_state(session)}, status=409)
+    metrics.inc('urbin_upload_chunk_bytes_total', written)
+    return Response(_session_state(session))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_session_finalize(request, session_id):
+    """Fichier complet : enregistré comme upload_image_api, ou analysé comme analyze_image_api."""
+    session = get_object_or_404(UploadSession, id=session_id, uploader=request.user)
+    if session.result is None and session.received == session.size:
+        try:
+            return _finalize(session)
+        except chunked_upload.UploadBusy:
+            return Response({"error": "Upload en cours de traitement", **_session_state(session)}, status=409)
+        except FileNotFoundError:
+            # Finalisé entre-temps par une autre requête, ou fichier temporaire expiré
+            session.refresh_from_db()
+            if session.result is None:
+                return Response({"error": "Fichier temporaire expiré : upload à recommencer"}, status=410)
+    if session.result is not None:
+        # Réponse perdue par le client : on la renvoie sans refaire le travail
+        return Response(session.result['body'], status=session.result['status'])
+    return Response({"error": "Upload incomplet", **_session_state(session)}, status=409)
+
+
+def _finalize(session):
+    with chunked_upload.spool_file(session, create=False) as f:
+        if session.result is not None:
+            return Response(session.result['body'], status=session.result['status'])
+
+        digest = chunked_upload.digest(session)
+        if session.sha256 and session.sha256 != digest:
+            chunked_upload.discard(session)
+            session.delete()
+            return Response({"error": "Empreinte SHA-256 différente : upload à recommencer"}, status=422)
+
+        # En cas d'erreur, la réponse 500 est enregistrée comme une autre : la session est
+        # terminée et son fichier temporaire libéré, le client recommence l'upload
+        if session.purpose == 'analyze':
+            try:
+                body, code = classify_path(chunked_upload.spool_path(session)), 200
+                metrics.inc('urbin_classifications_total', outcome=body['status'])
+            except Exception as e:
+                metrics.inc('urbin_classifications_total', outcome='error')
+                logger.exception("Erreur classification (session %s)", session.id)
+                body, code = {'error': str(e)}, 500
+        else:
+            f.seek(0)
+            image_file = File(f, name=session.filename)
+            # Empreinte déjà calculée au fil des morceaux : pas relue par le stockage
+            image_file.sha256 = digest
+            gps = (session.latitude, session.longitude) if session.latitude is not None else None
+            try:
+                duplicate = _save_api_upload(session.uploader, image_file, session.fields, source='chunked', gps=gps)
+                body, code = {'status': 'success', 'duplicate': duplicate is not None}, 201
+            except Exception as e:
+                logger.exception("Erreur enregistrement upload (session %s)", session.id)
+                body, code = {'error': str(e)}, 500
+
+        session.result = {'status': code, 'body': body}
+        session.save(update_fields=['result', 'updated_at'])
+        chunked_upload.discard(session)
+    return Response(body, status=code)
+
+
+def metrics_view(request):
+    # Format d'exposition Prometheus, agrégé sur tous les workers (METRICS_MULTIPROC_DIR)
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token:
+        # Pas de jeton : réservé au développement
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
\ No newline at end of file
@@ -3,5 +3,9 @@
 echo "🔄 Applying database migrations..."
 python manage.py migrate --noinput
 
+# Métriques agrégées entre les workers gunicorn (un fichier par worker)
+export METRICS_MULTIPROC_DIR="${METRICS_MULTIPROC_DIR:-/tmp/urbin-metrics}"
+rm -rf "$METRICS_MULTIPROC_DIR" && mkdir -p "$METRICS_MULTIPROC_DIR"
+
 echo "🚀 Starting server..."
 exec gunicorn urbin.wsgi:application --bind 0.0.0.0:8080
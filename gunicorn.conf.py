@@ -0,0 +1,25 @@
+# Configuration gunicorn (lue automatiquement depuis le dossier courant)
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8080")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+
+# --preload : l'application est chargée une seule fois dans le master, puis forkée.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    # Les vues chargent cv2/NumPy à la demande ; avec --preload on les importe
+    # dans le master pour que les workers partagent ces pages en copy-on-write
+    # au lieu de les charger chacun à la première analyse.
+    if preload_app:
+        import cv2  # noqa: F401
+        import numpy  # noqa: F401
+        from PIL import Image  # noqa: F401
+
+
+def child_exit(server, worker):
+    # Compteurs du worker terminé reportés dans l'archive, son fichier supprimé
+    from detection import metrics
+
+    metrics.mark_process_dead(worker.pid)